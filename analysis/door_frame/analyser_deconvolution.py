@@ -0,0 +1,133 @@
+"""
+Correction of the response of the gas analysers before the oxygen calorimetry calculations.
+
+The analyser is modelled as a transport delay followed by a first-order response (time constant) or by a measured
+impulse response. The readings are deconvolved in the frequency domain over the whole record with a regularised
+(Tikhonov) inverse:
+
+    X(f) = Y(f) * conj(H(f)) / (|H(f)|^2 + regularisation * |D(f)|^2)
+
+where H is the response of the analyser and D the response of a first difference divided by the time step (a time
+derivative), so the regularisation damps the amplification of high frequency noise without biasing the mean value of
+the readings, and the same regularisation works for any time step.
+
+Records of different length and time step (e.g. O2, CO and CO2 of every test and the external HRR) are deconvolved
+together with a single FFT over a padded matrix.
+
+"""
+
+import numpy as np
+from scipy.fft import rfft, irfft, rfftfreq, next_fast_len
+
+# response of each analyser: transport delay (s) and time constant (s) of the first-order response. The delay of the
+# Juanalyser is already removed by the logger alignment of main_door_frame and the external HRR was already corrected
+# for delay by the calorimetry software (it rises faster than a 12 s response would allow)
+analyser_response = {"juanalyser": {"delay": 0, "time_constant": 12},
+                     "THRR": {"delay": 0, "time_constant": 3}}
+
+# weight of the time derivative penalty in s^2 (higher values give smoother, less sharpened, results)
+regularisation = 1e-1
+
+
+def analyser_transfer_function(length, dt, delay = 0, time_constant = 0, impulse_response = None):
+    """
+    Frequency response of the analyser (delay followed by a first-order or measured response) at the frequencies of
+    an rfft of the given length
+
+    Parameters:
+    ----------
+    length: number of samples of the transformed records
+        int
+
+    dt: time step of the readings (s)
+        float
+
+    delay: transport delay (s)
+        float
+
+    time_constant: time constant of the first-order response (s). Not used if impulse_response is given
+        float
+
+    impulse_response: measured impulse response of the analyser sampled every dt (it is normalised to unit area)
+        np.array
+
+    Returns:
+    -------
+    H: complex frequency response
+        np.array
+    """
+    frequency = rfftfreq(length, dt)
+    H = np.exp(-2j * np.pi * frequency * delay)
+
+    if impulse_response is not None:
+        impulse_response = np.asarray(impulse_response, dtype = float)
+        H = H * rfft(impulse_response / impulse_response.sum(), n = length)
+    else:
+        H = H / (1 + 2j * np.pi * frequency * time_constant)
+
+    return H
+
+
+def deconvolution_batch(signals, dts, responses, regularisation = regularisation):
+    """
+    Removes the delay and response of the analysers from several records at once
+
+    Each record must be sampled at a constant time step. Leading and trailing nan values are kept as nan, and the last
+    samples of each record (within the delay of its analyser) are nan because their readings had not arrived yet.
+
+    Parameters:
+    ----------
+    signals: readings of each record
+        list
+
+    dts: time step of each record (s)
+        list
+
+    responses: response of the analyser of each record (keyword arguments of analyser_transfer_function)
+        list
+
+    regularisation: weight of the time derivative penalty (s^2)
+        float
+
+    Returns:
+    -------
+    deconvolved_signals: deconvolved readings of each record (same length as signals)
+        list
+    """
+    signals = [np.asarray(signal, dtype = float) for signal in signals]
+    dts = np.asarray(dts, dtype = float)
+
+    # span of finite readings of every record
+    spans = []
+    for signal in signals:
+        finite = np.flatnonzero(np.isfinite(signal))
+        spans.append((finite[0], finite[-1] + 1) if len(finite) else (0, 0))
+
+    # records padded to at least twice the longest record (avoids wrap around) with a ramp from their last reading
+    # back to their first one, so the periodic extension used by the FFT has no jumps. Gaps are interpolated
+    length = next_fast_len(2 * max(stop - start for start, stop in spans))
+    Y = np.zeros((len(signals), length))
+    for i, (signal, (start, stop)) in enumerate(zip(signals, spans)):
+        if stop == start:
+            continue
+        record = signal[start:stop]
+        finite = np.isfinite(record)
+        record = np.interp(np.arange(len(record)), np.flatnonzero(finite), record[finite])
+        Y[i, :len(record)] = record
+        Y[i, len(record):] = np.linspace(record[-1], record[0], length - len(record) + 1)[:-1]
+
+    # transfer function of the analyser and of the first difference of every record
+    H = np.array([analyser_transfer_function(length, dt, **response) for dt, response in zip(dts, responses)])
+    D = 2 * np.sin(np.pi * np.arange(length // 2 + 1) / length)[None, :] / dts[:, None]
+
+    X = irfft(rfft(Y, axis = 1) * np.conj(H) / (np.abs(H)**2 + regularisation * D**2), n = length, axis = 1)
+
+    deconvolved_signals = []
+    for i, (signal, (start, stop)) in enumerate(zip(signals, spans)):
+        deconvolved_signal = np.full(signal.shape, np.nan)
+        n_delay = int(np.ceil(responses[i].get("delay", 0) / dts[i]))
+        deconvolved_signal[start:stop - n_delay] = X[i, :stop - start - n_delay]
+        deconvolved_signal[np.isnan(signal)] = np.nan
+        deconvolved_signals.append(deconvolved_signal)
+
+    return deconvolved_signals
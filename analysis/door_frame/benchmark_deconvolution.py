@@ -0,0 +1,70 @@
+"""
+Benchmark of the batch FFT deconvolution of the gas analysers (deconvolution_batch) on synthetic one hour records
+logged at 10 Hz: O2, CO and CO2 of five tests and four external HRR records. The records are a known HRR curve with
+sharp peaks passed through a transport delay, a first-order response and noise.
+
+"""
+
+import time
+import numpy as np
+from scipy.signal import lfilter
+
+# import my own functions
+from analyser_deconvolution import deconvolution_batch
+
+frequency = 10
+delay = 15
+time_constant = 12
+n_records = 5 * 3 + 4
+
+# true signal: slow growth with two short peaks
+testing_time = np.arange(0, 3600, 1/frequency)
+signal_true = (200 + 800 * np.exp(-((testing_time - 1500)/60)**2) +
+               300 * ((testing_time > 2000) & (testing_time < 2100)) + 0.1 * testing_time)
+
+# analyser response: first-order lag, transport delay and noise (different noise for every record)
+a = (1/frequency) / (time_constant + 1/frequency)
+signal_lagged = lfilter([a], [1, a - 1], signal_true, zi = [signal_true[0] * (1 - a)])[0]
+n_delay = delay * frequency
+signal_lagged = np.r_[np.full(n_delay, signal_true[0]), signal_lagged[:-n_delay]]
+rng = np.random.default_rng(0)
+signals = [signal_lagged + rng.normal(0, 3, len(testing_time)) for _ in range(n_records)]
+
+print(f"Deconvolution benchmark: {n_records} records x {len(testing_time)} samples ({frequency} Hz)")
+
+responses = [{"delay": delay, "time_constant": time_constant}] * n_records
+dts = [1/frequency] * n_records
+
+# time-domain loop inverting the first-order response sample by sample (no regularisation), one record only
+start = time.time()
+deconvolved_loop = np.full(len(testing_time), np.nan)
+for n in range(1, len(testing_time) - n_delay - 1):
+    derivative = (signals[0][n + n_delay + 1] - signals[0][n + n_delay - 1]) * frequency / 2
+    deconvolved_loop[n] = signals[0][n + n_delay] + time_constant * derivative
+time_loop = (time.time() - start) * n_records
+print(f" time-domain loop: {np.round(time_loop,3)} seconds (estimated for all the records)")
+
+# one record at a time
+start = time.time()
+deconvolved_single = [deconvolution_batch([signal], [dt], [response])[0]
+                      for signal, dt, response in zip(signals, dts, responses)]
+time_single = time.time() - start
+print(f" record by record: {np.round(time_single,3)} seconds")
+
+# all records in one batch
+start = time.time()
+deconvolved_signals = deconvolution_batch(signals, dts, responses)
+time_batch = time.time() - start
+print(f" batch: {np.round(time_batch,3)} seconds")
+
+# sharpness of the peaks and error with respect to the true signal
+mask = ~np.isnan(deconvolved_signals[0])
+error_measured = np.sqrt(np.mean((signals[0][mask] - signal_true[mask])**2))
+error_deconvolved = np.sqrt(np.mean((deconvolved_signals[0][mask] - signal_true[mask])**2))
+print(f" peak: {np.round(signal_true.max())} true, {np.round(signals[0].max())} measured, "
+      f"{np.round(np.nanmax(deconvolved_signals[0]))} deconvolved")
+error_loop = np.sqrt(np.nanmean((deconvolved_loop[mask] - signal_true[mask])**2))
+print(f" rms error: {np.round(error_measured,1)} measured, {np.round(error_deconvolved,1)} deconvolved, "
+      f"{np.round(error_loop,1)} time-domain loop")
+
+assert all(np.allclose(x, y, equal_nan = True) for x, y in zip(deconvolved_single, deconvolved_signals))
@@ -0,0 +1,149 @@
+"""
+Benchmark suite of the door frame analysis on synthetic tests (see synthetic_door_frame) of different logging rates
+and durations, with a few sensor failures injected.
+
+Every stage (calculation_velocity, calculation_massflow, calculation_door_frame and calculation_HRR) is timed and its
+peak memory (numpy and pandas allocations, tracked with tracemalloc) is measured. The results of every run are saved
+as JSON, so that the performance can be compared as the door frame code changes.
+
+"""
+
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# import my own functions
+from calculation_massflow import calculation_area, calculation_velocity, calculation_massflow, calculation_door_frame, calculation_HRR
+from synthetic_door_frame import synthetic_door_frame, inject_failures
+
+# logging rate (Hz) and duration (s) of every case. Cases of up to 100 Hz and 24 h can be added (e.g. (100, 24*3600)),
+# but the raw sheet alone then needs about 2 GB
+benchmark_cases = [(1, 3600),
+                   (10, 3600),
+                   (100, 3600),
+                   (10, 6*3600)]
+
+# failures injected in every case (windows in seconds). The offsets of the synthetic probes change with the logging
+# rate, so the rail of a saturation without a "value" is set in every case (see benchmark_sheet)
+benchmark_failures = [{"channel": "P8.120", "type": "flatline", "window": (300, 900)},
+                      {"channel": "P13.180", "type": "saturation", "window": (1500, 2400), "value": None,
+                       "rail": "lower"},
+                      {"channel": "TDD.100", "type": "dropout", "window": (1200, 1260)}]
+
+results_address = f"benchmark_door_frame_{datetime.now():%Y%m%d_%H%M%S}.json"
+
+
+def benchmark_sheet(duration, frequency, failures = benchmark_failures):
+    """
+    Synthetic sheet of a case with the failures injected. The rail of the saturations without a "value" is the median
+    of the readings within the window (about half of them are clipped), and every failure must change its channel
+
+    Parameters:
+    ----------
+    duration: duration of the test after ignition (s)
+        float
+
+    frequency: logging rate of the door frame sensors (Hz)
+        float
+
+    failures: sensor failures to inject (see synthetic_door_frame)
+        list
+
+    Returns:
+    -------
+    sheet: synthetic sheet with the failures
+        pd.DataFrame
+    """
+    sheet = synthetic_door_frame(duration, frequency)
+    testing_time = sheet.loc[:, "Time [min]"].values * 60
+
+    for failure in failures:
+        failure = dict(failure)
+        start, end = failure["window"]
+        before = sheet.loc[:, failure["channel"]].values.copy()
+        if failure["type"] == "saturation" and failure["value"] is None:
+            failure["value"] = np.median(before[(testing_time > start) & (testing_time < end)])
+        inject_failures(sheet, [failure])
+        after = sheet.loc[:, failure["channel"]].values
+        assert not np.array_equal(before, after, equal_nan = True), \
+            f"{failure['type']} of {failure['channel']} does not change the readings"
+
+    return sheet
+
+
+def run_stage(function, *args, **kwargs):
+    """
+    Runs a stage of the analysis and measures its time and peak memory
+
+    Parameters:
+    ----------
+    function: stage of the analysis
+        function
+
+    args, kwargs: arguments of function
+
+    Returns:
+    -------
+    output: output of function
+        any
+
+    stage: "time" (s) and "peak_memory" (MB)
+        dict
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    output = function(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return output, {"time": elapsed, "peak_memory": peak / 2**20}
+
+
+results = {"date": f"{datetime.now():%Y-%m-%d %H:%M:%S}",
+           "platform": platform.platform(),
+           "python": platform.python_version(),
+           "numpy": np.__version__,
+           "pandas": pd.__version__,
+           "cases": []}
+
+areas = calculation_area()
+for frequency, duration in benchmark_cases:
+
+    print(f"Benchmark: {frequency} Hz, {duration/3600:.1f} h")
+    sheet = benchmark_sheet(duration, frequency)
+
+    # same preparation of the data as in main_door_frame
+    df = sheet.iloc[:, :22].copy()
+    df.rename(columns = {"Time [min]": "testing_time"}, inplace = True)
+    df.loc[:, "testing_time"] = df.loc[:, "testing_time"]*60
+    df_juanalyser = sheet.iloc[:, 23:].dropna().copy()
+    df_juanalyser.rename(columns = {"Time": "testing_time"}, inplace = True)
+    df_juanalyser.loc[:, "testing_time"] = df_juanalyser.loc[:, "testing_time"]*60
+
+    stages = {}
+    df_velocity, stages["calculation_velocity"] = run_stage(calculation_velocity, df, "Synthetic")
+    _, stages["calculation_massflow"] = run_stage(calculation_massflow, df_velocity, areas)
+    df_door, stages["calculation_door_frame"] = run_stage(calculation_door_frame, df, "Synthetic", areas)
+    _, stages["calculation_HRR"] = run_stage(calculation_HRR, df_juanalyser, df_door)
+
+    # the gas analyser is logged at its own rate
+    for stage_name, stage in stages.items():
+        rows = len(df_juanalyser) if stage_name == "calculation_HRR" else len(df)
+        print(f" {stage_name}: {stage['time']:.3f} s, {stage['peak_memory']:.1f} MB "
+              f"({1e6 * stage['time'] / rows:.2f} us per row)")
+
+    results["cases"].append({"frequency": frequency,
+                             "duration": duration,
+                             "rows": len(df),
+                             "rows_gas": len(df_juanalyser),
+                             "input_memory": df.memory_usage().sum() / 2**20,
+                             "stages": stages})
+    del sheet, df, df_velocity, df_door, df_juanalyser
+
+with open(results_address, "w") as handle:
+    json.dump(results, handle, indent = 4)
@@ -0,0 +1,55 @@
+"""
+Compares the strip method (calculation_door_massflow) with the continuous profile integration
+(calculation_door_massflow_profile) on a synthetic one hour test logged at 10 Hz.
+
+The synthetic door follows Bernoulli velocities of a two-zone compartment (v ~ sqrt(|z_n - z|)) with a neutral plane
+that moves between probes. The reference mass flow is obtained integrating the same profile on a fine grid.
+
+"""
+
+import time
+import numpy as np
+from scipy.integrate import trapezoid
+
+# import my own functions
+from calculation_massflow import calculation_area, calculation_door_massflow, calculation_door_massflow_profile
+
+frequency = 10
+g = 9.81
+rho_cold, rho_hot = 1.2, 0.5
+heights = np.arange(20,200,20)/100
+testing_time = np.arange(0, 3600, 1/frequency)
+neutral_plane = 1.0 + 0.3 * np.sin(2 * np.pi * testing_time / 900)
+
+
+def door_profile(z):
+    """
+    Density and velocity of the synthetic door at heights z (one row per time step)
+    """
+    distance = neutral_plane[:, None] - z[None, :]
+    rho = np.where(distance > 0, rho_cold, rho_hot)
+    velocity = np.sign(distance) * (2 * g * np.abs(distance) * (rho_cold - rho_hot) / rho)**0.5
+    return rho, velocity
+
+
+rho, velocity = door_profile(heights)
+print(f"Mass flow integration benchmark: {len(testing_time)} time steps x {len(heights)} heights")
+
+# reference: fine grid integration of the continuous profile (same door as calculation_area: 0.1 m to 1.9 m)
+z_fine = np.linspace(0.1, 1.9, 2001)
+rho_fine, velocity_fine = door_profile(z_fine)
+flux_fine = 0.68 * 0.8 * rho_fine * velocity_fine
+mass_in_reference = trapezoid(np.clip(flux_fine, 0, None), z_fine, axis = 1)
+
+start = time.time()
+strips = calculation_door_massflow(rho, velocity, calculation_area())
+time_strips = time.time() - start
+
+start = time.time()
+profile = calculation_door_massflow_profile(rho, velocity, heights)
+time_profile = time.time() - start
+
+for name, massflow, time_method in [("strips", strips, time_strips), ("profile", profile, time_profile)]:
+    error = np.abs(massflow["mass_in"] - mass_in_reference) / mass_in_reference
+    print(f" {name}: {np.round(time_method,3)} seconds, mass_in error {np.round(100*error.mean(),2)} % mean, "
+          f"{np.round(100*error.max(),2)} % maximum")
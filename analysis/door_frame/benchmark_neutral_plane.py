@@ -0,0 +1,42 @@
+"""
+Compares the row-wise neutral plane calculation (find_neutral_plane applied to every row) against the
+vectorised calculation_neutral_plane on a synthetic one hour test logged at 10 Hz.
+
+"""
+
+import time
+import numpy as np
+import pandas as pd
+
+# import my own functions
+from calculation_massflow import find_neutral_plane, calculation_neutral_plane
+
+# synthetic velocity profile: one hour at 10 Hz with a neutral plane that moves between 0.8 and 1.2 m
+frequency = 10
+testing_time = np.arange(0, 3600, 1/frequency)
+heights = np.linspace(0.2,1.8,9)
+neutral_plane_true = 1.0 + 0.2 * np.sin(2 * np.pi * testing_time / 1200)
+
+rng = np.random.default_rng(0)
+velocities = 3 * (neutral_plane_true[:, None] - heights[None, :]) + rng.normal(0, 0.1, (len(testing_time), len(heights)))
+df = pd.DataFrame(velocities, columns = [f"V_{height}" for height in range(20,200,20)])
+
+print(f"Neutral plane benchmark: {len(df)} time steps x {len(heights)} heights")
+
+# row-wise implementation
+start = time.time()
+neutral_plane_rowwise = df.apply(lambda row: find_neutral_plane(row, heights), axis = 1).astype(float).values
+time_rowwise = time.time() - start
+print(f" row-wise (apply): {np.round(time_rowwise,3)} seconds")
+
+# vectorised implementation
+start = time.time()
+neutral_plane_vectorised, crossings = calculation_neutral_plane(df.values, heights)
+time_vectorised = time.time() - start
+print(f" vectorised: {np.round(time_vectorised,4)} seconds")
+
+print(f" speed-up: {np.round(time_rowwise / time_vectorised)}x")
+print(f" maximum difference: {np.nanmax(np.abs(neutral_plane_rowwise - neutral_plane_vectorised))} m")
+print(f" time steps with more than one crossing: {(np.sum(~np.isnan(crossings), axis = 1) > 1).sum()}")
+
+assert np.allclose(neutral_plane_rowwise, neutral_plane_vectorised, equal_nan = True)
@@ -5,316 +5,1023 @@ Functions used to calculate velocities mass flow at the door from pressure probe
 
 from scipy.signal import savgol_filter
 import numpy as np
+import pandas as pd
+import re
 from scipy import interpolate
 
+# import my own data
+from repair_schedule import repair_schedule
+
 def calculation_area(number_of_heights = 9, delta_height = 0.2, door_width = 0.8):
     """
-    Returns a list with the equivalent area fraction of the door for each probe.
+    Returns a list with the equivalent area fraction of the door for each probe.
+    
+    The list provides a number of areas equal to the number of heights measured. Some heights (0.4 m and 1.6 m) have three pressure probes.
+    
+    Parameters:
+    ----------
+    number_of_heights: number of heights at which pressure probes were located
+        int
+    
+    delta_height: fraction of the door corresponding to a single pressure probe
+        float
+        
+    door_width: width of the door
+        float
+        
+    Returns:
+    -------
+    areas = list with the corresponding door area for each pressure probe height
+        list
+    """
+    areas = [delta_height * door_width] * number_of_heights
+    
+    return areas
+
+
+# pressure transducers used for each pressure probe
+omega_probes = ["P1.20", "P2.40", "P3.40", "P4.40", "P5.60", "P6.80"]
+gems_probes = ["P7.100", "P8.120", "P9.140", "P10.160", "P11.160", "P12.160", "P13.180"]
+
+# heights (cm) of the door profiles. Three probes were located at 0.4 m and 1.6 m and the working ones are averaged
+door_heights = list(range(20,200,20))
+probe_averages = {"Alpha1": {40: ["P2.40", "P3.40", "P4.40"], 160: ["P12.160"]},
+                  "Alpha2": {40: ["P2.40", "P3.40", "P4.40"], 160: ["P12.160"]},
+                  "Beta1": {40: ["P2.40", "P4.40"], 160: ["P10.160"]},
+                  "Beta2": {40: ["P2.40", "P3.40", "P4.40"], 160: ["P10.160", "P12.160"]},
+                  "Gamma": {40: ["P2.40", "P3.40", "P4.40"], 160: ["P10.160", "P11.160", "P12.160"]}}
+probe_averages_all = {40: ["P2.40", "P3.40", "P4.40"], 160: ["P10.160", "P11.160", "P12.160"]}
+
+# number of rows processed at once by the stages that work row by row
+block_rows = 8192
+
+
+def calculation_door_profiles(df, test_name, gamma = 0.94, omega_factor = 2.49, gems_factor = 10, window_length = 31,
+                              polyorder = 2, repairs = None, areas = None, Cd = 0.68):
+    """
+    Runs the door frame analysis as a chain of array stages: raw pressures -> DeltaP -> smoothed DeltaP -> pressure
+    profile (PP) -> temperature -> density -> velocity -> neutral plane (-> mass flow)
+    
+    The output of every stage is written into a single matrix that holds all the columns of the final DataFrame
+    (see door_frame_dataframe). Nothing is written to df.
+    
+    Parameters:
+    ----------
+    df: pandas DataFrame with the raw test data (testing_time in seconds)
+        pd.DataFrame
+        
+    test_name: name of the test. Required to perform individualized cleaning of the data
+        str
+        
+    gamma, omega_factor, gems_factor, window_length, polyorder, repairs: see calculation_velocity
+    
+    areas: fraction of the door area to which each pressure probe corresponds. The mass flow is only calculated
+           if given
+        list
+        
+    Cd: discharge coefficient
+        float
+    
+    Returns:
+    -------
+    profiles: "values" and "columns" of the final DataFrame, "index" of the rows without nan values, 
+              "temperature_ambient" and "Repair_Flags" (see door_profile_matrix to extract a single profile)
+        dict
+    """
+    if repairs is None:
+        repairs = repair_schedule.get(test_name, [])
+    
+    raw_columns = list(df.columns)
+    raw = np.asarray(df.values, dtype = float)
+    testing_time = raw[:, raw_columns.index("testing_time")]
+    
+    # create a mask to access values before start test
+    mask_prestart = testing_time < 0
+    
+    # fix damaged door temperatures (e.g. TDD.40 for Beta2) by interpolating from the other TCs
+    tdd_columns = [column for column in raw_columns if re.match(r"TDD\.\d+$", column)]
+    tdd_columns.sort(key = lambda column: int(column.split(".")[1]))
+    tdd_indices = [raw_columns.index(column) for column in tdd_columns]
+    tdd = raw[:, tdd_indices]
+    compiled_repairs = compile_repair_schedule(repairs, testing_time, [int(x.split(".")[1]) for x in tdd_columns], "TDD.")
+    repair_flags = apply_repair_schedule(tdd, compiled_repairs)
+    
+    # calculate ambient temperature as mean value of all temperatures before start and assing to h = 20 cm.
+    temperature_indices = [i for i, column in enumerate(raw_columns) if "TDD" in column]
+    temperatures_prestart = raw[mask_prestart][:, temperature_indices]
+    temperatures_prestart[:, [temperature_indices.index(i) for i in tdd_indices]] = tdd[mask_prestart]
+    temperature_ambient = np.nanmean(np.nanmean(temperatures_prestart, axis = 0))
+    
+    # calculate mean value reported by the pressure probes before start test
+    pressure_columns = [x for x in raw_columns if "P" in x]
+    pressure_indices = [raw_columns.index(column) for column in pressure_columns]
+    pressure_prestart_mean = np.nanmean(raw[mask_prestart][:, pressure_indices], axis = 0)
+    
+    # drop all nan values before continuing with smoothing (raises LinAlgError)
+    mask_nan = np.isnan(raw)
+    mask_nan[:, tdd_indices] = np.isnan(tdd)
+    mask_valid = ~mask_nan.any(axis = 1)
+    if np.isnan(temperature_ambient) or np.isnan(pressure_prestart_mean).any():
+        mask_valid[:] = False
+    
+    # layout of the final DataFrame: one block of columns per stage, in the order in which they have always been 
+    # created
+    averaged_heights = sorted(probe_averages.get(test_name, probe_averages_all).keys())
+    pp_heights = averaged_heights + [x for x in door_heights if x not in averaged_heights]
+    tc_heights = [20] + [x for x in pp_heights if x != 20]
+    deltap_columns = [column for column in pressure_columns if column in omega_probes + gems_probes]
+    
+    blocks = [("raw", raw_columns + ([] if "TDD.20" in raw_columns else ["TDD.20"])),
+              ("zeroed", [f"{x}_zeroed" for x in pressure_columns]),
+              ("deltap", [f"{x}_DeltaP" for x in deltap_columns]),
+              ("deltap_smooth", [f"{x}_DeltaP_smooth" for x in deltap_columns]),
+              ("PP", [f"PP_{x}" for x in pp_heights]),
+              ("TC", [f"TC_{x}" for x in tc_heights]),
+              ("Rho", [f"Rho_{x}" for x in tc_heights]),
+              ("V", [f"V_{x}" for x in door_heights]),
+              ("Neutral_Plane", ["Neutral_Plane", "Neutral_Plane_Smooth", "Neutral_Plane_Thermal", 
+                                 "Neutral_Plane_Disagreement"])]
+    if areas is not None:
+        blocks += [("M", [f"M_{x}" for x in door_heights]),
+                   ("mass", ["mass_in", "mass_out", "mass_average", "hrr_internal_allmassin"])]
+    
+    # allocate all the columns at once. Each stage writes into its own block
+    columns = [column for _, block_columns in blocks for column in block_columns]
+    values = np.empty((mask_valid.sum(), len(columns)))
+    view = {}
+    i = 0
+    for name, block_columns in blocks:
+        view[name] = values[:, i:i+len(block_columns)]
+        i += len(block_columns)
+    
+    # raw data (with the repaired door temperatures and the ambient temperature at h = 20 cm)
+    for j in range(len(raw_columns)):
+        view["raw"][:, j] = tdd[mask_valid, tdd_indices.index(j)] if j in tdd_indices else raw[mask_valid, j]
+    view["raw"][:, columns.index("TDD.20")] = temperature_ambient
+    repair_flags = repair_flags[mask_valid]
+    
+    # calculate the zeroed values for the pressure channels (value - mean_prestart)
+    for j, i in enumerate(pressure_indices):
+        np.subtract(view["raw"][:, i], pressure_prestart_mean[j], out = view["zeroed"][:, j])
+    
+    # calculate the pressure difference from the zeroed values and smooth it using a savitsky-golay filter
+    for j, column in enumerate(deltap_columns):
+        factor = omega_factor if column in omega_probes else gems_factor
+        np.multiply(view["zeroed"][:, pressure_columns.index(column)], factor, out = view["deltap"][:, j])
+        view["deltap_smooth"][:, j] = savgol_filter(view["deltap"][:, j], window_length, polyorder)
+    
+    # assign (or average) the smoothed readings to their respective heights
+    pp = calculation_pressure_profile(view["deltap_smooth"], deltap_columns, test_name)
+    
+    # clean up the data for each test by interpolating and extrapolating to substitute damaged data
+    compiled_repairs = compile_repair_schedule(repairs, testing_time[mask_valid], door_heights, "PP_")
+    repair_flags |= apply_repair_schedule(pp, compiled_repairs)
+    
+    view["PP"][:] = pp[:, [door_heights.index(x) for x in pp_heights]]
+    del pp
+    
+    # the stages that work row by row are run over blocks of rows to keep the intermediate arrays small
+    pp_columns = [pp_heights.index(x) for x in door_heights]
+    tdd_profile_columns = [columns.index(f"TDD.{x}") for x in door_heights]
+    tc_order = [door_heights.index(x) for x in tc_heights]
+    for start in range(0, len(values), block_rows):
+        rows = slice(start, start + block_rows)
+        pp = view["PP"][rows][:, pp_columns]
+        
+        # temperature, density and velocity at every height (door temperatures with ambient temperature at h = 20 cm)
+        tc = calculation_door_temperature(pp, view["raw"][rows][:, tdd_profile_columns], temperature_ambient)
+        rho = calculation_density(tc)
+        view["V"][rows] = calculation_probe_velocity(pp, rho, gamma)
+        view["TC"][rows] = tc[:, tc_order]
+        view["Rho"][rows] = rho[:, tc_order]
+        
+        # calculate neutral plane by interpolating the velocity values, and independently from the door temperatures
+        view["Neutral_Plane"][rows, 0], _ = calculation_neutral_plane(view["V"][rows], np.array(door_heights)/100)
+        view["Neutral_Plane"][rows, 2] = calculation_thermal_neutral_plane(view["raw"][rows][:, tdd_profile_columns],
+                                                                           np.array(door_heights)/100, 
+                                                                           temperature_ambient)
+        
+        # mass flow at every height and total inflow and outflow
+        if areas is not None:
+            massflow = calculation_door_massflow(rho, view["V"][rows], areas, Cd)
+            view["M"][rows] = massflow["M"]
+            for j, column in enumerate(["mass_in", "mass_out", "mass_average", "hrr_internal_allmassin"]):
+                view["mass"][rows, j] = massflow[column]
+    
+    view["Neutral_Plane"][:, 1] = pd.Series(view["Neutral_Plane"][:, 0]).rolling(30).mean().values
+    np.subtract(view["Neutral_Plane"][:, 0], view["Neutral_Plane"][:, 2], out = view["Neutral_Plane"][:, 3])
+    
+    profiles = {"index": df.index[mask_valid],
+                "columns": columns,
+                "values": values,
+                "temperature_ambient": temperature_ambient,
+                "Repair_Flags": repair_flags}
+    
+    return profiles
+
+
+def door_profile_matrix(profiles, prefix):
+    """
+    Extracts the (time x heights) matrix of one of the door profiles from the output of calculation_door_profiles
+    
+    Parameters:
+    ----------
+    profiles: output of calculation_door_profiles
+        dict
+        
+    prefix: start of the column names (e.g. "PP_", "TC_", "Rho_", "V_", "M_" or "TDD.")
+        str
+        
+    Returns:
+    -------
+    matrix: values of the profile with the heights in the order of door_heights
+        np.array
+    """
+    return profiles["values"][:, [profiles["columns"].index(f"{prefix}{x}") for x in door_heights]]
+
+
+def calculation_pressure_profile(deltap_smooth, deltap_columns, test_name):
+    """
+    Assigns the smoothed pressure differences to their respective heights, averaging the working probes at the 
+    heights with more than one probe
+    
+    Parameters:
+    ----------
+    deltap_smooth: smoothed pressure differences with one column per probe
+        np.array
+        
+    deltap_columns: names of the probes (e.g. "P1.20") in the same order as the columns of deltap_smooth
+        list
+        
+    test_name: name of the test. Determines which probes are averaged (all probes at a height for unknown tests)
+        str
+        
+    Returns:
+    -------
+    pp: pressure difference at each of door_heights
+        np.array
+    """
+    averages = probe_averages.get(test_name, probe_averages_all)
+    
+    pp = np.empty((len(deltap_smooth), len(door_heights)))
+    for i, height in enumerate(door_heights):
+        if height in averages:
+            probes = averages[height]
+        else:
+            probes = [column for column in deltap_columns if column.split(".")[1] == str(height)]
+        pp[:, i] = deltap_smooth[:, [deltap_columns.index(probe) for probe in probes]].mean(axis = 1)
+    
+    return pp
+
+
+def calculation_door_temperature(pp, tdd_profile, temperature_ambient):
+    """
+    Temperature of the gases crossing the door. If delta p is positive (inflow) the temperature equals ambient 
+    temperature, otherwise the door thermocouple reading is used
+    
+    Parameters:
+    ----------
+    pp: pressure difference at each height (heights in the last dimension)
+        np.array
+        
+    tdd_profile: door thermocouple readings at the same heights
+        np.array
+        
+    temperature_ambient: ambient temperature
+        float
+        
+    Returns:
+    -------
+    tc: temperature at each height
+        np.array
+    """
+    tc = np.where(pp > 0, temperature_ambient, tdd_profile)
+    
+    return tc
+
+
+def calculation_density(tc):
+    """
+    Density of the gases (ideal gas with the molecular weight of air) from their temperature in Celsius
+    
+    Parameters:
+    ----------
+    tc: temperature
+        np.array
+        
+    Returns:
+    -------
+    rho: density
+        np.array
+    """
+    rho = 353 / (tc + 273)
+    
+    return rho
+
+
+def calculation_viscosity(rho):
+    """
+    Dynamic viscosity of the gases (Sutherland's law for air) at the temperature that corresponds to their density 
+    (see calculation_density)
+    
+    Parameters:
+    ----------
+    rho: density
+        np.array
+        
+    Returns:
+    -------
+    mu: dynamic viscosity (Pa s)
+        np.array
+    """
+    temperature = 353 / rho
+    mu = 1.716e-5 * (temperature / 273.15)**1.5 * (273.15 + 110.4) / (temperature + 110.4)
+    
+    return mu
+
+
+def calculation_probe_velocity(pp, rho, gamma = 0.94):
+    """
+    Velocity from the bidirectional probe pressure difference. Negative delta P gives a negative (outward) velocity
+    
+    Parameters:
+    ----------
+    pp: pressure difference
+        np.array
+        
+    rho: density
+        np.array
+        
+    gamma: calibration constant for the pressure probe, or a calibration curve as a function of the Reynolds number
+           (see probe_calibration.py and calculation_probe_velocity_calibrated)
+        float or dict
+        
+    Returns:
+    -------
+    velocity: velocity
+        np.array
+    """
+    if isinstance(gamma, dict):
+        return calculation_probe_velocity_calibrated(pp, rho, gamma)
+    
+    velocity = gamma * (2 * np.abs(pp) / rho)**0.5
+    velocity = np.where(pp < 0, -velocity, velocity)
+    
+    return velocity
+
+
+def calculation_probe_velocity_calibrated(pp, rho, calibration, max_iterations = 20, tolerance = 1e-10):
+    """
+    Velocity from the bidirectional probe pressure difference with a probe coefficient that depends on the Reynolds 
+    number of the probe, which in turn depends on the velocity. The implicit relation
+    
+        gamma = calibration(Re_0 * gamma), with Re_0 = rho * sqrt(2 * |dp| / rho) * diameter / mu
+    
+    is solved for all the probes and time steps at once with a safeguarded Newton iteration (bisection whenever the 
+    Newton step leaves the bracket of the solution). Only the elements that have not converged are iterated.
+    
+    Parameters:
+    ----------
+    pp: pressure difference
+        np.array
+        
+    rho: density
+        np.array
+        
+    calibration: "diameter" of the probe (m) and "gamma" as a function of "Re" (see probe_calibration.py)
+        dict
+        
+    max_iterations: maximum number of iterations
+        int
+        
+    tolerance: absolute tolerance on gamma
+        float
+        
+    Returns:
+    -------
+    velocity: velocity
+        np.array
+    """
+    Re_table = np.asarray(calibration["Re"], dtype = float)
+    gamma_table = np.asarray(calibration["gamma"], dtype = float)
+    slope_table = np.r_[np.diff(gamma_table) / np.diff(Re_table), 0]
+    
+    pp, rho = np.broadcast_arrays(np.asarray(pp, dtype = float), np.asarray(rho, dtype = float))
+    velocity_ideal = (2 * np.abs(pp) / rho)**0.5
+    Re_ideal = rho * velocity_ideal * calibration["diameter"] / calculation_viscosity(rho)
+    
+    # the solution is bracketed by the extreme values of the calibration curve (solutions on the flat ends of the 
+    # curve are the extreme values themselves)
+    gamma = np.full(pp.shape, np.nan)
+    active = np.flatnonzero(np.isfinite(Re_ideal))
+    Re_0 = Re_ideal.ravel()[active]
+    for g_extreme in [gamma_table.min(), gamma_table.max()]:
+        converged = np.abs(g_extreme - np.interp(Re_0 * g_extreme, Re_table, gamma_table)) < tolerance
+        gamma.ravel()[active[converged]] = g_extreme
+        active, Re_0 = active[~converged], Re_0[~converged]
+    lower = np.full(len(active), gamma_table.min())
+    upper = np.full(len(active), gamma_table.max())
+    g = np.interp(Re_0 * gamma_table.mean(), Re_table, gamma_table)
+    
+    for _ in range(max_iterations):
+        Re = Re_0 * g
+        residual = g - np.interp(Re, Re_table, gamma_table)
+        
+        # elements that have converged are stored and removed from the iteration
+        converged = np.abs(residual) < tolerance
+        gamma.ravel()[active[converged]] = g[converged]
+        keep = ~converged
+        active, Re_0, g, Re, residual = active[keep], Re_0[keep], g[keep], Re[keep], residual[keep]
+        lower, upper = np.where(residual < 0, g, lower[keep]), np.where(residual > 0, g, upper[keep])
+        if not len(active):
+            break
+        
+        # Newton step with the slope of the segment of the calibration curve, bisection if it leaves the bracket
+        segment = np.searchsorted(Re_table, Re, side = "right") - 1
+        slope = np.where(segment >= 0, slope_table[np.maximum(segment, 0)], 0)
+        g_newton = g - residual / (1 - Re_0 * slope)
+        g = np.where((g_newton >= lower) & (g_newton <= upper), g_newton, (lower + upper) / 2)
+    
+    # elements that did not converge keep their last estimate
+    gamma.ravel()[active] = g
+    
+    velocity = gamma * velocity_ideal
+    velocity = np.where(pp < 0, -velocity, velocity)
+    
+    return velocity
+
+
+def door_frame_dataframe(profiles):
+    """
+    Wraps the matrix filled by calculation_door_profiles into a DataFrame (without copying it) and adds the 
+    Repair_Flags column
+    
+    Parameters:
+    ----------
+    profiles: output of calculation_door_profiles
+        dict
+        
+    Returns:
+    -------
+    df: pandas DataFrame with the formatted and calculated data
+        pd.DataFrame
+    """
+    df = pd.DataFrame(profiles["values"], index = profiles["index"], columns = profiles["columns"], copy = False)
+    
+    # record which repairs were applied at every time step (before the mass flow columns, as always)
+    df.insert(profiles["columns"].index("Neutral_Plane_Disagreement") + 1, "Repair_Flags", profiles["Repair_Flags"])
+    
+    return df
+
+
+def calculation_velocity(df, test_name, gamma = 0.94, omega_factor = 2.49, gems_factor = 10, window_length = 31, polyorder = 2,
+                         repairs = None):
+    """
+    Calculates gas flow velocity from the pressure probe readings
+    
+    Parameters:
+    ----------
+    df: pandas DataFrame with the raw test data
+        pd.DataFrame
+        
+    gamma: calibration constant for the pressure probe, or a calibration curve as a function of the Reynolds number
+           (see probe_calibration.py)
+        float or dict
+        
+    omega_factor: conversion factor for the omega pressure transducers
+        float
+        
+    gems_factor: conversion factor for the gems pressure transducers
+        int
+        
+    window_length: the length of the filter window for the Savitsky-Golay filter
+        int
+        
+    polyorder: the order of the polynomial used to fit the samples with the Savitsky-Golay filter
+    
+    test_name: name of the test. Required to perform individualized cleaning of the data
+        str
+        
+    repairs: repairs of damaged sensors (see repair_schedule.py). If None, the repairs listed for test_name in 
+             repair_schedule are applied
+        list
+        
+    Returns:
+    -------
+    df: new pandas DataFrame with the formatted and calculated data (the input DataFrame is not modified)
+        pd.DataFrame
+    """
+    profiles = calculation_door_profiles(df, test_name, gamma, omega_factor, gems_factor, window_length, polyorder,
+                                         repairs)
+    
+    return door_frame_dataframe(profiles)
+
+
+def extrapolate(x, y, x_ext):
+    """
+    Short definition of function to implement the extrapolation in the data frame
+    
+    Parameters:
+    ----------
+    row: pandas DataFrame containing all the time dependant data
+        np.array
+    
+    x: value at which the extrapolating function should be evaluated
+        float
+    
+    Returns:
+    -------
+    y_ext: f(x). Interpolate value
+        float
+    
+    """
+
+    extrapolating_function = interpolate.interp1d(x = x,
+                                              y = y,
+                                              kind = 'linear',
+                                              fill_value = 'extrapolate')
+    
+    y_ext = extrapolating_function(x_ext)
+    
+    return y_ext
+
+def repair_weights(source_heights, target_height, extrapolate = True):
+    """
+    Finds the segment of source_heights used to estimate the value at target_height and the weight of its upper end
+    
+    Parameters:
+    ----------
+    source_heights: heights of the working sensors (sorted)
+        list
+        
+    target_height: height of the sensor to be repaired
+        float
+        
+    extrapolate: see repair_linear
+        bool
+        
+    Returns:
+    -------
+    i: index of the lower end of the segment (the upper end is i + 1)
+        int
+        
+    weight: value(target_height) = value[i] + weight * (value[i+1] - value[i])
+        float
+    """
+    source_heights = np.asarray(source_heights, dtype = float)
+    
+    # only the segment that brackets (or is closest to) the target height is used
+    i = np.searchsorted(source_heights, target_height, side = "right") - 1
+    i = int(np.clip(i, 0, len(source_heights) - 2))
+    
+    weight = (target_height - source_heights[i]) / (source_heights[i+1] - source_heights[i])
+    if not extrapolate:
+        weight = float(np.clip(weight, 0, 1))
+    
+    return i, weight
+
+
+def repair_linear(values, source_heights, target_height, extrapolate = True):
+    """
+    Estimates the value at target_height from the readings at source_heights for all time steps at once
+    
+    Gives the same result as extrapolate() (extrapolate = True) or np.interp (extrapolate = False) applied row by
+    row, but the bracketing segment is found once and the repaired values are computed with array arithmetic.
+    
+    Parameters:
+    ----------
+    values: readings of the working sensors, with one row per time step and one column per source height
+        np.array
+    
+    source_heights: heights of the working sensors (sorted)
+        list
+        
+    target_height: height of the sensor to be repaired
+        float
+        
+    extrapolate: if True, targets outside the source heights are extrapolated linearly from the closest
+                 segment. If False, they take the value of the closest sensor (as np.interp)
+        bool
+    
+    Returns:
+    -------
+    repaired_values: estimated value at target_height for every time step
+        np.array
+    """
+    values = np.asarray(values, dtype = float)
+    i, weight = repair_weights(source_heights, target_height, extrapolate)
+    
+    repaired_values = values[:, i] + weight * (values[:, i+1] - values[:, i])
+    
+    return repaired_values
+
+
+def repair_channel(df, target_column, source_columns, source_heights, target_height, mask = None, extrapolate = True):
+    """
+    Substitutes the damaged data in target_column with the values estimated from source_columns using repair_linear
+    
+    Parameters:
+    ----------
+    df: pandas DataFrame with the test data. It is modified in place
+        pd.DataFrame
+        
+    target_column: name of the column with damaged data
+        str
+        
+    source_columns: names of the columns of the working sensors
+        list
+        
+    source_heights: heights of the working sensors (same order as source_columns)
+        list
+        
+    target_height: height of the damaged sensor
+        float
+        
+    mask: time steps to be repaired. All time steps are repaired if None
+        pd.Series
+        
+    extrapolate: see repair_linear
+        bool
+        
+    Returns:
+    -------
+    None
+    """
+    if mask is None:
+        mask = np.ones(len(df), dtype = bool)
+    mask = np.asarray(mask, dtype = bool)
+    
+    df.loc[mask, target_column] = repair_linear(df.loc[mask, source_columns].values, source_heights, target_height,
+                                                extrapolate)
+    
+    return
+
+
+def compile_repair_schedule(repairs, testing_time, heights, prefix):
+    """
+    Converts the repairs of one type of sensor into the rows, columns and weights needed to apply them
+    
+    Time windows shared by several repairs are only evaluated once.
+    
+    Parameters:
+    ----------
+    repairs: all the repairs of a test (see repair_schedule.py)
+        list
+        
+    testing_time: testing time in seconds
+        np.array
+        
+    heights: heights of the columns of the matrix the repairs will be applied to
+        list
+        
+    prefix: type of sensor to compile (e.g. "PP_" or "TDD."). Repairs of other sensors are skipped
+        str
+        
+    Returns:
+    -------
+    compiled_repairs: one dictionary per repair with its flag bit, rows, target and source columns and weight
+        list
+    """
+    testing_time = np.asarray(testing_time, dtype = float)
+    heights = list(heights)
+    
+    window_rows = {}
+    compiled_repairs = []
+    for bit, repair in enumerate(repairs):
+        
+        # the position of the repair in the list is also its bit in the repair flags
+        channel_prefix, target_height = re.match(r"(\D+)(\d+)$", repair["channel"]).groups()
+        if channel_prefix != prefix:
+            continue
+        
+        # rows to be repaired (evaluated once per set of time windows)
+        windows = repair["windows"]
+        key = None if windows is None else tuple(windows)
+        if key not in window_rows:
+            if windows is None:
+                mask = np.ones(len(testing_time), dtype = bool)
+            else:
+                mask = np.zeros(len(testing_time), dtype = bool)
+                for start, end in windows:
+                    end = np.inf if end is None else end
+                    mask |= (testing_time > start) & (testing_time < end)
+            window_rows[key] = np.flatnonzero(mask)
+        
+        # segment and weight used for the linear estimate
+        source_heights = repair["source_heights"]
+        i, weight = repair_weights(source_heights, int(target_height), repair["method"] == "extrapolate")
+        
+        compiled_repairs.append({"bit": bit,
+                                 "rows": window_rows[key],
+                                 "target": heights.index(int(target_height)),
+                                 "below": heights.index(source_heights[i]),
+                                 "above": heights.index(source_heights[i+1]),
+                                 "weight": weight})
+    
+    return compiled_repairs
+
+
+def apply_repair_schedule(values, compiled_repairs):
+    """
+    Applies compiled repairs to a (time x heights) matrix in the order in which they were listed
+    
+    Parameters:
+    ----------
+    values: readings with one row per time step and one column per height (any other dimensions, e.g. Monte Carlo
+            samples, go in between). It is modified in place
+        np.array
+        
+    compiled_repairs: output of compile_repair_schedule
+        list
+        
+    Returns:
+    -------
+    repair_flags: bit i is set at the time steps where repair i of the schedule was applied
+        np.array
+    """
+    repair_flags = np.zeros(len(values), dtype = np.uint32)
+    
+    for repair in compiled_repairs:
+        rows = repair["rows"]
+        below = values[rows, ..., repair["below"]]
+        values[rows, ..., repair["target"]] = below + repair["weight"] * (values[rows, ..., repair["above"]] - below)
+        repair_flags[rows] |= np.uint32(1 << repair["bit"])
+        
+    return repair_flags
+
+
+def find_neutral_plane(x,y):
+    """
+    Interpolates the velocity profile to find the neutral plane
+    
+    Parameters:
+    ----------
+    x: velocities
+        np.array
+        
+    y: heights
+        np.array
+        
+    Returns:
+    -------
+    neutral_plane: height of the neutral plane
+        float
+    """
+    
+    # create a set of tuples that contains the velocity and their respective height
+    pos = (0,0)
+    neg = (0,0)
+    
+    # determine the height of the last positive velocity and the first negative velocity
+    for i,vel in enumerate(x.values):
+        if vel < 0:
+            if i != 0:
+                neg = (vel, y[i])
+                pos = (x.values[i-1], y[i-1])
+                break
+    
+    # interpolate 
+    f = interpolate.interp1d(x = [pos[0], neg[0]], y = [pos[1], neg[1]],
+                             kind="linear", fill_value = 'extrapolate')
+    
+    # evaluate the interpolating function to find the velocity
+    neutral_plane = f(0)
+
+    return neutral_plane
+
+
+def calculation_neutral_plane(velocities, heights):
+    """
+    Finds the neutral plane for every time step at once from the (time x heights) velocity matrix
     
-    The list provides a number of areas equal to the number of heights measured. Some heights (0.4 m and 1.6 m) have three pressure probes.
+    Uses the same criterion as find_neutral_plane (first negative velocity above the lowest probe, linearly
+    interpolated to zero against the probe below it), but without creating an interpolating function per row.
+    It also returns every height at which the velocity profile changes sign.
     
     Parameters:
     ----------
-    number_of_heights: number of heights at which pressure probes were located
-        int
-    
-    delta_height: fraction of the door corresponding to a single pressure probe
-        float
+    velocities: velocities with one row per time step and one column per height (ordered from the bottom)
+        np.array
         
-    door_width: width of the door
-        float
+    heights: heights of the pressure probes
+        np.array
         
     Returns:
     -------
-    areas = list with the corresponding door area for each pressure probe height
-        list
+    neutral_plane: height of the neutral plane at every time step (nan if the profile never turns negative)
+        np.array
+        
+    crossings: heights of every sign change between consecutive probes (nan where there is no sign change)
+        np.array
     """
-    areas = [delta_height * door_width] * number_of_heights
+    velocities = np.asarray(velocities, dtype = float)
+    heights = np.asarray(heights, dtype = float)
     
-    return areas
+    # straight line between each pair of consecutive probes evaluated at zero velocity
+    v_below = velocities[:, :-1]
+    v_above = velocities[:, 1:]
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        zero_heights = heights[:-1] + (0 - v_below) * (heights[1:] - heights[:-1]) / (v_above - v_below)
+    
+    # every sign change in the profile
+    mask_crossing = (v_below < 0) != (v_above < 0)
+    crossings = np.where(mask_crossing, zero_heights, np.nan)
+    
+    # the neutral plane is given by the first negative velocity (the lowest probe is never considered on its own)
+    mask_negatives = v_above < 0
+    first_negative = mask_negatives.argmax(axis = 1)
+    neutral_plane = zero_heights[np.arange(len(velocities)), first_negative]
+    neutral_plane[~mask_negatives.any(axis = 1)] = np.nan
+    
+    return neutral_plane, crossings
 
 
-def calculation_velocity(df, test_name, gamma = 0.94, omega_factor = 2.49, gems_factor = 10, window_length = 31, polyorder = 2):
+def calculation_thermal_neutral_plane(tdd_profile, heights, temperature_ambient, method = "threshold", fraction = 0.5,
+                                      min_rise = 10):
     """
-    Calculates gas flow velocity from the pressure probe readings
+    Estimates the neutral plane for every time step at once from the door temperatures, independently of the pressure
+    probes, as the bottom of the hot layer leaving the compartment
     
     Parameters:
     ----------
-    df: pandas DataFrame with the raw test data
-        pd.DataFrame
+    tdd_profile: door temperatures with one row per time step and one column per height (ordered from the bottom)
+        np.array
         
-    gamma: calibration constant for the pressure probe
-        float
+    heights: heights of the thermocouples
+        np.array
         
-    omega_factor: conversion factor for the omega pressure transducers
+    temperature_ambient: ambient temperature
         float
         
-    gems_factor: conversion factor for the gems pressure transducers
-        int
+    method: "threshold" gives the lowest height at which the temperature rise reaches fraction of the largest rise of
+            the profile (linearly interpolated), "gradient" the middle of the segment with the steepest temperature 
+            increase
+        str
         
-    window_length: the length of the filter window for the Savitsky-Golay filter
-        int
+    fraction: fraction of the largest temperature rise used by the threshold method
+        float
         
-    polyorder: the order of the polynomial used to fit the samples with the Savitsky-Golay filter
-    
-    test_name: name of the test. Required to perform individualized cleaning of the data
-        str
+    min_rise: minimum temperature rise of the profile (C). The neutral plane is nan if there is no hot layer
+        float
         
     Returns:
     -------
-    df: pandas DataFrame with the formatted and calculated data
-        pd.DataFrame
+    neutral_plane: height of the neutral plane at every time step
+        np.array
     """
-    # create a mask to access values before start test
-    mask_prestart = df.loc[:, "testing_time"] < 0
-    
-    # fix temperature TDD.40 for Beta2 by interpolating from the other TCs
-    if test_name == "Beta2":
-        
-        # extrapolate to obtain temperature at 04 meters
-        df.loc[:, "TDD.40"] = df.loc[:, ["TDD.60", "TDD.80","TDD.100","TDD.120", "TDD.140", 
-              "TDD.160", "TDD.180"]].apply(
-                    lambda row: extrapolate([60,80,100,120,140, 160, 180], row.values, 40), axis = 1)
-    
-    # calculate ambient temperature as mean value of all temperatures before start and assing to h = 20 cm.
-    temperature_columns = []
-    for column in df:
-        if "TDD" in column:
-            temperature_columns.append(column)
-    temperature_ambient = df.loc[mask_prestart, temperature_columns].mean().mean()
+    tdd_profile = np.asarray(tdd_profile, dtype = float)
+    heights = np.asarray(heights, dtype = float)
+    rows = np.arange(len(tdd_profile))
     
-    df["TDD.20"] = temperature_ambient
-
-    # calculate mean value reported by the pressure probes before start test
-    pressure_columns = [x for x in df.columns if "P" in x]
-    pressure_prestart_mean = df.loc[mask_prestart, pressure_columns].mean()
+    rise = tdd_profile - temperature_ambient
+    with np.errstate(invalid = "ignore"):
+        max_rise = np.max(np.where(np.isnan(rise), -np.inf, rise), axis = 1)
     
-    # calculate the zeroed values for the pressure channels (value - mean_prestart)
-    for column in pressure_prestart_mean.index:
-        df.loc[:, f"{column}_zeroed"] = df.loc[:, column] - pressure_prestart_mean[column]
+    if method == "threshold":
+        # first thermocouple above the threshold and straight line from the thermocouple below it
+        level = fraction * max_rise
+        above = rise[:, 1:] >= level[:, None]
+        i = above.argmax(axis = 1)
+        r_below, r_above = rise[rows, i], rise[rows, i + 1]
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            neutral_plane = heights[i] + (level - r_below) * (heights[i + 1] - heights[i]) / (r_above - r_below)
+        neutral_plane = np.where(rise[:, 0] >= level, heights[0], neutral_plane)
+    elif method == "gradient":
+        gradient = np.diff(tdd_profile, axis = 1) / np.diff(heights)
+        i = np.argmax(np.where(np.isnan(gradient), -np.inf, gradient), axis = 1)
+        neutral_plane = (heights[i] + heights[i + 1]) / 2
+    else:
+        raise ValueError(f"unknown method {method}")
     
-    # determine which pressure transducers were used for each sensor
-    omega = ["P1.20", "P2.40", "P3.40", "P4.40", "P5.60", "P6.80"]
-    gems = ["P7.100", "P8.120", "P9.140", "P10.160", "P11.160", "P12.160", "P13.180"]
+    neutral_plane[~(max_rise >= min_rise)] = np.nan
     
-    # calculate the pressure difference from the zeroed values
-    for column in df:
-        if "zeroed" not in column:
-            pass
-        else:
-            probe = column.split("_")[0]
-            if probe in omega:
-                df.loc[:, f"{probe}_DeltaP"] = df.loc[:, column] * omega_factor
-            elif probe in gems:
-                df.loc[:, f"{probe}_DeltaP"] = df.loc[:, column] * gems_factor
+    return neutral_plane
     
-    # drop all nan values before continuing with smoothing (raises LinAlgError)
-    df.dropna(axis = 0, inplace = True)
-    
-    # smooth the pressure readings using a savitsky-golay filter
-    for column in df:
-        if "DeltaP" in column:
-            df.loc[:, f"{column}_smooth"] = savgol_filter(df.loc[:, column],window_length, polyorder)
-    
-    # average those probes 0.4 from the ground
-    if test_name in ["Alpha1","Alpha2", "Beta2", "Gamma"]:
-        df.loc[:, "PP_40"] = df.loc[:, ["P2.40_DeltaP_smooth", "P3.40_DeltaP_smooth", 
-              "P4.40_DeltaP_smooth"]].mean(axis = 1)
-    elif test_name in ["Beta1"]:
-        df.loc[:, "PP_40"] = df.loc[:, ["P2.40_DeltaP_smooth", "P4.40_DeltaP_smooth"]].mean(axis = 1)
-        
-    # average probes 1.6 meters from the ground
-    if test_name in ["Alpha1","Alpha2"]:
-        df.loc[:, "PP_160"] = df.loc[:, ["P12.160_DeltaP_smooth"]].mean(axis = 1)
-    elif test_name in ["Beta1"]:
-        df.loc[:, "PP_160"] = df.loc[:, ["P10.160_DeltaP_smooth"]].mean(axis = 1)
-    elif test_name in ["Beta2"]:
-        df.loc[:, "PP_160"] = df.loc[:, ["P10.160_DeltaP_smooth", "P12.160_DeltaP_smooth"]].mean(axis = 1)
-    elif test_name in ["Gamma"]:
-        df.loc[:, "PP_160"] = df.loc[:, ["P10.160_DeltaP_smooth", "P11.160_DeltaP_smooth",
-              "P12.160_DeltaP_smooth"]].mean(axis = 1)
-        
-    # assing new columns with useful data to their respective heights. 
-    # I do this instead of renaming to preserve all data
-    column_new_name = ["PP_20", "PP_60", "PP_80","PP_100","PP_120","PP_140","PP_180"]
-    for i, column_old_name in enumerate(["P1.20_DeltaP_smooth", "P5.60_DeltaP_smooth", "P6.80_DeltaP_smooth",
-                                         "P7.100_DeltaP_smooth", "P8.120_DeltaP_smooth", "P9.140_DeltaP_smooth",
-                                         "P13.180_DeltaP_smooth"]):
-            df.loc[:, column_new_name[i]] = df.loc[:, column_old_name]
-
-    # clean up the data for each test by interpolating and extrapolating to substitute damaged data
-    if test_name == "Alpha2":
-        
-        # between 5 min and 15 min, interpolate PP120 and PP140 to clean data
-        mask_interpolation = (df.loc[:, "testing_time"]/60 > 5) & (df.loc[:, "testing_time"]/60 < 15)
-        df.loc[mask_interpolation, "PP_120"] = df.loc[mask_interpolation, ["PP_100", "PP_160"]].apply(
-                lambda row: np.interp(120,[100,160],row.values), axis = 1)
-        df.loc[mask_interpolation, "PP_140"] = df.loc[mask_interpolation, ["PP_100", "PP_160"]].apply(
-                lambda row: np.interp(140,[100,160],row.values), axis = 1)
-        
-        # between 0 and 5 min, then between 12 and 20 and after 40 minutes extrapolate for PP180
-        mask_extrapolation = (((df.loc[:, "testing_time"]/60 > 0) & (df.loc[:, "testing_time"]/60 < 6)) |
-                              ((df.loc[:, "testing_time"]/60 > 12) & (df.loc[:, "testing_time"]/60 < 21))|
-                              (df.loc[:, "testing_time"]/60 > 40))
-        
-        df.loc[mask_extrapolation, "PP_180"] = df.loc[mask_extrapolation, ["PP_100", "PP_120", "PP_140","PP_160"]].apply(lambda row:
-              extrapolate([100,120,140,160], row.values, 180), axis = 1)
-            
-
-    if test_name == "Beta1":
-        
-        # between 10 min and 20 min extrapolate PP_120 and PP_140
-        mask_extrapolation = (df.loc[:, "testing_time"]/60 > 10) & (df.loc[:, "testing_time"]/60 < 20)
-        df.loc[mask_extrapolation, "PP_20"] = df.loc[mask_extrapolation, ["PP_60", "PP_80"]].apply(
-                lambda row: extrapolate([60,80], row.values, 20), axis = 1)
-        df.loc[mask_extrapolation, "PP_40"] = df.loc[mask_extrapolation, ["PP_60", "PP_80"]].apply(
-                lambda row: extrapolate([60,80], row.values, 40), axis = 1)
-        
-        # between 7 min and 11 min interpolate PP_100
-        mask_interpolation = (df.loc[:, "testing_time"]/60 > 7) & (df.loc[:, "testing_time"]/60 < 11)
-        df.loc[mask_interpolation, "PP_100"] = df.loc[mask_interpolation, ["PP_80", "PP_120"]].apply(
-                lambda row: np.interp(100,[80,120],row.values), axis = 1)
-        
-        # between 6 min and 20 min extrapolate PP_160 and PP_180
-        mask_extrapolation = (df.loc[:, "testing_time"]/60 > 6) & (df.loc[:, "testing_time"]/60 < 60)
-        df.loc[mask_extrapolation, "PP_160"] = df.loc[mask_extrapolation, ["PP_20", "PP_40","PP_60", 
-              "PP_80", "PP_100", "PP_120", "PP_140"]].apply(
-                lambda row: extrapolate([20,40,60,80,100,120,140], row.values, 160), axis = 1)
-        df.loc[mask_extrapolation, "PP_180"] = df.loc[mask_extrapolation, ["PP_20", "PP_40","PP_60", 
-              "PP_80", "PP_100", "PP_120", "PP_140", "PP_160"]].apply(
-                lambda row: extrapolate([20,40,60,80,100,120,140, 160], row.values, 180), axis = 1)
-        
-    if test_name == "Beta2":
-        
-        # between 0 min and 15 min extrapolate PP_180
-        mask_extrapolation = (df.loc[:, "testing_time"]/60 > 0) & (df.loc[:, "testing_time"]/60 < 15)
-        df.loc[mask_extrapolation, "PP_180"] = df.loc[mask_extrapolation, ["PP_20", "PP_40","PP_60", 
-              "PP_80", "PP_100", "PP_120", "PP_140", "PP_160"]].apply(
-                lambda row: extrapolate([20,40,60,80,100,120,140, 160], row.values, 180), axis = 1)
-            
-        # between 8 min and 10 min interpolate PP_100
-        mask_interpolation = (df.loc[:, "testing_time"]/60 > 8) & (df.loc[:, "testing_time"]/60 < 10)
-        df.loc[mask_interpolation, "PP_100"] = df.loc[mask_interpolation, ["PP_80", "PP_120"]].apply(
-                lambda row: np.interp(100,[80,120],row.values), axis = 1)
-        
-    
-    if test_name == "Gamma":
-        
-        # between 7 min and 16 min interpolate PP_120 and PP_140
-        mask_interpolation = (df.loc[:, "testing_time"]/60 > 7) & (df.loc[:, "testing_time"]/60 < 16)
-        df.loc[mask_interpolation, "PP_120"] = df.loc[mask_interpolation, ["PP_100", "PP_160"]].apply(
-                lambda row: np.interp(120,[100,160],row.values), axis = 1)
-        df.loc[mask_interpolation, "PP_140"] = df.loc[mask_interpolation, ["PP_100", "PP_160"]].apply(
-                lambda row: np.interp(140,[100,160],row.values), axis = 1)
-
-    
-    # for a given height, if delta p is positive then temperature equals ambient temperature
-    df.loc[:, "TC_20"] = df.loc[:, "TDD.20"]
-    for column in df:
-        if "PP" in column:
-            mask_positives = df.loc[:, column] > 0
-            height = column.split("_")[1]
-            df.loc[:, f"TC_{height}"] = df.loc[:, f"TDD.{height}"]
-            df.loc[mask_positives, f"TC_{height}"] = temperature_ambient
-    
-    # calculate density
-    for column in df:
-        if "TC" in column:
-            height = column.split("_")[1]
-            df.loc[:, f"Rho_{height}"] = 353 / (df.loc[:,column] + 273)
-    
-    # calculate velocities
-    for height in range(20,200,20):
-        df.loc[:,f"V_{height}"] = gamma * (2 * np.abs(df.loc[:, f"PP_{height}"]) / 
-               df.loc[:, f"Rho_{height}"])**0.5
-        
-        # np.abs used for calculation but now negative delta P should give a negative (outward) velocity
-        mask_negatives = df.loc[:, f"PP_{height}"] < 0
-        df.loc[mask_negatives,f"V_{height}"] = df.loc[mask_negatives,f"V_{height}"] * -1
-        
-    # calculate neutral plane by interpolating the velocity values
-    columns_velocity = []
-    for column in df:
-        if "V_" in column:
-            columns_velocity.append(column)
-    heights = np.linspace(0.2,1.8,9)
-
-    df.loc[:, "Neutral_Plane"] = df.loc[:, columns_velocity].apply(lambda row: find_neutral_plane(row, heights), axis = 1)
-    df.loc[:, "Neutral_Plane_Smooth"] = df.loc[:,"Neutral_Plane"].rolling(30).mean()
     
-    return
 
-
-def extrapolate(x, y, x_ext):
+def calculation_door_massflow(rho, velocity, areas, Cd = 0.68):
     """
-    Short definition of function to implement the extrapolation in the data frame
+    Calculates the mass flow at every height and the total inflow and outflow from the density and velocity arrays
     
     Parameters:
     ----------
-    row: pandas DataFrame containing all the time dependant data
+    rho: density at every height (heights in the last dimension)
         np.array
-    
-    x: value at which the extrapolating function should be evaluated
+        
+    velocity: velocity at every height
+        np.array
+        
+    areas: fraction of the door area to which each pressure probe corresponds
+        list
+        
+    Cd: discharge coefficient (0.68 according to SFPE and 0.7 according to Prahl and Emmons, 1975)
         float
-    
+        
     Returns:
     -------
-    y_ext: f(x). Interpolate value
-        float
-    
+    massflow: mass flow at every height ("M") and mass_in, mass_out, mass_average and hrr_internal_allmassin
+        dict
     """
-
-    extrapolating_function = interpolate.interp1d(x = x,
-                                              y = y,
-                                              kind = 'linear',
-                                              fill_value = 'extrapolate')
+    mass = Cd * rho * velocity * np.asarray(areas)
     
-    y_ext = extrapolating_function(x_ext)
+    # sum positives and negatives to obtain mass_in and mass_out
+    mass_in, mass_out, _, _, _ = split_massflow(mass)
     
-    return y_ext
+    # calculate HRR assuming all O2 in gets oxydised (I later use the juanalyser as well to run a different HRR calc)
+    massflow = {"M": mass,
+                "mass_in": mass_in,
+                "mass_out": mass_out,
+                "mass_average": (mass_in + mass_out) / 2,
+                "hrr_internal_allmassin": 0.233 * mass_in * 13100}
+    
+    return massflow
 
-def find_neutral_plane(x,y):
+
+def calculation_door_massflow_profile(rho, velocity, heights, Cd = 0.68, door_width = 0.8, bottom = 0.1, top = 1.9):
     """
-    Interpolates the velocity profile to find the neutral plane
+    Calculates the total inflow and outflow integrating continuous profiles across the doorway instead of adding up 
+    the strips of calculation_door_massflow (kept as the reference method)
+    
+    The dynamic pressure rho * v * |v| (proportional to the pressure difference) is interpolated linearly between 
+    probes, as in a hydrostatic profile, and extrapolated linearly to the bottom and top of the door. The mass flux
+    rho * v = sign(v) * sqrt(rho * |rho * v * |v||) is then integrated exactly on each side of every zero crossing, 
+    so the flow near the neutral plane is assigned to the right direction. The density on each side of a crossing is
+    that of the probe on the same side (the mean of both probes if there is no crossing).
     
     Parameters:
     ----------
-    x: velocities
+    rho: density at every height (one row per time step)
         np.array
         
-    y: heights
+    velocity: velocity at every height
+        np.array
+        
+    heights: heights of the probes (m)
         np.array
         
+    Cd: discharge coefficient
+        float
+        
+    door_width: width of the door (m)
+        float
+        
+    bottom, top: heights of the bottom and top of the door opening (m). The default values cover the same area as 
+                 calculation_area()
+        float
+        
     Returns:
     -------
-    neutral_plane: height of the neutral plane
-        float
+    massflow: mass_in, mass_out, mass_average and hrr_internal_allmassin (nan if any reading of the time step is nan)
+        dict
     """
+    rho = np.asarray(rho, dtype = float)
+    velocity = np.asarray(velocity, dtype = float)
+    heights = np.asarray(heights, dtype = float)
     
-    # create a set of tuples that contains the velocity and their respective height
-    pos = (0,0)
-    neg = (0,0)
+    # dynamic pressure at the probes, extrapolated linearly to the bottom and top of the door
+    w = rho * velocity * np.abs(velocity)
+    w_bottom = w[:, 0] + (bottom - heights[0]) * (w[:, 1] - w[:, 0]) / (heights[1] - heights[0])
+    w_top = w[:, -1] + (top - heights[-1]) * (w[:, -1] - w[:, -2]) / (heights[-1] - heights[-2])
+    w = np.column_stack([w_bottom, w, w_top])
+    rho = np.concatenate([rho[:, :1], rho, rho[:, -1:]], axis = 1)
+    length = np.diff(np.concatenate([[bottom], heights, [top]]))
+    w_0, dw = w[:, :-1], np.diff(w, axis = 1)
     
-    # determine the height of the last positive velocity and the first negative velocity
-    for i,vel in enumerate(x.values):
-        if vel < 0:
-            if i != 0:
-                neg = (vel, y[i])
-                pos = (x.values[i-1], y[i-1])
-                break
+    # fraction of each segment at which the flow changes direction (1 if it does not)
+    mask_crossing = (w_0 * (w_0 + dw)) < 0
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        s_crossing = np.where(mask_crossing, -w_0 / dw, 1)
     
-    # interpolate 
-    f = interpolate.interp1d(x = [pos[0], neg[0]], y = [pos[1], neg[1]],
-                             kind="linear", fill_value = 'extrapolate')
+    # integral of sqrt(|w|) along a segment from fraction a to fraction b (w does not change sign in between)
+    def integral(a, b):
+        w_a, w_b = np.abs(w_0 + dw * a), np.abs(w_0 + dw * b)
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            result = np.where(dw != 0, 2 * np.abs(w_b**1.5 - w_a**1.5) / (3 * np.abs(dw)), w_a**0.5 * (b - a))
+        return length * result
     
-    # evaluate the interpolating function to find the velocity
-    neutral_plane = f(0)
-
-    return neutral_plane
+    rho_mean = (rho[:, :-1] + rho[:, 1:]) / 2
+    mass_in = np.zeros(len(w))
+    mass_out = np.zeros(len(w))
+    for a, b, rho_side in [(0, s_crossing, np.where(mask_crossing, rho[:, :-1], rho_mean)),
+                           (s_crossing, 1, rho[:, 1:])]:
+        flux = rho_side**0.5 * integral(a, b)
+        mask_inflow = (w_0 + dw * (a + b) / 2) > 0
+        mass_in = mass_in + np.where(mask_inflow, flux, 0).sum(axis = 1)
+        mass_out = mass_out + np.where(mask_inflow, 0, flux).sum(axis = 1)
     
+    mask_nan = np.isnan(w).any(axis = 1) | np.isnan(rho).any(axis = 1)
+    mass_in = np.where(mask_nan, np.nan, Cd * door_width * mass_in)
+    mass_out = np.where(mask_nan, np.nan, Cd * door_width * mass_out)
     
+    massflow = {"mass_in": mass_in,
+                "mass_out": mass_out,
+                "mass_average": (mass_in + mass_out) / 2,
+                "hrr_internal_allmassin": 0.233 * mass_in * 13100}
+    
+    return massflow
+
 
-def calculation_massflow(df, areas, Cd = 0.68):
+def calculation_massflow(df, areas, Cd = 0.68, method = "strips"):
     """
     Calculates the mass flow from the velocities and areas already determined.
     
@@ -322,7 +1029,7 @@ def calculation_massflow(df, areas, Cd = 0.68):
     
     Parameters:
     ----------
-    df: pandas DataFrame containing all the time dependant data
+    df: pandas DataFrame containing all the time dependant data (output of calculation_velocity)
         pd.DataFrame
     
     areas: fraction of the door area to which each pressure probe corresponds
@@ -330,33 +1037,128 @@ def calculation_massflow(df, areas, Cd = 0.68):
         
     Cd: discharge coefficient (0.68 according to SFPE and 0.7 according to Prahl and Emmons, 1975)
     
+    method: "strips" adds up the flow through the area of every probe (M_* columns), "profile" integrates the
+            continuous profile across the doorway (calculation_door_massflow_profile) for the total inflow and outflow
+        str
+    
     Returns:
     -------
-    df: pandas DataFrame containing all the data.
+    df: new pandas DataFrame containing all the data.
     """
+    rho = df.loc[:, [f"Rho_{height}" for height in door_heights]].values
+    velocity = df.loc[:, [f"V_{height}" for height in door_heights]].values
+    massflow = calculation_door_massflow(rho, velocity, areas, Cd)
+    if method == "profile":
+        massflow.update(calculation_door_massflow_profile(rho, velocity, np.array(door_heights)/100, Cd))
     
-    for i, height in enumerate(list(range(20,200,20))):
-        df.loc[:, f"M_{height}"] = Cd * df.loc[:, f"Rho_{height}"] * df.loc[:,f"V_{height}"] * areas[i]
+    df_massflow = pd.DataFrame(np.column_stack([massflow["M"], massflow["mass_in"], massflow["mass_out"],
+                                                massflow["mass_average"], massflow["hrr_internal_allmassin"]]),
+                               index = df.index,
+                               columns = [f"M_{height}" for height in door_heights] +
+                                         ["mass_in", "mass_out", "mass_average", "hrr_internal_allmassin"])
     
-    mass_columns = [x for x in df.columns if "M_" in x]
-            
-    # sum positives and negatives to obtain mass_in and mass_out (slow and dirty implementation)
-    for index, row in df.loc[:, mass_columns].iterrows():
-        positives = 0
-        negatives = 0
-        for item in row:
-            if item > 0:
-                positives += item
-            else:
-                negatives += np.abs(item)
-        df.loc[index, "mass_in"] = positives
-        df.loc[index, "mass_out"] = negatives
-    df.loc[:, "mass_average"] = df.loc[:, ["mass_in", "mass_out"]].mean(axis = 1)
+    return pd.concat([df, df_massflow], axis = 1)
+
+
+def calculation_door_frame(df, test_name, areas, Cd = 0.68, **kwargs):
+    """
+    Runs calculation_velocity and calculation_massflow in one go, building the output DataFrame only once
     
-    # calculate HRR assuming all O2 in gets oxydised (I later use the juanalyser as well to run a different HRR calc)
-    df.loc[:, "hrr_internal_allmassin"] = 0.233 * df.loc[:, "mass_in"] * 13100
-            
-    return
+    Parameters:
+    ----------
+    df: pandas DataFrame with the raw test data
+        pd.DataFrame
+        
+    test_name: name of the test
+        str
+        
+    areas: fraction of the door area to which each pressure probe corresponds
+        list
+        
+    Cd: discharge coefficient
+        float
+        
+    kwargs: any other argument of calculation_velocity (gamma, omega_factor, gems_factor, window_length, ...)
+    
+    Returns:
+    -------
+    df: new pandas DataFrame with the same columns as calculation_massflow(calculation_velocity(df, test_name), areas)
+        pd.DataFrame
+    """
+    profiles = calculation_door_profiles(df, test_name, areas = areas, Cd = Cd, **kwargs)
+    
+    return door_frame_dataframe(profiles)
+
+
+def split_massflow(mass):
+    """
+    Splits the mass flow at every height into inflow and outflow for every time step at once
+    
+    Positive mass flows go into the compartment and everything else goes out of it (a nan mass flow is carried
+    into the outflow, as in the original row by row implementation).
+    
+    Parameters:
+    ----------
+    mass: mass flow with one row per time step and one column per height
+        np.array
+        
+    Returns:
+    -------
+    mass_in: total mass flow into the compartment
+        np.array
+        
+    mass_out: total mass flow out of the compartment (positive)
+        np.array
+        
+    mass_net: mass_in - mass_out
+        np.array
+        
+    mask_inflow: True where the gases flow into the compartment at a given height
+        np.array
+        
+    mask_outflow: True where the gases flow out of the compartment at a given height
+        np.array
+    """
+    mass = np.asarray(mass, dtype = float)
+    
+    mask_inflow = mass > 0
+    mask_outflow = mass < 0
+    
+    mass_in = np.where(mask_inflow, mass, 0).sum(axis = -1)
+    mass_out = np.where(mask_inflow, 0, np.abs(mass)).sum(axis = -1)
+    mass_net = mass_in - mass_out
+    
+    return mass_in, mass_out, mass_net, mask_inflow, mask_outflow
+
+
+def split_massflow_campaign(mass_matrices):
+    """
+    Runs split_massflow over several tests in a single call by stacking their mass flow matrices
+    
+    Parameters:
+    ----------
+    mass_matrices: mass flow matrices (time x heights) of each test. Tests can have different lengths
+        dict or list
+        
+    Returns:
+    -------
+    results: (mass_in, mass_out, mass_net, mask_inflow, mask_outflow) for each test, with the same keys 
+             (or order) as mass_matrices
+        dict or list
+    """
+    names = list(mass_matrices.keys()) if isinstance(mass_matrices, dict) else list(range(len(mass_matrices)))
+    matrices = [np.asarray(mass_matrices[name], dtype = float) for name in names]
+    
+    # stack all the tests, split once and then cut back into the individual tests
+    split_indices = np.cumsum([len(matrix) for matrix in matrices])[:-1]
+    stacked_results = split_massflow(np.concatenate(matrices, axis = 0))
+    split_results = [np.split(result, split_indices) for result in stacked_results]
+    
+    results = {name: tuple(result[i] for result in split_results) for i, name in enumerate(names)}
+    if not isinstance(mass_matrices, dict):
+        results = [results[name] for name in names]
+        
+    return results
 
 
 def calculation_HRR(df, df_mass, alpha = 1.105, 
@@ -380,12 +1182,8 @@ def calculation_HRR(df, df_mass, alpha = 1.105,
     """
     # interpolate the data from df_massloss to calculate the HRR. This is because this was logged with a different
     # datalogger and so it has a different time stamp
-    mass_interpolating_function = interpolate.interp1d(x = df_mass.loc[:, "testing_time"],
-                                                           y = df_mass.loc[:, "mass_average"],
-                                                           kind = 'linear',
-                                                           fill_value = 'extrapolate')
-    
-    df.loc[:, "mass_average"] = mass_interpolating_function(df.loc[:, "testing_time"])
+    index = resampling_index(df_mass.loc[:, "testing_time"].values, df.loc[:, "testing_time"].values)
+    df.loc[:, "mass_average"] = resample_linear(df_mass.loc[:, "mass_average"].values, index)
     
     # first, smoothe O2, CO and CO2 values
     for column_name in ["CO2", "CO", "O2"]:
@@ -395,18 +1193,109 @@ def calculation_HRR(df, df_mass, alpha = 1.105,
     for column_name in ["CO2_smooth", "CO_smooth", "O2_smooth"]:
         df.loc[:, f"{column_name}_mol"] = df.loc[:, column_name]/100
         
-    # calculate oxygen depletion factor
-    XO2 = df.loc[:, "O2_smooth_mol"]
-    XCO = df.loc[:, "CO_smooth_mol"]
-    XCO2 = df.loc[:, "CO2_smooth_mol"]
-    
-    df.loc[:, "oxygen_depletion_factor"] = (XO2_0 * (1 - XCO2 - XCO) - XO2 * (1 - XCO2_0)) / (XO2_0 * (1 - XO2 - XCO2 - XCO))
+    # calculate oxygen depletion factor and HRR
+    O2_dep_fac, hrr = calculation_oxygen_consumption(df.loc[:, "O2_smooth_mol"].values, 
+                                                     df.loc[:, "CO_smooth_mol"].values,
+                                                     df.loc[:, "CO2_smooth_mol"].values, 
+                                                     df.loc[:, "mass_average"].values, alpha, XO2_0, XCO2_0, E_02,
+                                                     ECO_CO2, M_a, M_O2)
+    df.loc[:, "oxygen_depletion_factor"] = O2_dep_fac
+    df.loc[:, "hrr_internal"] = hrr
+
+    return
+
+
+def calculation_oxygen_consumption(XO2, XCO, XCO2, me, alpha = 1.105, XO2_0 = 0.2095, XCO2_0 = 0.0004, E_02 = 13100, 
+                                   ECO_CO2 = 17600, M_a = 29, M_O2 = 32):
+    """
+    Oxygen depletion factor and HRR from oxygen consumption calorimetry. All the inputs broadcast against each other
+    (e.g. time x Monte Carlo samples)
     
-    # calculate the HRR
-    O2_dep_fac = df.loc[:, "oxygen_depletion_factor"]
-    me = df.loc[:, "mass_average"]
+    Parameters:
+    ----------
+    XO2, XCO, XCO2: mole fractions of O2, CO and CO2
+        np.array
+        
+    me: mass flow of the gases leaving the compartment
+        np.array
+        
+    alpha, XO2_0, XCO2_0, E_02, ECO_CO2, M_a, M_O2: see calculation_HRR
+        float or np.array
+        
+    Returns:
+    -------
+    O2_dep_fac: oxygen depletion factor
+        np.array
+        
+    hrr: heat release rate
+        np.array
+    """
+    O2_dep_fac = (XO2_0 * (1 - XCO2 - XCO) - XO2 * (1 - XCO2_0)) / (XO2_0 * (1 - XO2 - XCO2 - XCO))
     
-    df.loc[:, "hrr_internal"] = (E_02 * O2_dep_fac - ((ECO_CO2 - E_02)*((1 - O2_dep_fac)/2) * (XCO/XO2))) * (
+    hrr = (E_02 * O2_dep_fac - ((ECO_CO2 - E_02)*((1 - O2_dep_fac)/2) * (XCO/XO2))) * (
             (me/(1 + O2_dep_fac*(alpha - 1)))*(M_O2/M_a)*XO2_0)
+    
+    return O2_dep_fac, hrr
 
-    return
+
+def resampling_index(time_source, time_target, extrapolate = True):
+    """
+    Finds the segment of time_source that brackets every value of time_target and the interpolation weight. It is
+    calculated once per pair of time bases and then reused for any number of channels (see resample_linear)
+    
+    Parameters:
+    ----------
+    time_source: time at which the data was logged (sorted)
+        np.array
+        
+    time_target: time at which the data is required
+        np.array
+        
+    extrapolate: if True, times outside time_source are extrapolated linearly from the first or last segment (as
+                 interp1d with fill_value = "extrapolate"). If False, they are nan
+        bool
+        
+    Returns:
+    -------
+    index: lower end of the segment ("i") and weight of its upper end ("weight") for every target time
+        dict
+    """
+    time_source = np.asarray(time_source, dtype = float)
+    time_target = np.asarray(time_target, dtype = float)
+    
+    i = np.clip(np.searchsorted(time_source, time_target, side = "right") - 1, 0, len(time_source) - 2)
+    weight = (time_target - time_source[i]) / (time_source[i+1] - time_source[i])
+    if not extrapolate:
+        weight[(time_target < time_source[0]) | (time_target > time_source[-1])] = np.nan
+    
+    index = {"i": i,
+             "weight": weight}
+    
+    return index
+
+
+def resample_linear(values, index):
+    """
+    Linear interpolation of values (one row per time step of the source, any number of columns) at the target times 
+    of a resampling index
+    
+    Parameters:
+    ----------
+    values: data logged at the source times
+        np.array
+        
+    index: output of resampling_index
+        dict
+        
+    Returns:
+    -------
+    resampled_values: data at the target times
+        np.array
+    """
+    values = np.asarray(values, dtype = float)
+    i = index["i"]
+    weight = index["weight"].reshape((-1,) + (1,) * (values.ndim - 1))
+    
+    resampled_values = values[i] + weight * (values[i+1] - values[i])
+    
+    return resampled_values
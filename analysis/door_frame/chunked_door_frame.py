@@ -0,0 +1,126 @@
+"""
+Out-of-core version of the door frame analysis for long records.
+
+The raw channels are stored in a memory-mapped .npy file (one named field per channel) and read in chunks of rows.
+Each chunk goes through DoorFrameStream, which handles the overlap of the Savitsky-Golay window across chunk
+boundaries and the edges of the record. The results are written to another memory-mapped .npy file as they are
+calculated, so peak memory is set by chunk_rows and not by the length of the record.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+# import my own functions
+from calculation_massflow import calculation_area
+from streaming_door_frame import DoorFrameStream
+
+# default number of rows read from disk at once
+chunk_rows = 16384
+
+
+def save_raw_memmap(df, file_address, chunk_rows = chunk_rows):
+    """
+    Saves the raw door frame data to a .npy file that can be memory-mapped by calculation_door_frame_chunked
+
+    Parameters:
+    ----------
+    df: raw door frame data (testing_time in seconds, TDD.* and P* columns, as passed to calculation_door_frame)
+        pd.DataFrame
+
+    file_address: address of the .npy file
+        str
+
+    chunk_rows: number of rows written at once
+        int
+
+    Returns:
+    -------
+    raw: memory-mapped raw data with one field per column
+        np.memmap
+    """
+    dtype = np.dtype([(column, np.float64) for column in df.columns])
+    raw = np.lib.format.open_memmap(file_address, mode = "w+", dtype = dtype, shape = (len(df),))
+
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        for column in df.columns:
+            raw[column][start:start + len(chunk)] = chunk.loc[:, column].values
+    raw.flush()
+
+    return raw
+
+
+def calculation_door_frame_chunked(raw_address, output_address, test_name, areas = None, chunk_rows = chunk_rows,
+                                   **kwargs):
+    """
+    Calculates velocities, mass flow and neutral plane of a raw record stored with save_raw_memmap without loading
+    it into memory. Rows dropped by the calculation (nan values) are left as nan in the output.
+
+    Parameters:
+    ----------
+    raw_address: address of the .npy file with the raw data
+        str
+
+    output_address: address of the .npy file where the results are written
+        str
+
+    test_name: name of the test. Required to perform individualized cleaning of the data
+        str
+
+    areas: fraction of the door area to which each pressure probe corresponds (calculation_area() if None)
+        list
+
+    chunk_rows: number of rows read from disk at once
+        int
+
+    kwargs: any other argument of DoorFrameStream (Cd, gamma, omega_factor, window_length, ...)
+
+    Returns:
+    -------
+    output: memory-mapped results with one field per column (one row per row of the raw data)
+        np.memmap
+    """
+    raw = np.load(raw_address, mmap_mode = "r")
+    stream = DoorFrameStream(test_name, calculation_area() if areas is None else areas, **kwargs)
+
+    # one field per output column, all rows start as nan until calculated
+    dtype = np.dtype([(column, np.uint32 if column == "Repair_Flags" else np.float64)
+                      for column in stream.empty_output().columns])
+    output = np.lib.format.open_memmap(output_address, mode = "w+", dtype = dtype, shape = (len(raw),))
+
+    for start in range(0, len(raw), chunk_rows):
+        chunk = raw[start:start + chunk_rows]
+        rows = slice(start, start + len(chunk))
+        for column in dtype.names:
+            output[column][rows] = 0 if column == "Repair_Flags" else np.nan
+        output["testing_time"][rows] = chunk["testing_time"]
+
+        df_chunk = pd.DataFrame({column: chunk[column] for column in raw.dtype.names},
+                                index = pd.RangeIndex(rows.start, rows.stop))
+        write_door_frame_chunk(output, stream.update(df_chunk))
+
+    write_door_frame_chunk(output, stream.finish())
+    output.flush()
+
+    return output
+
+
+def write_door_frame_chunk(output, df):
+    """
+    Writes the samples emitted by DoorFrameStream to their rows of the output file
+
+    Parameters:
+    ----------
+    output: memory-mapped results (see calculation_door_frame_chunked)
+        np.memmap
+
+    df: samples emitted by DoorFrameStream (index = row of the raw data)
+        pd.DataFrame
+    """
+    if len(df) == 0:
+        return
+
+    rows = df.index.values
+    for column in df.columns:
+        output[column][rows] = df.loc[:, column].values
@@ -0,0 +1,267 @@
+"""
+Diagnostic figures of the door frame analysis (raw data, intermediate stages and results of every test), used to
+evaluate the algorithm and identify broken sensors.
+
+The channels of every figure are selected by name (regular expressions in diagnostic_figures) and every series is
+reduced to the resolution of the saved figure before plotting, keeping the minimum and maximum of the readings that
+fall in each pixel column, so the figures look the same as with the full-rate data. The figures are rendered in
+parallel, each in its own process with the non-interactive Agg backend.
+
+"""
+
+import re
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# import my own functions
+from door_profile_snapshots import door_profile_snapshots
+
+# figures of the time series: name (also the name of the file), channels, y label and y limits
+diagnostic_figures = [{"name": "Raw_Temperatures", "pattern": r"TDD\.(?!20$)\d+",
+                       "ylabel": "Temperature [$^\circ$C]", "ylim": [0,1200]},
+                      {"name": "Raw_PressureProbes", "pattern": r"P\d+\.\d+",
+                       "ylabel": "Transducers [V]", "ylim": [0,15]},
+                      {"name": "Zeroed_PressureProbes", "pattern": r"P\d+\.\d+_zeroed",
+                       "ylabel": "Transducers [V]", "ylim": [-5,5]},
+                      {"name": "DeltaPressure_Smooth", "pattern": r"P\d+\.\d+_DeltaP_smooth",
+                       "ylabel": "DeltaP [Pa]", "ylim": [-20,20]},
+                      {"name": "DeltaPressure_Smooth_Clean", "pattern": r"PP_\d+",
+                       "ylabel": "DeltaP [Pa]", "ylim": [-20,20]},
+                      {"name": "Temperatures_Processed", "pattern": r"TC_\d+",
+                       "ylabel": "Temperature [$^\circ$C]", "ylim": [0,1200]},
+                      {"name": "Density", "pattern": r"Rho_\d+",
+                       "ylabel": "Density [kg/m$^3$]", "ylim": [0, 1.5]},
+                      {"name": "Velocity", "pattern": r"V_\d+",
+                       "ylabel": "Velocity [m/s]", "ylim": [-15,5]},
+                      {"name": "Neutral Plane", "pattern": r"Neutral_Plane",
+                       "ylabel": "Neutral Plane [m]", "ylim": [0,2]},
+                      {"name": "Neutral_Plane_Smooth", "pattern": r"Neutral_Plane_Smooth",
+                       "ylabel": "Neutral Plane Smooth [m]", "ylim": [0,2]},
+                      {"name": "Mass Flow", "pattern": r"mass_(in|out|average)",
+                       "ylabel": "Mass Flow [kg/s]", "ylim": [0,1.5]}]
+
+# times (min) of the velocity profiles of Velocity_v_Height
+times_of_interest = [5,10,20,30]
+
+fontsize_legend = 6
+
+
+def decimate_minmax(x, y, n_bins):
+    """
+    Reduces several series sampled at the same times to the minimum and maximum of each of n_bins consecutive groups
+    of samples, in their original order (2 * n_bins points per series)
+
+    Parameters:
+    ----------
+    x: time of every sample
+        np.array
+
+    y: readings with one column per series
+        np.array
+
+    n_bins: number of groups (e.g. the width of the axes in pixels)
+        int
+
+    Returns:
+    -------
+    x: time of the points kept of every series (one column per series)
+        np.array
+
+    y: readings of the points kept of every series
+        np.array
+    """
+    x = np.asarray(x, dtype = float)
+    y = np.asarray(y, dtype = float).reshape(len(x), -1)
+    if len(x) <= 2 * n_bins:
+        return np.repeat(x[:, None], y.shape[1], axis = 1), y
+
+    # groups of the same number of samples, the last one padded with nan values
+    bin_size = int(np.ceil(len(x) / n_bins))
+    n_bins = int(np.ceil(len(x) / bin_size))
+    padded = np.full((n_bins * bin_size, y.shape[1]), np.nan)
+    padded[:len(x)] = y
+    blocks = padded.reshape(n_bins, bin_size, y.shape[1])
+
+    # position of the minimum and maximum of every group (groups with only nan values keep a nan point)
+    missing = np.isnan(blocks)
+    i_min = np.argmin(np.where(missing, np.inf, blocks), axis = 1)
+    i_max = np.argmax(np.where(missing, -np.inf, blocks), axis = 1)
+    i_first, i_second = np.minimum(i_min, i_max), np.maximum(i_min, i_max)
+
+    start = (np.arange(n_bins) * bin_size)[:, None]
+    rows = np.stack([start + i_first, start + i_second], axis = 1).reshape(2 * n_bins, y.shape[1])
+
+    return x[rows], padded[rows, np.arange(y.shape[1])[None, :]]
+
+
+def select_columns(df, pattern):
+    """
+    Columns of df whose whole name matches the regular expression pattern (in the order of df)
+
+    Parameters:
+    ----------
+    df: door frame data
+        pd.DataFrame
+
+    pattern: regular expression
+        str
+
+    Returns:
+    -------
+    columns: names of the columns
+        list
+    """
+    return [column for column in df.columns if re.fullmatch(pattern, str(column))]
+
+
+def render_time_series(figure, panels, file_address, dpi = 600):
+    """
+    Renders one of diagnostic_figures with one panel per test
+
+    Parameters:
+    ----------
+    figure: name, ylabel and ylim of the figure (see diagnostic_figures)
+        dict
+
+    panels: test name, names of the channels and decimated time (min) and readings of every test (see
+            decimate_minmax)
+        list
+
+    file_address: address of the saved figure
+        str
+
+    dpi: resolution of the saved figure
+        int
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(len(panels),1,figsize = (8,11), sharex = True, squeeze = False)
+    ax = ax[:, 0]
+    fig.suptitle(figure["name"])
+    fig.subplots_adjust(top = 0.9)
+
+    ax[-1].set_xlim([0,60])
+    ax[-1].set_xticks(np.linspace(0,60,13))
+    ax[-1].set_xlabel("Time [min]")
+
+    for axis, (test_name, columns, x, y) in zip(ax, panels):
+
+        # format the subplots
+        axis.set_ylabel(figure["ylabel"])
+        axis.set_ylim(figure["ylim"])
+        axis.grid(True, linestyle = "--", color = "gainsboro")
+        axis.set_title(test_name)
+
+        # all the channels at once (one line per column)
+        axis.plot(x, y, label = columns)
+        axis.legend(fancybox = True, ncol = 4, fontsize = fontsize_legend)
+
+    fig.savefig(file_address, dpi = dpi)
+    plt.close(fig)
+
+
+def render_velocity_profiles(panels, file_address, dpi = 600):
+    """
+    Renders the velocities as a function of height at times_of_interest, one panel per test
+
+    Parameters:
+    ----------
+    panels: test name, heights (m) and velocity profiles (one column per time of interest) of every test
+        list
+
+    file_address: address of the saved figure
+        str
+
+    dpi: resolution of the saved figure
+        int
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(1,len(panels),figsize = (11,8), sharex = True, sharey = True, squeeze = False)
+    ax = ax[0]
+    ax[0].set_ylim([0,2])
+    ax[0].set_yticks(np.linspace(0,2,6))
+    ax[0].set_ylabel("Height [m]")
+
+    for axis, (test_name, heights, velocities) in zip(ax, panels):
+
+        # format the subplots
+        axis.grid(True, linestyle = "--", color = "gainsboro")
+        axis.set_title(test_name)
+        axis.set_xlim([-15,5])
+        axis.set_xticks(np.linspace(-15,5,5))
+        axis.set_xlabel("Velocity [m/s]")
+
+        for j, t in enumerate(times_of_interest):
+            axis.plot(velocities[:, j],
+                      heights,
+                      label = f"{t} min",
+                      linestyle = ["-", "--", "-.", ":"][j])
+
+        axis.legend(fancybox = True, ncol = 1, fontsize = fontsize_legend, title = "Time")
+
+    fig.savefig(file_address, dpi = dpi)
+    plt.close(fig)
+
+
+def render_door_diagnostics(DoorFrame_full, test_names, output_folder = ".", dpi = 600, n_processes = None):
+    """
+    Renders all the diagnostic figures of the door frame analysis in parallel: diagnostic_figures and
+    Velocity_v_Height. The data of every figure is selected and decimated in the calling process, so only a few
+    thousand points per channel are sent to the workers
+
+    The process pool re-imports the calling script on Windows, so it must be run under if __name__ == "__main__"
+
+    Parameters:
+    ----------
+    DoorFrame_full: output of calculation_door_frame of every test (testing_time in seconds)
+        dict
+
+    test_names: tests shown in the figures (one panel per test)
+        list
+
+    output_folder: folder where the figures are saved
+        str
+
+    dpi: resolution of the saved figures
+        int
+
+    n_processes: number of processes (None uses one per processor)
+        int
+    """
+    # one group of readings per pixel column of the saved figures (8 inches wide)
+    n_bins = int(8 * dpi)
+
+    # only the time shown in the figures (0 to 60 min) is decimated
+    visible = {}
+    for test_name in test_names:
+        df = DoorFrame_full[test_name]
+        time = df.loc[:, "testing_time"].values / 60
+        visible[test_name] = (time >= 0) & (time <= 60)
+
+    tasks = []
+    for figure in diagnostic_figures:
+        panels = []
+        for test_name in test_names:
+            df = DoorFrame_full[test_name]
+            columns = select_columns(df, figure["pattern"])
+            mask = visible[test_name]
+            x, y = decimate_minmax(df.loc[mask, "testing_time"].values / 60, df.loc[mask, columns].values, n_bins)
+            panels.append((test_name, columns, x, y))
+        tasks.append((render_time_series, figure, panels, f"{output_folder}/{figure['name']}.png", dpi))
+
+    # velocity profiles at the first time step after every time of interest
+    panels = []
+    for test_name in test_names:
+        snapshots = door_profile_snapshots(DoorFrame_full[test_name], np.array(times_of_interest) * 60)
+        panels.append((test_name, snapshots["heights"], snapshots["V"].T))
+    tasks.append((render_velocity_profiles, panels, f"{output_folder}/Velocity_v_Height.png", dpi))
+
+    with ProcessPoolExecutor(max_workers = n_processes) as executor:
+        futures = [executor.submit(*task) for task in tasks]
+        for future in futures:
+            future.result()
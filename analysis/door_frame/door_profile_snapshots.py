@@ -0,0 +1,142 @@
+"""
+Velocity, density and mass flux profiles across the doorway at any set of times, and an animation of their evolution
+during the whole test.
+
+The rows of the snapshots are found with a single searchsorted over the (sorted) testing time, so thousands of
+snapshots cost the same as a few. The animation keeps one line per profile and only updates its data at every frame.
+
+"""
+
+import numpy as np
+
+# import my own functions
+from calculation_massflow import door_heights
+
+
+def snapshot_rows(testing_time, times):
+    """
+    Rows of the first time step after each of the given times (as the first row of testing_time > time)
+
+    Parameters:
+    ----------
+    testing_time: time of every row, sorted (s)
+        np.array
+
+    times: times of the snapshots (s)
+        np.array
+
+    Returns:
+    -------
+    rows: row of every snapshot (-1 for the times after the end of the test)
+        np.array
+    """
+    rows = np.searchsorted(testing_time, np.asarray(times, dtype = float), side = "right")
+
+    return np.where(rows < len(testing_time), rows, -1)
+
+
+def door_profile_snapshots(df, times):
+    """
+    Profiles of velocity, density and mass flux (rho * V) at every height at the given times
+
+    Parameters:
+    ----------
+    df: output of calculation_door_frame or calculation_velocity (testing_time in seconds)
+        pd.DataFrame
+
+    times: times of the snapshots (s)
+        np.array
+
+    Returns:
+    -------
+    snapshots: "times" requested, "testing_time" of the rows used, "heights" (m), "V", "Rho" and "Flux" (one row per
+               snapshot and one column per height) and "Neutral_Plane". Snapshots after the end of the test are nan
+        dict
+    """
+    times = np.asarray(times, dtype = float)
+    rows = snapshot_rows(df.loc[:, "testing_time"].values, times)
+    valid = rows >= 0
+
+    def take(columns):
+        values = np.full((len(times), len(columns)), np.nan)
+        values[valid] = df.loc[:, columns].values[rows[valid]]
+        return values
+
+    velocity = take([f"V_{height}" for height in door_heights])
+    rho = take([f"Rho_{height}" for height in door_heights])
+
+    snapshots = {"times": times,
+                 "testing_time": take(["testing_time"])[:, 0],
+                 "heights": np.array(door_heights) / 100,
+                 "V": velocity,
+                 "Rho": rho,
+                 "Flux": rho * velocity,
+                 "Neutral_Plane": take(["Neutral_Plane"])[:, 0]}
+
+    return snapshots
+
+
+def animate_door_profiles(snapshots, test_name = "", file_address = None, fps = 20):
+    """
+    Animation of the velocity, density and mass flux profiles of door_profile_snapshots, with the neutral plane.
+    The figure and its lines are created once and only their data is updated at every frame
+
+    Parameters:
+    ----------
+    snapshots: output of door_profile_snapshots
+        dict
+
+    test_name: name of the test (title of the figure)
+        str
+
+    file_address: address of the saved animation (e.g. ".gif" or ".mp4"). Not saved if None
+        str
+
+    fps: frames per second
+        int
+
+    Returns:
+    -------
+    animation: the animation (must be kept referenced to be shown interactively)
+        matplotlib.animation.FuncAnimation
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    heights = snapshots["heights"]
+    panels = [("V", "Velocity [m/s]", [-15,5]),
+              ("Rho", "Density [kg/m$^3$]", [0,1.5]),
+              ("Flux", "Mass Flux [kg/m$^2$s]", [-5,5])]
+
+    fig, ax = plt.subplots(1,3,figsize = (11,8), sharey = True)
+    ax[0].set_ylim([0,2])
+    ax[0].set_yticks(np.linspace(0,2,6))
+    ax[0].set_ylabel("Height [m]")
+    title = fig.suptitle(test_name)
+
+    lines = []
+    neutral_planes = []
+    for axis, (name, label, limits) in zip(ax, panels):
+        axis.grid(True, linestyle = "--", color = "gainsboro")
+        axis.set_xlim(limits)
+        axis.set_xlabel(label)
+        if name != "Rho":
+            axis.axvline(0, color = "grey", linewidth = 0.5)
+        lines.append(axis.plot(snapshots[name][0], heights, marker = "o")[0])
+        neutral_planes.append(axis.axhline(snapshots["Neutral_Plane"][0], linestyle = "--", color = "black"))
+
+    def update(frame):
+        for line, (name, _, _) in zip(lines, panels):
+            line.set_xdata(snapshots[name][frame])
+        for neutral_plane in neutral_planes:
+            neutral_plane.set_ydata([snapshots["Neutral_Plane"][frame]] * 2)
+        title.set_text(f"{test_name} {snapshots['testing_time'][frame]/60:.2f} min")
+        return lines + neutral_planes + [title]
+
+    animation = FuncAnimation(fig, update, frames = len(snapshots["times"]), interval = 1000 / fps)
+
+    if file_address is not None:
+        animation.save(file_address, fps = fps)
+        plt.close(fig)
+
+    return animation
@@ -0,0 +1,206 @@
+"""
+Detection of the time offset between two dataloggers (e.g. gas analyser and door frame) by cross-correlation of two
+signals that follow the same fire (e.g. O2 depletion and mass inflow).
+
+Both signals are resampled to a common uniform time base and the Pearson correlation between them is calculated for
+every lag at once with FFTs (O(N log N)). Only the overlapping part of both records is used at each lag, so records
+of different length and with gaps (nan values) can be compared.
+
+The offset found includes any transport delay between the two signals (e.g. the sampling line of the gas analyser).
+
+The gas analyser is aligned with the door frame by correlating the O2 depletion with the enthalpy carried out of the
+door by the hot gases (door_enthalpy_flow), which rises and falls with the HRR (the mass inflow does not: it peaks
+early and stays almost flat through the fire). The estimate is only kept when the correlation is strong and, for the
+tests with an offset noted by hand (manual_offsets), close to it; otherwise the manual offset (0 for other tests) is
+used with the nominal transport delay of the sampling line added, so the offset always includes the delay.
+
+"""
+
+import numpy as np
+from scipy.signal import correlate, correlation_lags
+
+# import my own functions
+from calculation_massflow import resampling_index, resample_linear
+
+# maximum offset searched (seconds) and minimum overlap between the records (fraction of the shortest record)
+max_offset = 30*60
+min_overlap = 0.5
+
+# offsets of the gas analyser noted by hand (seconds): the ignition delay was not added to the spreadsheets of Beta1
+# and Beta2. They do not include the transport delay of the sampling line (juanalyser_transport_delay)
+manual_offsets = {"Alpha1": 0,
+                  "Alpha2": 0,
+                  "Beta1": -4*60,
+                  "Beta2": -18*60,
+                  "Gamma": 0}
+
+# nominal transport delay of the sampling line of the Juanalyser (s)
+juanalyser_transport_delay = 30
+
+# an estimated offset is only kept above min_confidence and within max_deviation (seconds) of the manual offset (if
+# the test has one)
+min_confidence = 0.9
+max_deviation = 3*60
+
+
+def estimate_logger_offset(time_reference, signal_reference, time_other, signal_other, resolution = 1,
+                           max_offset = max_offset, min_overlap = min_overlap):
+    """
+    Estimates the offset that has to be added to the time of the other logger to align it with the reference logger
+
+    Parameters:
+    ----------
+    time_reference, signal_reference: time (seconds) and signal of the reference logger
+        np.array
+
+    time_other, signal_other: time (seconds) and signal of the logger to be aligned
+        np.array
+
+    resolution: time step of the common time base (seconds)
+        float
+
+    max_offset: maximum offset searched (seconds)
+        float
+
+    min_overlap: minimum overlap between both records, as a fraction of the shortest record
+        float
+
+    Returns:
+    -------
+    alignment: "offset" (seconds), "confidence" (correlation between both signals once aligned, between -1 and 1)
+               and "overlap" (seconds of data used at that offset)
+        dict
+    """
+    # both signals on a common uniform time base (nan outside each record)
+    signals = []
+    for time, signal in [(time_reference, signal_reference), (time_other, signal_other)]:
+        time = np.asarray(time, dtype = float)
+        signal = np.asarray(signal, dtype = float)
+        mask = ~(np.isnan(time) | np.isnan(signal))
+        time, signal = time[mask], signal[mask]
+
+        time_base = np.arange(time[0], time[-1], resolution)
+        signals.append((time_base[0], resample_linear(signal, resampling_index(time, time_base, extrapolate = False))))
+
+    (start_reference, x), (start_other, y) = signals
+    mask_x, mask_y = ~np.isnan(x), ~np.isnan(y)
+    x, y = np.where(mask_x, x, 0), np.where(mask_y, y, 0)
+
+    # sums over the overlap of both records at every lag: y[n + lag] against x[n]
+    def cross(a, b):
+        return correlate(a, b, mode = "full", method = "fft")
+
+    n = np.round(cross(mask_y * 1.0, mask_x * 1.0))
+    sum_x, sum_y = cross(mask_y * 1.0, x), cross(y, mask_x * 1.0)
+    sum_xx, sum_yy = cross(mask_y * 1.0, x**2), cross(y**2, mask_x * 1.0)
+    sum_xy = cross(y, x)
+    lags = correlation_lags(len(y), len(x), mode = "full")
+
+    # Pearson correlation at every lag
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        covariance = sum_xy - sum_x * sum_y / n
+        variance = (sum_xx - sum_x**2 / n) * (sum_yy - sum_y**2 / n)
+        correlation = covariance / np.sqrt(np.clip(variance, 0, None))
+
+    # offset of the other logger for every lag, restricted to the search range and to a sufficient overlap
+    offsets = start_reference - start_other - lags * resolution
+    valid = ((np.abs(offsets) <= max_offset) & (n >= min_overlap * min(mask_x.sum(), mask_y.sum())) &
+             np.isfinite(correlation))
+    if not valid.any():
+        raise ValueError("The records do not overlap enough within max_offset")
+    correlation = np.where(valid, correlation, -np.inf)
+    k = int(np.argmax(correlation))
+
+    # sub-resolution refinement with a parabola through the peak and its neighbours
+    offset = offsets[k]
+    if 0 < k < len(correlation) - 1 and valid[k-1] and valid[k+1]:
+        c_left, c_peak, c_right = correlation[k-1], correlation[k], correlation[k+1]
+        curvature = c_left - 2 * c_peak + c_right
+        if curvature < 0:
+            offset = offset - resolution * 0.5 * (c_left - c_right) / curvature
+
+    alignment = {"offset": float(offset),
+                 "confidence": float(correlation[k]),
+                 "overlap": float(n[k] * resolution)}
+
+    return alignment
+
+
+def door_enthalpy_flow(df, temperature_ambient = None, cp = 1.0):
+    """
+    Enthalpy carried out of the door by the hot gases, the sum over every height of the outflow (negative M_*) times
+    the temperature rise (TC_*). Follows the HRR of the fire
+
+    Parameters:
+    ----------
+    df: output of calculation_door_frame (testing_time in seconds)
+        pd.DataFrame
+
+    temperature_ambient: ambient temperature (mean of the door temperatures before ignition if None)
+        float
+
+    cp: specific heat of the gases (kJ/kgK)
+        float
+
+    Returns:
+    -------
+    enthalpy_flow: enthalpy flow at every row (kW)
+        np.array
+    """
+    heights = [column.split("_")[1] for column in df.columns if column.startswith("M_")]
+    mass = df.loc[:, [f"M_{height}" for height in heights]].values
+    tc = df.loc[:, [f"TC_{height}" for height in heights]].values
+    if temperature_ambient is None:
+        temperature_ambient = np.nanmean(tc[df.loc[:, "testing_time"].values < 0])
+
+    return cp * np.nansum(np.clip(-mass, 0, None) * (tc - temperature_ambient), axis = 1)
+
+
+def align_gas_analyser(df, df_gas, test_name, min_confidence = min_confidence, max_deviation = max_deviation):
+    """
+    Offset to add to the time of the gas analyser to align it with the door frame, including the transport delay of
+    the analyser. The offset estimated by correlating the O2 depletion with door_enthalpy_flow is kept if its
+    confidence is at least min_confidence and, for the tests of manual_offsets, it is within max_deviation of the
+    manual offset. Otherwise the manual offset (0 for other tests) minus juanalyser_transport_delay is used
+
+    Parameters:
+    ----------
+    df: output of calculation_door_frame (testing_time in seconds)
+        pd.DataFrame
+
+    df_gas: gas analyser data (testing_time in seconds and O2)
+        pd.DataFrame
+
+    test_name: name of the test
+        str
+
+    min_confidence: minimum correlation of the estimated offset
+        float
+
+    max_deviation: maximum difference between the estimated and the manual offsets (seconds)
+        float
+
+    Returns:
+    -------
+    alignment: "offset" used (seconds), "method" ("correlation" or "manual"), and the "estimated_offset",
+               "confidence" and "overlap" of the correlation (nan if it failed)
+        dict
+    """
+    manual_offset = manual_offsets.get(test_name, 0) - juanalyser_transport_delay
+    try:
+        estimate = estimate_logger_offset(df.loc[:, "testing_time"].values, door_enthalpy_flow(df),
+                                          df_gas.loc[:, "testing_time"].values, -df_gas.loc[:, "O2"].values)
+    except ValueError:
+        estimate = {"offset": np.nan, "confidence": np.nan, "overlap": np.nan}
+
+    accepted = estimate["confidence"] >= min_confidence
+    if test_name in manual_offsets:
+        accepted = accepted and abs(estimate["offset"] - manual_offset) <= max_deviation
+
+    alignment = {"offset": estimate["offset"] if accepted else float(manual_offset),
+                 "method": "correlation" if accepted else "manual",
+                 "estimated_offset": estimate["offset"],
+                 "confidence": estimate["confidence"],
+                 "overlap": estimate["overlap"]}
+
+    return alignment
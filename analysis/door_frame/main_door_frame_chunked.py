@@ -0,0 +1,51 @@
+"""
+Runs the door frame analysis of every test out of core (see chunked_door_frame) and checks that velocities, mass flow
+and neutral plane match the in-memory calculation of main_door_frame.
+
+"""
+
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+# import my own functions
+from calculation_massflow import calculation_area, calculation_door_frame
+from chunked_door_frame import save_raw_memmap, calculation_door_frame_chunked
+
+# folder where the memory-mapped raw data and results are stored
+folder_address = "C:/Users/s1475174/Documents/Python_Projects/BRE_Paper_2016/unprocessed_data/door_frame/memmap"
+os.makedirs(folder_address, exist_ok = True)
+
+# upload the data from the excel spreadsheets
+file_address = "C:/Users/s1475174/Documents/Python_Projects/BRE_Paper_2016/unprocessed_data/door_frame/DoorFrame_unprocessed.pkl"
+with open(file_address, "rb") as handle:
+    DoorFrame = pickle.load(handle)
+
+for test_name in ["Alpha1","Alpha2", "Beta1", "Beta2", "Gamma"]:
+
+    print(f"Analysing experiment {test_name}")
+
+    # same preparation of the data as in main_door_frame
+    df = DoorFrame[test_name].iloc[:, :22].copy()
+    df.rename(columns = {"Time [min]": "testing_time"}, inplace = True)
+    df.loc[:, "testing_time"] = df.loc[:, "testing_time"]*60
+    areas = calculation_area()
+
+    # store the raw channels on disk and run the chunked calculation from there
+    raw_address = f"{folder_address}/{test_name}_raw.npy"
+    output_address = f"{folder_address}/{test_name}_door_frame.npy"
+    save_raw_memmap(df, raw_address)
+    output = calculation_door_frame_chunked(raw_address, output_address, test_name, areas)
+
+    # compare with the in-memory calculation
+    df_chunked = pd.DataFrame(np.load(output_address, mmap_mode = "r")).dropna(subset = ["V_20"])
+    df_memory = calculation_door_frame(df.reset_index(drop = True), test_name, areas)
+    columns = [x for x in df_chunked.columns if x != "Repair_Flags"]
+
+    print(f" samples: {len(df_chunked)} chunked, {len(df_memory)} in memory")
+    print(f" maximum difference: {np.nanmax(np.abs(df_chunked.loc[:, columns].values - df_memory.loc[:, columns].values))}")
+
+    assert df_chunked.index.equals(df_memory.index)
+    assert np.allclose(df_chunked.loc[:, columns].values, df_memory.loc[:, columns].values, equal_nan = True)
+    assert (df_chunked.loc[:, "Repair_Flags"].values == df_memory.loc[:, "Repair_Flags"].values).all()
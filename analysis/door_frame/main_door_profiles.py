@@ -0,0 +1,42 @@
+"""
+Exports the velocity, density and mass flux profiles across the doorway during the whole of every test (see
+door_profile_snapshots) and renders their evolution as an animation.
+
+"""
+
+import pickle
+import numpy as np
+
+# import my own functions
+from calculation_massflow import calculation_area, calculation_door_frame
+from door_profile_snapshots import door_profile_snapshots, animate_door_profiles
+
+# time between snapshots (s) and between the frames of the animations (s)
+snapshot_step = 5
+frame_step = 10
+
+Door_Profiles = {}
+
+# upload the data from the excel spreadsheets
+file_address = "C:/Users/s1475174/Documents/Python_Projects/BRE_Paper_2016/unprocessed_data/door_frame/DoorFrame_unprocessed.pkl"
+with open(file_address, "rb") as handle:
+    DoorFrame = pickle.load(handle)
+
+for test_name in ["Alpha1","Alpha2", "Beta1", "Beta2", "Gamma"]:
+
+    print(f"Exporting door profiles of {test_name}")
+
+    df = DoorFrame[test_name].iloc[:, :22].copy()
+    df.rename(columns = {"Time [min]": "testing_time"}, inplace = True)
+    df.loc[:, "testing_time"] = df.loc[:, "testing_time"]*60
+    df = calculation_door_frame(df, test_name, calculation_area())
+
+    end = df.loc[:, "testing_time"].max()
+    Door_Profiles[test_name] = door_profile_snapshots(df, np.arange(0, end, snapshot_step))
+
+    animate_door_profiles(door_profile_snapshots(df, np.arange(0, end, frame_step)), test_name,
+                          f"Door_Profiles_{test_name}.gif")
+
+file_address_save = "C:/Users/s1475174/Documents/Python_Projects/BRE_Paper_2016/processed_data/Door_Profiles.pkl"
+with open(file_address_save, 'wb') as handle:
+    pickle.dump(Door_Profiles, handle)
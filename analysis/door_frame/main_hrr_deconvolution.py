@@ -0,0 +1,89 @@
+"""
+Removes the delay and response of the gas analysers from both sources of HRR (see analyser_deconvolution):
+    - O2, CO and CO2 of the Juanalyser are deconvolved before calculating the internal HRR (calculation_HRR)
+    - the external HRR (THRR, processed by analysis/hrr/main_hrr.py) is deconvolved directly
+
+All the records of all the tests are deconvolved in a single batch.
+
+"""
+
+import pickle
+import matplotlib.pyplot as plt
+import numpy as np
+
+# import my own functions
+from calculation_massflow import calculation_HRR
+from analyser_deconvolution import deconvolution_batch, analyser_response
+
+processed_address = "C:/Users/s1475174/Documents/Python_Projects/BRE_Paper_2016/processed_data"
+
+# upload the data from the excel spreadsheets and the processed data required
+file_address = "C:/Users/s1475174/Documents/Python_Projects/BRE_Paper_2016/unprocessed_data/door_frame/DoorFrame_unprocessed.pkl"
+with open(file_address, "rb") as handle:
+    DoorFrame = pickle.load(handle)
+
+processed_data = {}
+for data_name in ["Mass_Flow", "Logger_Alignment", "HRR_total", "HRR_internal_juanalyser"]:
+    with open(f"{processed_address}/{data_name}.pkl", "rb") as handle:
+        processed_data[data_name] = pickle.load(handle)
+
+# gas analyser data of every test (with the offset found by main_door_frame)
+Juanalyser = {}
+for test_name in ["Alpha1","Alpha2", "Beta1", "Beta2", "Gamma"]:
+    df_juanalyser = DoorFrame[test_name].iloc[:, 23:].copy()
+    df_juanalyser.rename(columns = {"Time": "testing_time"}, inplace = True)
+    df_juanalyser.loc[:, "testing_time"] = (df_juanalyser.loc[:, "testing_time"]*60 +
+                                            processed_data["Logger_Alignment"][test_name]["offset"])
+    Juanalyser[test_name] = df_juanalyser
+
+# collect all the records: O2, CO and CO2 of every test and the external HRR
+records = [("juanalyser", test_name, column) for test_name in Juanalyser for column in ["O2", "CO", "CO2"]]
+records += [("THRR", test_name, "THRR") for test_name in processed_data["HRR_total"]]
+
+signals, dts = [], []
+for source, test_name, column in records:
+    df = Juanalyser[test_name] if source == "juanalyser" else processed_data["HRR_total"][test_name]
+    signals.append(df.loc[:, column].values)
+    dts.append(np.nanmedian(np.diff(df.loc[:, "testing_time"].values)))
+
+deconvolved_signals = deconvolution_batch(signals, dts, [analyser_response[source] for source, _, _ in records])
+
+# internal HRR from the deconvolved gas readings and deconvolved external HRR
+HRR_internal_juanalyser_deconvolved = {}
+HRR_total_deconvolved = {}
+for (source, test_name, column), deconvolved_signal in zip(records, deconvolved_signals):
+    if source == "juanalyser":
+        Juanalyser[test_name].loc[:, column] = deconvolved_signal
+    else:
+        df = processed_data["HRR_total"][test_name].copy()
+        df.loc[:, "THRR"] = deconvolved_signal
+        HRR_total_deconvolved[test_name] = df
+
+for test_name, df_juanalyser in Juanalyser.items():
+    calculation_HRR(df_juanalyser, processed_data["Mass_Flow"][test_name])
+    HRR_internal_juanalyser_deconvolved[test_name] = df_juanalyser.loc[:, ["testing_time","hrr_internal"]]
+
+# save the deconvolved HRR to the processed data folder
+for data_name, data_type in [("HRR_internal_juanalyser_deconvolved", HRR_internal_juanalyser_deconvolved),
+                             ("HRR_total_deconvolved", HRR_total_deconvolved)]:
+    with open(f"{processed_address}/{data_name}.pkl", 'wb') as handle:
+        pickle.dump(data_type, handle)
+
+# compare the HRR before and after the deconvolution
+fig, ax = plt.subplots(5, 1, figsize = (8, 16), sharex = True)
+for axis, test_name in zip(ax, Juanalyser):
+    for data_name, data, label in [("HRR_internal_juanalyser", "hrr_internal", "internal"), ("HRR_total", "THRR", "total")]:
+        if test_name not in processed_data[data_name]:
+            continue
+        df = processed_data[data_name][test_name]
+        df_deconvolved = (HRR_internal_juanalyser_deconvolved if label == "internal" else HRR_total_deconvolved)[test_name]
+        axis.plot(df.loc[:, "testing_time"]/60, df.loc[:, data], label = f"{label}", alpha = 0.5)
+        axis.plot(df_deconvolved.loc[:, "testing_time"]/60, df_deconvolved.loc[:, data], label = f"{label} (deconvolved)")
+    axis.set_title(test_name)
+    axis.set_ylabel("HRR [kW]")
+    axis.set_xlim(0, 60)
+ax[0].legend()
+ax[-1].set_xlabel("Time [min]")
+plt.tight_layout()
+fig.savefig("HRR_Deconvolution.png", dpi = 600)
+plt.close(fig)
@@ -0,0 +1,53 @@
+"""
+Suggests the repairs of the damaged pressure probes of every test (see probe_health) and compares them with the
+repairs of repair_schedule.py, which were picked from the plots of main_door_frame.py.
+
+The suggested probes to average (in the format of probe_averages of calculation_massflow.py) and repairs (in the
+format of repair_schedule.py) are saved to the processed data folder (Suggested_Repairs.pkl), so that they can be
+copied there after checking them.
+
+"""
+
+import pickle
+
+# import my own functions
+from calculation_massflow import calculation_area, calculation_door_frame, probe_averages
+from probe_health import suggest_repair_schedule
+
+# import my own data
+from repair_schedule import repair_schedule
+
+Suggested_Repairs = {}
+
+# upload the data from the excel spreadsheets
+file_address = "C:/Users/s1475174/Documents/Python_Projects/BRE_Paper_2016/unprocessed_data/door_frame/DoorFrame_unprocessed.pkl"
+with open(file_address, "rb") as handle:
+    DoorFrame = pickle.load(handle)
+
+for test_name in ["Alpha1","Alpha2", "Beta1", "Beta2", "Gamma"]:
+
+    df = DoorFrame[test_name].iloc[:, :22].copy()
+    df.rename(columns = {"Time [min]": "testing_time"}, inplace = True)
+    df.loc[:, "testing_time"] = df.loc[:, "testing_time"]*60
+
+    # analysis without any repair, so that the damaged probes are seen as they are
+    df = calculation_door_frame(df, test_name, calculation_area(), repairs = [])
+    Suggested_Repairs[test_name] = suggest_repair_schedule(df, test_name)
+
+    print(f"Experiment {test_name}")
+    for label, averages, repairs in [("suggested", Suggested_Repairs[test_name]["probe_averages"],
+                                      Suggested_Repairs[test_name]["repairs"]),
+                                     ("repair_schedule", probe_averages[test_name], repair_schedule[test_name])]:
+        print(f" {label}:")
+        for height, probes in averages.items():
+            print(f"  PP_{height} (average of {probes})")
+        for repair in repairs:
+            if not repair["channel"].startswith("PP_"):
+                continue
+            windows = "whole test" if repair["windows"] is None else ", ".join(
+                f"{start/60:.1f}-{'end' if end is None else f'{end/60:.1f}'} min" for start, end in repair["windows"])
+            print(f"  {repair['channel']} ({repair['method']} from {repair['source_heights']}): {windows}")
+
+file_address_save = "C:/Users/s1475174/Documents/Python_Projects/BRE_Paper_2016/processed_data/Suggested_Repairs.pkl"
+with open(file_address_save, 'wb') as handle:
+    pickle.dump(Suggested_Repairs, handle)
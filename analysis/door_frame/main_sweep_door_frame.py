@@ -0,0 +1,47 @@
+"""
+Sensitivity of mass flow and neutral plane to the constants of the door frame analysis (see sweep_door_frame).
+The sweep of every test is saved to the processed data folder and the spread of the mean inflow is printed.
+
+"""
+
+import pickle
+import numpy as np
+
+# import my own functions
+from calculation_massflow import calculation_area
+from sweep_door_frame import sweep_door_frame_campaign
+
+# parameter grids
+Cd = [0.6, 0.64, 0.68, 0.7]
+gamma = [0.9, 0.94, 0.98]
+areas = {f"{door_width:.2f} m": calculation_area(door_width = door_width) for door_width in [0.78, 0.8, 0.82]}
+window_length = [11, 21, 31, 61]
+polyorder = [1, 2, 3]
+
+# the process pool re-imports this script (Windows), so everything else only runs in the main process
+if __name__ == "__main__":
+
+    # upload the data from the excel spreadsheets
+    file_address = "C:/Users/s1475174/Documents/Python_Projects/BRE_Paper_2016/unprocessed_data/door_frame/DoorFrame_unprocessed.pkl"
+    with open(file_address, "rb") as handle:
+        DoorFrame = pickle.load(handle)
+
+    # same preparation of the data as in main_door_frame
+    tests = {}
+    for test_name in ["Alpha1","Alpha2", "Beta1", "Beta2", "Gamma"]:
+        df = DoorFrame[test_name].iloc[:, :22].copy()
+        df.rename(columns = {"Time [min]": "testing_time"}, inplace = True)
+        df.loc[:, "testing_time"] = df.loc[:, "testing_time"]*60
+        tests[test_name] = df
+
+    Sweeps = sweep_door_frame_campaign(tests, Cd, gamma, areas, window_length, polyorder, n_processes = 4)
+
+    for test_name, sweep in Sweeps.items():
+        mask = sweep["coords"]["testing_time"] > 0
+        mean_mass_in = np.nanmean(sweep["values"]["mass_in"][..., mask], axis = -1)
+        print(f"{test_name}: mean mass_in between {np.round(np.nanmin(mean_mass_in),3)} and "
+              f"{np.round(np.nanmax(mean_mass_in),3)} kg/s")
+
+    file_address_save = "C:/Users/s1475174/Documents/Python_Projects/BRE_Paper_2016/processed_data/Door_Frame_Sweep.pkl"
+    with open(file_address_save, 'wb') as handle:
+        pickle.dump(Sweeps, handle)
@@ -0,0 +1,70 @@
+"""
+Percentile bands of mass flow and internal HRR (door frame and gas analyser) for every test, obtained by Monte Carlo
+propagation of the uncertainty of the calibration constants and sensor noise (see uncertainty_door_frame).
+
+"""
+
+import pickle
+import time
+import matplotlib.pyplot as plt
+import numpy as np
+
+# import my own functions
+from calculation_massflow import calculation_area
+from uncertainty_door_frame import uncertainty_door_frame, band_percentiles
+
+n_samples = 2000
+Uncertainty_Bands = {}
+
+# upload the data from the excel spreadsheets
+file_address = "C:/Users/s1475174/Documents/Python_Projects/BRE_Paper_2016/unprocessed_data/door_frame/DoorFrame_unprocessed.pkl"
+with open(file_address, "rb") as handle:
+    DoorFrame = pickle.load(handle)
+
+# offset between the gas analyser and the door frame data found by main_door_frame
+file_address = "C:/Users/s1475174/Documents/Python_Projects/BRE_Paper_2016/processed_data/Logger_Alignment.pkl"
+with open(file_address, "rb") as handle:
+    Logger_Alignment = pickle.load(handle)
+
+for test_name in ["Alpha1","Alpha2", "Beta1", "Beta2", "Gamma"]:
+
+    print(f"Analysing experiment {test_name}")
+
+    # same preparation of the data as in main_door_frame
+    df_full = DoorFrame[test_name]
+    df = df_full.iloc[:, :22].copy()
+    df.rename(columns = {"Time [min]": "testing_time"}, inplace = True)
+    df.loc[:, "testing_time"] = df.loc[:, "testing_time"]*60
+
+    df_juanalyser = df_full.iloc[:, 23:].copy()
+    df_juanalyser.rename(columns = {"Time": "testing_time"}, inplace = True)
+    df_juanalyser.loc[:, "testing_time"] = df_juanalyser.loc[:, "testing_time"]*60
+    df_juanalyser.loc[:, "testing_time"] = df_juanalyser.loc[:, "testing_time"] + Logger_Alignment[test_name]["offset"]
+
+    start = time.time()
+    Uncertainty_Bands[test_name] = uncertainty_door_frame(df, df_juanalyser, test_name, calculation_area(),
+                                                          n_samples = n_samples)
+    print(f" {n_samples} samples in {np.round(time.time() - start,1)} seconds")
+
+# save the bands to the processed data folder
+file_address_save = "C:/Users/s1475174/Documents/Python_Projects/BRE_Paper_2016/processed_data/Door_Frame_Uncertainty.pkl"
+with open(file_address_save, 'wb') as handle:
+    pickle.dump(Uncertainty_Bands, handle)
+
+# plot the bands of the internal HRR calculated from the mass inflow and from the gas analyser
+fig, axes = plt.subplots(5, 1, figsize = (8, 16), sharex = True)
+low, median, high = band_percentiles
+for axis, test_name in zip(axes, Uncertainty_Bands):
+    for key, name in [("door", "hrr_internal_allmassin"), ("gas", "hrr_internal")]:
+        df_bands = Uncertainty_Bands[test_name][key]
+        axis.plot(df_bands.loc[:, "testing_time"]/60, df_bands.loc[:, f"{name}_p{median}"], label = name)
+        axis.fill_between(df_bands.loc[:, "testing_time"]/60, df_bands.loc[:, f"{name}_p{low}"],
+                          df_bands.loc[:, f"{name}_p{high}"], alpha = 0.3)
+    axis.set_title(test_name)
+    axis.set_ylabel("HRR [kW]")
+    axis.set_xlim(0, 60)
+axes[0].legend()
+axes[-1].set_xlabel("Time [min]")
+plt.tight_layout()
+fig.savefig("HRR_Uncertainty_Bands.png", dpi = 600)
+plt.close(fig)
@@ -0,0 +1,19 @@
+"""
+This script contains the calibration curves of the bidirectional pressure probes.
+Structured as a dictionary with one calibration per probe type.
+
+Each calibration gives the probe coefficient "gamma" (v = gamma * sqrt(2 * |dp| / rho)) as a function of the Reynolds
+number of the probe, Re = rho * |v| * "diameter" / mu. Between the tabulated values gamma is interpolated linearly and
+outside them it is kept constant. A calibration can be passed as gamma to calculation_velocity and the other door
+frame functions instead of the constant value.
+
+The McCaffrey and Heskestad (1976) curve is the inverse of their correction factor
+f(Re) = 1.533 - 1.366e-3 Re + 1.688e-6 Re^2 - 9.705e-10 Re^3 + 2.555e-13 Re^4 - 2.484e-17 Re^5 (40 < Re < 2000)
+and 1 / 1.08 above it.
+"""
+
+probe_calibration = {"McCaffrey_Heskestad": {"diameter": 0.016,
+                                             "Re": [40, 60, 80, 100, 150, 200, 300, 400, 500, 600, 800, 1000, 1200,
+                                                    1500, 2000, 3800],
+                                             "gamma": [0.675, 0.686, 0.697, 0.708, 0.734, 0.758, 0.799, 0.833, 0.858,
+                                                       0.875, 0.893, 0.897, 0.896, 0.900, 0.924, 0.926]}}
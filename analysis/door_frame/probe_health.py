@@ -0,0 +1,356 @@
+"""
+Automatic detection of failed pressure probes, used to suggest the repair windows of repair_schedule.py without
+going through the plots of main_door_frame.py.
+
+Every probe used in the pressure profile of the test (the _DeltaP_smooth channels of the door frame analysis, only
+the probes of probe_averages at the heights with several probes) is checked after the start of the test with rolling
+windows computed from cumulative sums, for all probes at once:
+    - flatline: the unsmoothed reading (_DeltaP) does not change within the window (logger or transducer stuck)
+    - saturation: most of the window is pinned at the maximum or minimum reading of the probe
+    - disagreement: the reading is far from the linear interpolation of the neighbouring heights, relative to the
+      magnitude of that interpolation
+
+Flagged samples separated by short gaps are merged, and intervals that are too short are discarded. The result is
+given per probe and as a suggestion for the test: the probes to average at the heights with several probes (the
+failed probes are dropped from the average) and the repairs of the PP_ channels in the format of repair_schedule.py
+for the heights that cannot be saved by dropping probes.
+
+"""
+
+import numpy as np
+
+# import my own functions
+from calculation_massflow import door_heights, probe_averages, probe_averages_all, repair_weights
+
+# thresholds of the checks (times in seconds, pressures in Pa)
+health_thresholds = {"window": 60,
+                     "flatline": 1e-6,
+                     "saturation_tolerance": 0.005,
+                     "saturation_fraction": 0.8,
+                     "disagreement": 1.0,
+                     "disagreement_floor": 1.0,
+                     "min_duration": 60,
+                     "merge_gap": 120}
+
+
+def rolling_sum(values, window):
+    """
+    Centred rolling sum of every column with cumulative sums (shorter windows at the ends of the record)
+
+    Parameters:
+    ----------
+    values: one row per time step
+        np.array
+
+    window: number of samples of the window
+        int
+
+    Returns:
+    -------
+    total: sum of the values within the window centred at every time step
+        np.array
+    """
+    values = np.asarray(values, dtype = float)
+    cumulative = np.zeros((len(values) + 1,) + values.shape[1:])
+    np.cumsum(values, axis = 0, out = cumulative[1:])
+
+    start = np.clip(np.arange(len(values)) - window // 2, 0, len(values))
+    end = np.clip(start + window, 0, len(values))
+
+    return cumulative[end] - cumulative[start]
+
+
+def rolling_mean(values, window):
+    """
+    Centred rolling mean of every column ignoring nan values (see rolling_sum)
+
+    Parameters:
+    ----------
+    values: one row per time step
+        np.array
+
+    window: number of samples of the window
+        int
+
+    Returns:
+    -------
+    mean: mean of the values within the window centred at every time step (nan if all of them are nan)
+        np.array
+    """
+    valid = ~np.isnan(values)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        mean = rolling_sum(np.where(valid, values, 0), window) / rolling_sum(valid, window)
+
+    return mean
+
+
+def widen_flags(flags, window):
+    """
+    Flags every sample within the window of a flagged sample (the same centred windows as rolling_sum)
+
+    Parameters:
+    ----------
+    flags: flagged samples with one column per probe
+        np.array
+
+    window: number of samples of the window
+        int
+
+    Returns:
+    -------
+    flags: widened flags
+        np.array
+    """
+    # the window of sample i covers the samples i - window//2 to i - window//2 + window - 1, so the samples covered by
+    # a flagged window are found with the reversed windows
+    return rolling_sum(np.asarray(flags, dtype = bool)[::-1], window)[::-1] > 0
+
+
+def clean_flags(flags, merge_gap, min_duration):
+    """
+    Merges flagged intervals separated by short gaps (closing) and removes the short intervals (opening), for every
+    column at once
+
+    Parameters:
+    ----------
+    flags: flagged samples with one column per probe
+        np.array
+
+    merge_gap: gaps shorter than this number of samples are flagged
+        int
+
+    min_duration: intervals shorter than this number of samples are not flagged
+        int
+
+    Returns:
+    -------
+    flags: cleaned flags
+        np.array
+    """
+    # the windows of the erosion are reversed in the dilation (widen_flags), so that the intervals do not shift
+    def erode(x, window):
+        return rolling_sum(~x, window) == 0
+
+    flags = np.asarray(flags, dtype = bool)
+    if merge_gap > 1:
+        flags = erode(widen_flags(flags, merge_gap), merge_gap)
+    if min_duration > 1:
+        flags = widen_flags(erode(flags, min_duration), min_duration)
+
+    return flags
+
+
+def flag_intervals(flags, testing_time):
+    """
+    Start and end time of the flagged intervals of every column, in the format of the windows of repair_schedule.py
+    (times of the samples just before and after each interval, end = None if it lasts until the end of the record)
+
+    Parameters:
+    ----------
+    flags: flagged samples with one column per probe
+        np.array
+
+    testing_time: time of every sample (s)
+        np.array
+
+    Returns:
+    -------
+    intervals: list of (start, end) tuples for every column
+        list
+    """
+    padded = np.zeros((len(flags) + 2, flags.shape[1]), dtype = np.int8)
+    padded[1:-1] = flags
+    rows_start, columns_start = np.nonzero(np.diff(padded, axis = 0) == 1)
+    rows_end, columns_end = np.nonzero(np.diff(padded, axis = 0) == -1)
+
+    # nonzero runs over the rows first, so the starts and ends of every column are sorted by column
+    order_start, order_end = np.lexsort((rows_start, columns_start)), np.lexsort((rows_end, columns_end))
+    rows_start, columns_start = rows_start[order_start], columns_start[order_start]
+    rows_end = rows_end[order_end]
+
+    intervals = [[] for _ in range(flags.shape[1])]
+    for row_start, row_end, column in zip(rows_start, rows_end, columns_start):
+        start = round(float(testing_time[row_start - 1]), 2) if row_start > 0 else -np.inf
+        end = round(float(testing_time[row_end]), 2) if row_end < len(testing_time) else None
+        intervals[column].append((start, end))
+
+    return intervals
+
+
+def used_probes(probes, test_name):
+    """
+    Probes that are used in the pressure profile of a test: all the probes at the heights with a single probe and
+    the probes of probe_averages at the heights with several probes
+
+    Parameters:
+    ----------
+    probes: names of the probes (e.g. "P1.20")
+        list
+
+    test_name: name of the test (all probes at a height are averaged for unknown tests)
+        str
+
+    Returns:
+    -------
+    probes: names of the used probes, in the same order
+        list
+    """
+    averages = probe_averages.get(test_name, probe_averages_all)
+
+    return [probe for probe in probes
+            if int(probe.split(".")[1]) not in averages or probe in averages[int(probe.split(".")[1])]]
+
+
+def detect_failed_probes(df, test_name, thresholds = health_thresholds):
+    """
+    Checks every pressure probe used in the pressure profile of the test for flatline, saturation and disagreement
+    with the neighbouring heights
+
+    Parameters:
+    ----------
+    df: output of calculation_door_frame or calculation_velocity (testing_time in seconds). It should be processed
+        without repairs (repairs = []) so that the PP_ channels are not modified
+        pd.DataFrame
+
+    test_name: name of the test. Determines which probes are used (see used_probes)
+        str
+
+    thresholds: thresholds of the checks (see health_thresholds)
+        dict
+
+    Returns:
+    -------
+    health: "probes" (names), "flags" (failed samples of every probe, one column per probe) and "windows"
+            (list of (start, end) flagged intervals of every probe)
+        dict
+    """
+    probes = used_probes([column[:-len("_DeltaP_smooth")] for column in df.columns
+                          if column.endswith("_DeltaP_smooth")], test_name)
+    testing_time = df.loc[:, "testing_time"].values
+    deltap = df.loc[:, [f"{probe}_DeltaP" for probe in probes]].values
+    deltap_smooth = df.loc[:, [f"{probe}_DeltaP_smooth" for probe in probes]].values
+
+    # number of samples of the windows
+    dt = np.nanmedian(np.diff(testing_time))
+    window, merge_gap, min_duration = [max(int(round(thresholds[name] / dt)), 1)
+                                       for name in ["window", "merge_gap", "min_duration"]]
+
+    # flatline: mean change of the unsmoothed reading between consecutive samples within the window
+    change = np.abs(np.diff(deltap, axis = 0, prepend = deltap[:1]))
+    flatline = rolling_mean(change, window) < thresholds["flatline"]
+
+    # the windows that meet the condition are centred within the failure, so every flagged sample is widened to its
+    # whole window (otherwise window/2 of the failure would be missed at each end)
+    flatline = widen_flags(flatline, window)
+
+    # saturation: fraction of the window in which the unsmoothed reading is at the extreme readings of the probe 
+    # (the noise keeps most readings of a working probe away from its extremes)
+    extreme_min, extreme_max = np.nanmin(deltap, axis = 0), np.nanmax(deltap, axis = 0)
+    tolerance = thresholds["saturation_tolerance"] * (extreme_max - extreme_min)
+    at_extreme = (deltap <= extreme_min + tolerance) | (deltap >= extreme_max - tolerance)
+    saturation = widen_flags(rolling_mean(at_extreme, window) > thresholds["saturation_fraction"], window)
+
+    # disagreement: the median profile of the probes at every height is interpolated at the height of each probe
+    # from the closest heights below and above (extrapolated from the two closest at the bottom and top)
+    probe_heights = np.array([int(probe.split(".")[1]) for probe in probes])
+    profile = np.column_stack([np.nanmedian(deltap_smooth[:, probe_heights == height], axis = 1)
+                               for height in door_heights])
+    neighbours = np.zeros((len(door_heights), len(probes)))
+    for j, height in enumerate(probe_heights):
+        source_heights = [x for x in door_heights if x != height]
+        i, weight = repair_weights(source_heights, height)
+        neighbours[door_heights.index(source_heights[i]), j] = 1 - weight
+        neighbours[door_heights.index(source_heights[i+1]), j] = weight
+    estimate = profile @ neighbours
+    residual = rolling_mean(np.abs(deltap_smooth - estimate), window)
+    score = residual / (rolling_mean(np.abs(estimate), window) + thresholds["disagreement_floor"])
+    
+    # a failed probe also spoils the estimate at the adjacent heights (by about half of its own error), so only the 
+    # probes that disagree more than the probes of the adjacent heights are flagged
+    residual_height = np.column_stack([np.nanmax(residual[:, probe_heights == height], axis = 1) 
+                                       for height in door_heights])
+    residual_adjacent = np.full(residual_height.shape, -np.inf)
+    residual_adjacent[:, 1:] = residual_height[:, :-1]
+    residual_adjacent[:, :-1] = np.maximum(residual_adjacent[:, :-1], residual_height[:, 1:])
+    residual_adjacent = residual_adjacent[:, [door_heights.index(height) for height in probe_heights]]
+    disagreement = (score > thresholds["disagreement"]) & (residual >= residual_adjacent)
+
+    flags = (flatline | saturation | disagreement) & (testing_time >= 0)[:, None]
+    flags = clean_flags(flags, merge_gap, min_duration)
+
+    health = {"probes": probes,
+              "flags": flags,
+              "windows": dict(zip(probes, flag_intervals(flags, testing_time)))}
+
+    return health
+
+
+def suggest_repair_schedule(df, test_name, thresholds = health_thresholds):
+    """
+    Suggests the probes to average and the repairs of a test from the failed probes found by detect_failed_probes.
+    At the heights with several probes the failed probes are dropped from the average, and the height is only
+    repaired if all of its probes fail at some time (then, as for the heights with a single probe, whenever any of
+    them fails). Repairs interpolate from the closest heights that have not failed during the same windows (or
+    extrapolate from all of them at the bottom and top of the door)
+
+    Parameters:
+    ----------
+    df: output of calculation_door_frame or calculation_velocity processed without repairs (repairs = [])
+        pd.DataFrame
+
+    test_name: name of the test
+        str
+
+    thresholds: thresholds of the checks (see health_thresholds)
+        dict
+
+    Returns:
+    -------
+    suggestion: "probe_averages" (probes to average at the heights of probe_averages, in the format of
+                probe_averages) and "repairs" (suggested repairs in the format of repair_schedule.py)
+        dict
+    """
+    health = detect_failed_probes(df, test_name, thresholds)
+    testing_time = df.loc[:, "testing_time"].values
+
+    # failed samples of every height: failed probes are dropped from the average while any probe of the height works
+    probe_heights = np.array([int(probe.split(".")[1]) for probe in health["probes"]])
+    averaged_heights = probe_averages.get(test_name, probe_averages_all).keys()
+    averages = {}
+    flags = np.zeros((len(testing_time), len(door_heights)), dtype = bool)
+    for j, height in enumerate(door_heights):
+        probes = [probe for probe in health["probes"] if int(probe.split(".")[1]) == height]
+        failed = health["flags"][:, probe_heights == height]
+        working = [probe for k, probe in enumerate(probes) if not failed[:, k].any()]
+        if height in averaged_heights:
+            averages[height] = working or probes
+        if not working:
+            flags[:, j] = failed.any(axis = 1)
+    windows = flag_intervals(flags, testing_time)
+
+    repairs = []
+    for j, height in enumerate(door_heights):
+        if not windows[j]:
+            continue
+
+        # heights that work during all the windows of this height
+        mask = np.zeros(len(testing_time), dtype = bool)
+        for start, end in windows[j]:
+            mask |= (testing_time > start) & (testing_time < (np.inf if end is None else end))
+        working = [x for k, x in enumerate(door_heights) if k != j and not flags[mask, k].any()]
+        below, above = [x for x in working if x < height], [x for x in working if x > height]
+
+        if below and above:
+            method, source_heights = "interpolate", [below[-1], above[0]]
+        elif len(working) >= 2:
+            method, source_heights = "extrapolate", working
+        else:
+            continue
+
+        repairs.append({"channel": f"PP_{height}", "windows": windows[j],
+                        "method": method, "source_heights": source_heights})
+
+    suggestion = {"probe_averages": averages,
+                  "repairs": repairs}
+
+    return suggestion
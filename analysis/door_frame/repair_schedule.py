@@ -0,0 +1,48 @@
+"""
+This script contains the repairs applied to the damaged door frame sensors of each experiment.
+Structured as a dictionary with one list of repairs per test.
+
+Each repair substitutes the readings of "channel" with a linear estimate from the same type of sensor at
+"source_heights" (cm) during the time "windows" (seconds, start < testing_time < end, end = None means until the
+end of the test, windows = None means the whole test). "method" is either "interpolate" (np.interp) or
+"extrapolate" (linear extrapolation from the closest segment).
+
+Repairs are applied in the order in which they are listed (a repaired channel can be the source of a later repair)
+and the position of a repair in its list is the bit set in the Repair_Flags column of the processed data.
+"""
+
+repair_schedule_Alpha2 = [{"channel": "PP_120", "windows": [(300, 900)],
+                           "method": "interpolate", "source_heights": [100, 160]},
+                          {"channel": "PP_140", "windows": [(300, 900)],
+                           "method": "interpolate", "source_heights": [100, 160]},
+                          {"channel": "PP_180", "windows": [(0, 360), (720, 1260), (2400, None)],
+                           "method": "extrapolate", "source_heights": [100, 120, 140, 160]}]
+
+repair_schedule_Beta1 = [{"channel": "PP_20", "windows": [(600, 1200)],
+                          "method": "extrapolate", "source_heights": [60, 80]},
+                         {"channel": "PP_40", "windows": [(600, 1200)],
+                          "method": "extrapolate", "source_heights": [60, 80]},
+                         {"channel": "PP_100", "windows": [(420, 660)],
+                          "method": "interpolate", "source_heights": [80, 120]},
+                         {"channel": "PP_160", "windows": [(360, 3600)],
+                          "method": "extrapolate", "source_heights": [20, 40, 60, 80, 100, 120, 140]},
+                         {"channel": "PP_180", "windows": [(360, 3600)],
+                          "method": "extrapolate", "source_heights": [20, 40, 60, 80, 100, 120, 140, 160]}]
+
+repair_schedule_Beta2 = [{"channel": "TDD.40", "windows": None,
+                          "method": "extrapolate", "source_heights": [60, 80, 100, 120, 140, 160, 180]},
+                         {"channel": "PP_180", "windows": [(0, 900)],
+                          "method": "extrapolate", "source_heights": [20, 40, 60, 80, 100, 120, 140, 160]},
+                         {"channel": "PP_100", "windows": [(480, 600)],
+                          "method": "interpolate", "source_heights": [80, 120]}]
+
+repair_schedule_Gamma = [{"channel": "PP_120", "windows": [(420, 960)],
+                          "method": "interpolate", "source_heights": [100, 160]},
+                         {"channel": "PP_140", "windows": [(420, 960)],
+                          "method": "interpolate", "source_heights": [100, 160]}]
+
+repair_schedule = {"Alpha1": [],
+                   "Alpha2": repair_schedule_Alpha2,
+                   "Beta1": repair_schedule_Beta1,
+                   "Beta2": repair_schedule_Beta2,
+                   "Gamma": repair_schedule_Gamma}
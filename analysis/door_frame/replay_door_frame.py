@@ -0,0 +1,80 @@
+"""
+Replays the door frame data of a test through DoorFrameStream as if it was being logged live (N times faster than
+real time). It reports the latency and throughput of the online calculation and checks that its output matches the
+batch calculation (calculation_door_frame).
+
+"""
+
+import pickle
+import time
+import numpy as np
+import pandas as pd
+
+# import my own functions
+from calculation_massflow import calculation_area, calculation_door_frame
+from streaming_door_frame import DoorFrameStream
+
+# test to replay, speed-up with respect to real time and seconds of data in each chunk
+test_name = "Beta2"
+speed_up = 60
+chunk_seconds = 5
+
+# upload the data from the excel spreadsheets
+file_address = "C:/Users/s1475174/Documents/Python_Projects/BRE_Paper_2016/unprocessed_data/door_frame/DoorFrame_unprocessed.pkl"
+with open(file_address, "rb") as handle:
+    DoorFrame = pickle.load(handle)
+
+# same preparation of the data as in main_door_frame
+df = DoorFrame[test_name].iloc[:, :22].copy()
+df.rename(columns = {"Time [min]": "testing_time"}, inplace = True)
+df.loc[:, "testing_time"] = df.loc[:, "testing_time"]*60
+areas = calculation_area()
+
+# batch calculation
+start = time.time()
+df_batch = calculation_door_frame(df, test_name, areas)
+time_batch = time.time() - start
+
+# online calculation. Chunks are released following the testing time of the data
+stream = DoorFrameStream(test_name, areas)
+chunk_number = np.floor((df.loc[:, "testing_time"] - df.loc[:, "testing_time"].min()) / chunk_seconds)
+outputs = []
+latencies = []
+time_processing = 0
+start_replay = time.time()
+
+for _, chunk in df.groupby(chunk_number):
+
+    # wait until the last reading of the chunk would have been logged
+    time_logged = (chunk.loc[:, "testing_time"].max() - df.loc[:, "testing_time"].min()) / speed_up
+    time.sleep(max(0, time_logged - (time.time() - start_replay)))
+
+    start = time.time()
+    df_output = stream.update(chunk)
+    time_processing += time.time() - start
+    outputs.append(df_output)
+
+    # delay (in testing time) between the last reading received and the last sample calculated
+    if len(df_output):
+        latencies.append(chunk.loc[:, "testing_time"].max() - df_output.loc[:, "testing_time"].max())
+
+start = time.time()
+outputs.append(stream.finish())
+time_processing += time.time() - start
+df_stream = pd.concat(outputs)
+
+print(f"Replay of experiment {test_name} at {speed_up}x real time ({len(df)} readings, {chunk_seconds} s chunks)")
+print(f" batch calculation: {np.round(time_batch,3)} seconds")
+print(f" online calculation: {np.round(time_processing,3)} seconds "
+      f"({np.round(len(df)/time_processing)} readings per second)")
+print(f" latency: {np.round(np.median(latencies),1)} s median, {np.round(np.max(latencies),1)} s maximum (testing time)")
+
+# compare the online and batch results
+columns = [x for x in df_stream.columns if x != "Repair_Flags"]
+difference = np.abs(df_stream.loc[:, columns].values - df_batch.loc[df_stream.index, columns].values)
+print(f" samples: {len(df_stream)} online, {len(df_batch)} batch")
+print(f" maximum difference: {np.nanmax(difference)}")
+print(f" same repairs: {(df_stream.loc[:, 'Repair_Flags'].values == df_batch.loc[df_stream.index, 'Repair_Flags'].values).all()}")
+
+assert df_stream.index.equals(df_batch.index)
+assert np.allclose(df_stream.loc[:, columns].values, df_batch.loc[:, columns].values, equal_nan = True)
@@ -0,0 +1,296 @@
+"""
+Incremental (online) version of the door frame analysis, used to follow a test while it is running.
+
+Readings are fed in chunks and every output sample is emitted as soon as the Savitsky-Golay window centred on it
+is complete (a latency of window_length // 2 samples). The output matches calculation_door_frame run on the whole
+test once the stream is finished.
+
+"""
+
+import numpy as np
+import pandas as pd
+import re
+from scipy.signal import savgol_coeffs
+from numpy.lib.stride_tricks import sliding_window_view
+
+# import my own functions
+from calculation_massflow import (omega_probes, gems_probes, door_heights, compile_repair_schedule, apply_repair_schedule, calculation_pressure_profile,
+                                  calculation_door_temperature, calculation_density, calculation_probe_velocity,
+                                  calculation_neutral_plane, calculation_thermal_neutral_plane, calculation_door_massflow,
+                                  calculation_area)
+from repair_schedule import repair_schedule
+
+
+class DoorFrameStream:
+    """
+    Door frame processor that accepts the raw readings (testing_time in seconds, TDD.* and P* columns, as passed to
+    calculation_door_frame) in chunks and emits velocities, mass flow, neutral plane and hrr_internal_allmassin.
+
+    Readings before the start of the test (testing_time < 0) are held until the first reading after the start
+    arrives. They are then used as the baseline to zero the pressure probes and to calculate the ambient temperature.
+    After that, the cost per sample is constant.
+
+    Parameters:
+    ----------
+    test_name: name of the test (selects the repairs and the probes averaged at 0.4 m and 1.6 m)
+        str
+
+    areas: fraction of the door area to which each pressure probe corresponds (calculation_area() if None)
+        list
+
+    Cd, gamma, omega_factor, gems_factor, window_length, polyorder, repairs: see calculation_door_frame
+    """
+
+    def __init__(self, test_name, areas = None, Cd = 0.68, gamma = 0.94, omega_factor = 2.49, gems_factor = 10,
+                 window_length = 31, polyorder = 2, repairs = None):
+
+        self.test_name = test_name
+        self.areas = calculation_area() if areas is None else areas
+        self.Cd = Cd
+        self.gamma = gamma
+        self.omega_factor = omega_factor
+        self.gems_factor = gems_factor
+        self.window_length = window_length
+        self.repairs = repair_schedule.get(test_name, []) if repairs is None else repairs
+
+        # Savitsky-Golay coefficients for the centre of the window and for both edges (same as mode = "interp")
+        self.half_window = window_length // 2
+        self.coeffs_centre = savgol_coeffs(window_length, polyorder, use = "dot")
+        self.coeffs_start = np.array([savgol_coeffs(window_length, polyorder, pos = j, use = "dot")
+                                      for j in range(self.half_window)])
+        self.coeffs_end = np.array([savgol_coeffs(window_length, polyorder, pos = j, use = "dot")
+                                    for j in range(self.half_window + 1, window_length)])
+
+        # readings held before the start of the test and baseline values
+        self.prestart_chunks = []
+        self.started = False
+        self.temperature_ambient = np.nan
+        self.pressure_prestart_mean = None
+
+        # valid samples that have not been emitted yet (plus the last emitted samples required by the next windows)
+        self.buffer_deltap = None
+        self.buffer_rows = None
+        self.buffer_index = None
+        self.buffer_flags = None
+        self.n_buffered_emitted = 0
+        self.n_emitted = 0
+
+        # last neutral plane values, required for Neutral_Plane_Smooth
+        self.neutral_plane_history = np.array([])
+
+    def update(self, chunk):
+        """
+        Adds a chunk of readings and returns the samples that can already be calculated
+
+        Parameters:
+        ----------
+        chunk: new raw readings (same columns in every chunk)
+            pd.DataFrame
+
+        Returns:
+        -------
+        df: calculated samples (can be empty)
+            pd.DataFrame
+        """
+        if not self.started:
+            self.columns = list(chunk.columns)
+            self.prepare_columns()
+            self.prestart_chunks.append(chunk)
+
+            # keep holding readings until the test starts
+            if not (chunk.loc[:, "testing_time"] >= 0).any():
+                return self.empty_output()
+
+            chunk = pd.concat(self.prestart_chunks)
+            self.prestart_chunks = []
+            self.started = True
+            self.calculate_baseline(chunk)
+
+        self.add_to_buffer(chunk)
+
+        return self.emit(final = False)
+
+    def finish(self):
+        """
+        Flushes the last half window of samples (smoothed with the end of record coefficients)
+
+        Returns:
+        -------
+        df: remaining calculated samples
+            pd.DataFrame
+        """
+        if not self.started and self.prestart_chunks:
+            chunk = pd.concat(self.prestart_chunks)
+            self.prestart_chunks = []
+            self.started = True
+            self.calculate_baseline(chunk)
+            self.add_to_buffer(chunk)
+
+        return self.emit(final = True)
+
+    def prepare_columns(self):
+        """
+        Column indices of the raw readings used by the stages
+        """
+        columns = self.columns
+        self.tdd_columns = sorted([x for x in columns if re.match(r"TDD\.\d+$", x)], key = lambda x: int(x.split(".")[1]))
+        self.tdd_indices = [columns.index(x) for x in self.tdd_columns]
+        self.temperature_indices = [i for i, x in enumerate(columns) if "TDD" in x]
+        self.pressure_columns = [x for x in columns if "P" in x]
+        self.pressure_indices = [columns.index(x) for x in self.pressure_columns]
+        self.deltap_columns = [x for x in self.pressure_columns if x in omega_probes + gems_probes]
+        self.deltap_indices = [self.pressure_columns.index(x) for x in self.deltap_columns]
+        self.factors = np.array([self.omega_factor if x in omega_probes else self.gems_factor
+                                 for x in self.deltap_columns])
+        self.time_index = columns.index("testing_time")
+
+    def calculate_baseline(self, chunk):
+        """
+        Ambient temperature and zero of the pressure probes from the readings before the start of the test
+        """
+        raw, _ = self.repair_temperatures(chunk)
+        mask_prestart = raw[:, self.time_index] < 0
+
+        self.temperature_ambient = np.nanmean(np.nanmean(raw[mask_prestart][:, self.temperature_indices], axis = 0))
+        self.pressure_prestart_mean = np.nanmean(raw[mask_prestart][:, self.pressure_indices], axis = 0)
+
+    def repair_temperatures(self, chunk):
+        """
+        Applies the repairs of the door thermocouples to a chunk of readings
+        """
+        raw = np.array(chunk.values, dtype = float)
+        compiled_repairs = compile_repair_schedule(self.repairs, raw[:, self.time_index],
+                                                   [int(x.split(".")[1]) for x in self.tdd_columns], "TDD.")
+        tdd = raw[:, self.tdd_indices]
+        flags = apply_repair_schedule(tdd, compiled_repairs)
+        raw[:, self.tdd_indices] = tdd
+
+        return raw, flags
+
+    def add_to_buffer(self, chunk):
+        """
+        Zeroes the pressure readings of a chunk and appends the valid samples to the smoothing buffer
+        """
+        raw, flags = self.repair_temperatures(chunk)
+
+        # same samples as those dropped by the batch calculation
+        zeroed = raw[:, self.pressure_indices] - self.pressure_prestart_mean
+        mask_valid = ~(np.isnan(raw).any(axis = 1) | np.isnan(zeroed).any(axis = 1))
+        if np.isnan(self.temperature_ambient):
+            mask_valid[:] = False
+
+        deltap = zeroed[mask_valid][:, self.deltap_indices] * self.factors
+        rows = raw[mask_valid]
+        index = chunk.index[mask_valid]
+        flags = flags[mask_valid]
+
+        if self.buffer_deltap is None:
+            self.buffer_deltap, self.buffer_rows, self.buffer_index, self.buffer_flags = deltap, rows, index, flags
+        else:
+            self.buffer_deltap = np.concatenate([self.buffer_deltap, deltap])
+            self.buffer_rows = np.concatenate([self.buffer_rows, rows])
+            self.buffer_index = self.buffer_index.append(index)
+            self.buffer_flags = np.concatenate([self.buffer_flags, flags])
+
+    def emit(self, final):
+        """
+        Smooths every buffered sample whose window is complete and runs the remaining stages on them
+        """
+        if self.buffer_deltap is None:
+            return self.empty_output()
+
+        half = self.half_window
+        n_buffered = len(self.buffer_deltap)
+        first = self.n_buffered_emitted
+        smooth = []
+
+        # the first samples of the test are smoothed with the start of record coefficients
+        if self.n_emitted == 0 and n_buffered >= self.window_length:
+            smooth.append(self.coeffs_start @ self.buffer_deltap[:self.window_length])
+            first = half
+
+        # every sample with half a window of readings on each side
+        if self.n_emitted > 0 or smooth:
+            last = n_buffered - half
+            if last > first:
+                windows = sliding_window_view(self.buffer_deltap[first - half:last + half], self.window_length, axis = 0)
+                smooth.append(windows @ self.coeffs_centre)
+
+        # the last samples of the test are smoothed with the end of record coefficients
+        if final:
+            if self.n_emitted == 0 and n_buffered < self.window_length:
+                raise ValueError(f"Less than window_length = {self.window_length} valid samples in the test")
+            smooth.append(self.coeffs_end @ self.buffer_deltap[-self.window_length:])
+
+        if not smooth:
+            return self.empty_output()
+        smooth = np.concatenate(smooth)
+
+        # samples emitted now
+        rows = slice(self.n_buffered_emitted, self.n_buffered_emitted + len(smooth))
+        df = self.calculate_outputs(smooth, self.buffer_rows[rows], self.buffer_index[rows], self.buffer_flags[rows])
+        self.n_emitted += len(smooth)
+
+        # only the readings needed by the next windows (and by the end of record coefficients) are kept
+        n_keep = min(n_buffered, self.window_length)
+        n_drop = n_buffered - n_keep
+        self.buffer_deltap = self.buffer_deltap[n_drop:]
+        self.buffer_rows = self.buffer_rows[n_drop:]
+        self.buffer_index = self.buffer_index[n_drop:]
+        self.buffer_flags = self.buffer_flags[n_drop:]
+        self.n_buffered_emitted = rows.stop - n_drop
+
+        return df
+
+    def calculate_outputs(self, deltap_smooth, rows, index, flags):
+        """
+        Runs the stages after the smoothing (same functions as calculation_door_profiles)
+        """
+        testing_time = rows[:, self.time_index]
+
+        # pressure profile and repairs of the damaged probes
+        pp = calculation_pressure_profile(deltap_smooth, self.deltap_columns, self.test_name)
+        compiled_repairs = compile_repair_schedule(self.repairs, testing_time, door_heights, "PP_")
+        flags = flags | apply_repair_schedule(pp, compiled_repairs)
+
+        # door temperatures at every height (ambient temperature at h = 20 cm)
+        tdd_profile = np.empty((len(rows), len(door_heights)))
+        tdd_profile[:, 0] = self.temperature_ambient
+        for i, height in enumerate(door_heights[1:]):
+            tdd_profile[:, i+1] = rows[:, self.columns.index(f"TDD.{height}")]
+
+        # temperature, density, velocity, neutral plane and mass flow
+        tc = calculation_door_temperature(pp, tdd_profile, self.temperature_ambient)
+        rho = calculation_density(tc)
+        velocity = calculation_probe_velocity(pp, rho, self.gamma)
+        neutral_plane, _ = calculation_neutral_plane(velocity, np.array(door_heights)/100)
+        neutral_plane_thermal = calculation_thermal_neutral_plane(tdd_profile, np.array(door_heights)/100,
+                                                                  self.temperature_ambient)
+        massflow = calculation_door_massflow(rho, velocity, self.areas, self.Cd)
+
+        # rolling mean of the neutral plane over the last 30 samples
+        history = np.concatenate([self.neutral_plane_history, neutral_plane])
+        neutral_plane_smooth = pd.Series(history).rolling(30).mean().values[-len(neutral_plane):]
+        self.neutral_plane_history = history[-29:]
+
+        df = pd.DataFrame(velocity, index = index, columns = [f"V_{x}" for x in door_heights])
+        df.insert(0, "testing_time", testing_time)
+        df.loc[:, "Neutral_Plane"] = neutral_plane
+        df.loc[:, "Neutral_Plane_Smooth"] = neutral_plane_smooth
+        df.loc[:, "Neutral_Plane_Thermal"] = neutral_plane_thermal
+        df.loc[:, "Neutral_Plane_Disagreement"] = neutral_plane - neutral_plane_thermal
+        for column in ["mass_in", "mass_out", "mass_average", "hrr_internal_allmassin"]:
+            df.loc[:, column] = massflow[column]
+        df.loc[:, "Repair_Flags"] = flags
+
+        return df
+
+    def empty_output(self):
+        """
+        DataFrame with the output columns and no rows
+        """
+        columns = (["testing_time"] + [f"V_{x}" for x in door_heights] + 
+                   ["Neutral_Plane", "Neutral_Plane_Smooth", "Neutral_Plane_Thermal", "Neutral_Plane_Disagreement"] +
+                   ["mass_in", "mass_out", "mass_average", "hrr_internal_allmassin", "Repair_Flags"])
+
+        return pd.DataFrame(columns = columns, dtype = float)
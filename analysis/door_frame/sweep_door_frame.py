@@ -0,0 +1,168 @@
+"""
+Parameter sweeps of the door frame analysis (Cd, gamma, door areas, window_length and polyorder of the
+Savitsky-Golay filter).
+
+Each intermediate result is only calculated once for the parameters it depends on:
+    - smoothing, pressure profile, temperature, density and neutral plane depend only on window_length and polyorder
+    - velocity is proportional to gamma, so it is calculated once with gamma = 1
+    - mass_in and mass_out are proportional to Cd * gamma and linear in the areas, so they are split into inflow and
+      outflow once per set of areas and then scaled by every combination of Cd and gamma
+
+Results are returned as labelled N-dimensional arrays: a dictionary with the coordinates of every dimension and,
+for each output, the names of its dimensions and its values.
+
+"""
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# import my own functions
+from calculation_massflow import calculation_area, calculation_door_profiles, door_profile_matrix, split_massflow
+
+# dimensions of each output of the sweep
+sweep_dims = {"mass_in": ("window_length", "polyorder", "areas", "gamma", "Cd", "testing_time"),
+              "mass_out": ("window_length", "polyorder", "areas", "gamma", "Cd", "testing_time"),
+              "Neutral_Plane": ("window_length", "polyorder", "testing_time"),
+              "Neutral_Plane_Smooth": ("window_length", "polyorder", "testing_time")}
+
+
+def sweep_door_frame(df, test_name, Cd = (0.68,), gamma = (0.94,), areas = None, window_length = (31,),
+                     polyorder = (2,), n_processes = None, **kwargs):
+    """
+    Calculates mass_in, mass_out and the neutral plane of one test for every combination of the parameter grids
+
+    Parameters:
+    ----------
+    df: raw door frame data (testing_time in seconds, as passed to calculation_door_frame)
+        pd.DataFrame
+
+    test_name: name of the test
+        str
+
+    Cd, gamma, window_length, polyorder: values of each parameter
+        tuple
+
+    areas: sets of door areas, each with one area per probe height (e.g. {"0.80 m": calculation_area(door_width = 0.8)}).
+           Only calculation_area() if None
+        dict
+
+    n_processes: number of processes used for the window_length and polyorder combinations (no pool if None)
+        int
+
+    kwargs: any other argument of calculation_door_profiles (omega_factor, gems_factor, repairs)
+
+    Returns:
+    -------
+    sweep: "coords" of every dimension, "dims" and "values" of every output (see sweep_dims). Combinations with
+           polyorder >= window_length are nan
+        dict
+    """
+    return sweep_door_frame_campaign({test_name: df}, Cd, gamma, areas, window_length, polyorder, n_processes,
+                                     **kwargs)[test_name]
+
+
+def sweep_door_frame_campaign(tests, Cd = (0.68,), gamma = (0.94,), areas = None, window_length = (31,),
+                              polyorder = (2,), n_processes = None, **kwargs):
+    """
+    Runs sweep_door_frame for several tests, sharing the process pool between all of them. Raises a ValueError if no
+    combination of window_length and polyorder is valid (polyorder < window_length)
+
+    Parameters:
+    ----------
+    tests: raw door frame data of each test, with the test names as keys
+        dict
+
+    Cd, gamma, areas, window_length, polyorder, n_processes, kwargs: see sweep_door_frame
+
+    Returns:
+    -------
+    sweeps: output of sweep_door_frame for each test
+        dict
+    """
+    areas = {"default": calculation_area()} if areas is None else areas
+    Cd, gamma, window_length, polyorder = list(Cd), list(gamma), list(window_length), list(polyorder)
+    area_matrix = np.array([areas[label] for label in areas], dtype = float)
+
+    # one task per test and smoothing setting, everything else is broadcast within the task
+    tasks = [(test_name, w, p) for test_name in tests for w in window_length for p in polyorder if p < w]
+    if not tasks:
+        raise ValueError(f"no valid smoothing setting: polyorder {polyorder} must be smaller than window_length "
+                         f"{window_length} for at least one combination")
+    arguments = [(tests[test_name], test_name, w, p, area_matrix, np.asarray(gamma, dtype = float),
+                  np.asarray(Cd, dtype = float), kwargs) for test_name, w, p in tasks]
+
+    if n_processes is None:
+        results = [sweep_smoothing(*argument) for argument in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers = n_processes) as executor:
+            results = list(executor.map(sweep_smoothing, *zip(*arguments)))
+
+    sweeps = {}
+    for test_name in tests:
+        test_results = {(w, p): result for (name, w, p), result in zip(tasks, results) if name == test_name}
+        testing_time = next(iter(test_results.values()))["testing_time"]
+
+        coords = {"window_length": window_length,
+                  "polyorder": polyorder,
+                  "areas": list(areas),
+                  "gamma": gamma,
+                  "Cd": Cd,
+                  "testing_time": testing_time}
+
+        values = {}
+        for output, dims in sweep_dims.items():
+            values[output] = np.full([len(coords[dim]) for dim in dims], np.nan)
+            for (w, p), result in test_results.items():
+                values[output][window_length.index(w), polyorder.index(p)] = result[output]
+
+        sweeps[test_name] = {"coords": coords, "dims": sweep_dims, "values": values}
+
+    return sweeps
+
+
+def sweep_smoothing(df, test_name, window_length, polyorder, area_matrix, gamma, Cd, kwargs):
+    """
+    Runs the door frame analysis for one smoothing setting and broadcasts the results over areas, gamma and Cd
+
+    Parameters:
+    ----------
+    df: raw door frame data
+        pd.DataFrame
+
+    test_name: name of the test
+        str
+
+    window_length, polyorder: parameters of the Savitsky-Golay filter
+        int
+
+    area_matrix: sets of door areas (one row per set, one column per probe height)
+        np.array
+
+    gamma, Cd: values of gamma and Cd
+        np.array
+
+    kwargs: any other argument of calculation_door_profiles
+        dict
+
+    Returns:
+    -------
+    result: "testing_time" and the values of every output for this smoothing setting
+        dict
+    """
+    # velocities with gamma = 1 (no mass flow)
+    profiles = calculation_door_profiles(df, test_name, gamma = 1, window_length = window_length,
+                                         polyorder = polyorder, **kwargs)
+    columns = profiles["columns"]
+
+    # inflow and outflow for Cd = 1 and gamma = 1 for every set of areas (areas x time)
+    mass = door_profile_matrix(profiles, "Rho_") * door_profile_matrix(profiles, "V_")
+    mass_in, mass_out, _, _, _ = split_massflow(mass[:, None, :] * area_matrix[None, :, :])
+    scale = gamma[None, :, None, None] * Cd[None, None, :, None]
+
+    result = {"testing_time": profiles["values"][:, columns.index("testing_time")],
+              "mass_in": mass_in.T[:, None, None, :] * scale,
+              "mass_out": mass_out.T[:, None, None, :] * scale,
+              "Neutral_Plane": profiles["values"][:, columns.index("Neutral_Plane")],
+              "Neutral_Plane_Smooth": profiles["values"][:, columns.index("Neutral_Plane_Smooth")]}
+
+    return result
@@ -0,0 +1,181 @@
+"""
+Generator of synthetic DoorFrame sheets (same columns as DoorFrame_unprocessed.pkl) to test and benchmark the door
+frame analysis at any logging rate and duration.
+
+The fire grows as t^2 up to its peak, burns steadily and decays over the last 20 % of the test. The doorway follows a
+two-zone compartment: a hot layer above an interface that drops as the fire grows, hydrostatic pressure differences
+(recorded as the voltage of the transducers, with their conversion factor, offset and noise) and door temperatures.
+The gas analyser readings follow the fire with a transport delay and a first-order response, and are logged at their
+own rate in the last columns of the sheet (padded with nan values, as in the spreadsheets).
+
+Sensor failures are injected as a list of dictionaries with the "channel" (any column of the sheet), the "type" of
+failure and its "window" (start, end) in seconds:
+    - "flatline": the reading stays at its value at the start of the window
+    - "saturation": the reading is clipped at "value", the "upper" or "lower" "rail" of the transducer
+    - "drift": a ramp reaching "value" at the end of the window is added to the reading
+    - "dropout": the readings are nan
+    - "noise": noise with standard deviation "value" is added to the reading
+
+"""
+
+import numpy as np
+import pandas as pd
+
+# import my own functions
+from calculation_massflow import omega_probes, gems_probes
+
+g = 9.81
+temperature_ambient = 20
+
+# logger channels of the spreadsheets
+tdd_heights = list(range(40,200,20))
+probe_heights = {probe: int(probe.split(".")[1]) for probe in omega_probes + gems_probes}
+probe_factors = {**{probe: 2.49 for probe in omega_probes}, **{probe: 10 for probe in gems_probes}}
+
+
+def fire_growth(testing_time, duration, growth_time = 600):
+    """
+    Fraction of the peak fire size at every time (t^2 growth, steady burning and linear decay)
+
+    Parameters:
+    ----------
+    testing_time: time since ignition (s)
+        np.array
+
+    duration: duration of the test (s)
+        float
+
+    growth_time: time to reach the peak (s). Limited to 20 % of the duration
+        float
+
+    Returns:
+    -------
+    q: fraction of the peak fire size
+        np.array
+    """
+    growth_time = min(growth_time, 0.2 * duration)
+    decay_start = 0.8 * duration
+    q = np.clip(testing_time / growth_time, 0, 1)**2
+    q = q * np.clip((duration - testing_time) / (duration - decay_start), 0, 1)
+
+    return q
+
+
+def inject_failures(df, failures):
+    """
+    Applies the sensor failures to the columns of the sheet (in place). The windows of the gas analyser channels
+    refer to its own time column
+
+    Parameters:
+    ----------
+    df: synthetic sheet
+        pd.DataFrame
+
+    failures: failures to inject (see the description of the module)
+        list
+    """
+    for failure in failures:
+        start, end = failure["window"]
+        time_column = "Time" if failure["channel"] in ["O2", "CO", "CO2"] else "Time [min]"
+        testing_time = df.loc[:, time_column].values * 60
+        mask = (testing_time > start) & (testing_time < end)
+        if not mask.any():
+            continue
+        values = df.loc[:, failure["channel"]].values.copy()
+
+        if failure["type"] == "flatline":
+            values[mask] = values[np.flatnonzero(mask)[0]]
+        elif failure["type"] == "saturation":
+            if failure["rail"] not in ["upper", "lower"]:
+                raise ValueError(f"unknown rail {failure['rail']}")
+            clip = np.minimum if failure["rail"] == "upper" else np.maximum
+            values[mask] = clip(values[mask], failure["value"])
+        elif failure["type"] == "drift":
+            values[mask] = values[mask] + failure["value"] * (testing_time[mask] - start) / (end - start)
+        elif failure["type"] == "dropout":
+            values[mask] = np.nan
+        elif failure["type"] == "noise":
+            values[mask] = values[mask] + np.random.default_rng(0).normal(0, failure["value"], mask.sum())
+        else:
+            raise ValueError(f"unknown failure type {failure['type']}")
+
+        df.loc[:, failure["channel"]] = values
+
+
+def synthetic_door_frame(duration = 3600, frequency = 1, prestart = 300, gas_frequency = 1, temperature_peak = 800,
+                         failures = None, seed = 0):
+    """
+    Synthetic DoorFrame sheet of one test
+
+    Parameters:
+    ----------
+    duration: duration of the test after ignition (s)
+        float
+
+    frequency: logging rate of the door frame sensors (Hz)
+        float
+
+    prestart: time logged before ignition (s)
+        float
+
+    gas_frequency: logging rate of the gas analyser (Hz)
+        float
+
+    temperature_peak: temperature rise of the hot layer at the peak of the fire (C)
+        float
+
+    failures: sensor failures to inject (see the description of the module)
+        list
+
+    seed: seed of the random noise
+        int
+
+    Returns:
+    -------
+    df: sheet with "Time [min]", TDD.*, the 13 pressure probes, "gap" and the gas analyser "Time", "O2", "CO", "CO2"
+        pd.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    testing_time = np.arange(-prestart, duration, 1 / frequency)
+    q = fire_growth(testing_time, duration)
+
+    # hot layer and neutral plane (the interface drops from the top of the door as the fire grows)
+    interface = 1.9 - 0.9 * q + 0.03 * np.sin(2 * np.pi * testing_time / 300) * q
+    neutral_plane = interface - 0.1 * q
+    temperature_hot = temperature_ambient + temperature_peak * q
+    temperature_cold = temperature_ambient + 0.1 * temperature_peak * q
+
+    data = {"Time [min]": testing_time / 60}
+    for height in tdd_heights:
+        temperature = np.where(height / 100 > interface, temperature_hot, temperature_cold)
+        data[f"TDD.{height}"] = temperature + rng.normal(0, 2, len(testing_time))
+
+    # two-zone hydrostatic pressure difference recorded as the voltage of the transducers
+    rho_ambient = 353 / (temperature_ambient + 273)
+    for probe, height in probe_heights.items():
+        z = height / 100
+        rho = 353 / (np.where(z > interface, temperature_hot, temperature_cold) + 273)
+        deltap = g * (neutral_plane - z) * (rho_ambient - rho) + rng.normal(0, 0.05, len(testing_time))
+        data[probe] = deltap / probe_factors[probe] + rng.normal(0.3, 0.05)
+
+    data["gap"] = np.full(len(testing_time), np.nan)
+    df = pd.DataFrame(data)
+
+    # gas analyser: 30 s transport delay and 12 s first-order response
+    gas_time = np.arange(-prestart, duration, 1 / gas_frequency)
+    q_gas = fire_growth(gas_time - 30, duration)
+    q_gas = pd.Series(q_gas).ewm(alpha = (1 / gas_frequency) / (12 + 1 / gas_frequency), adjust = False).mean().values
+    gas = {"Time": gas_time / 60,
+           "O2": 20.95 - 10 * q_gas + rng.normal(0, 0.05, len(gas_time)),
+           "CO": 0.5 * q_gas + rng.normal(0, 0.005, len(gas_time)),
+           "CO2": 0.04 + 8 * q_gas + rng.normal(0, 0.05, len(gas_time))}
+
+    # both loggers share the rows of the sheet, the shortest one is padded with nan values
+    n_rows = max(len(df), len(gas_time))
+    df = df.reindex(range(n_rows))
+    for column, values in gas.items():
+        df[column] = np.r_[values, np.full(n_rows - len(values), np.nan)]
+
+    inject_failures(df, failures or [])
+
+    return df
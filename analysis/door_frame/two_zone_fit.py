@@ -0,0 +1,243 @@
+"""
+Two-zone hydrostatic fit of the pressure profile at the door.
+
+Instead of treating the 9 probes as independent strips, the pressure difference at every time step is fitted with a
+two-zone model: ambient air outside (density rho_a), a cold zone inside below the neutral plane (rho_cold) and a hot
+zone inside above it (rho_hot):
+
+    dp(z) = g * (rho_a - rho_cold) * (z_n - z)    for z < z_n (inflow)
+    dp(z) = g * (rho_a - rho_hot) * (z_n - z)     for z > z_n (outflow)
+
+The three parameters (z_n, rho_hot, rho_cold) of all time steps are found at once with a vectorised
+Levenberg-Marquardt solver. The densities are kept between 5 % of rho_a and rho_a and z_n within the door.
+
+The fit of every time step is independent, so the neutral plane jumps between time steps wherever the densities are
+poorly defined by the profile (it is noisier than the interpolated neutral plane). The parameters are therefore
+smoothed over time with a Savitsky-Golay filter, as the pressure differences are, and the profile is recomputed from
+the smoothed parameters.
+
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.signal import savgol_filter
+
+# import my own functions
+from calculation_massflow import (door_heights, calculation_door_profiles, door_profile_matrix, calculation_neutral_plane,
+                                  calculation_door_temperature, calculation_density, calculation_probe_velocity,
+                                  calculation_massflow)
+
+g = 9.81
+door_height = 2.0
+
+
+def two_zone_profile(parameters, heights, rho_ambient):
+    """
+    Pressure difference of the two-zone model and its derivatives with respect to the parameters
+
+    Parameters:
+    ----------
+    parameters: z_n, rho_hot and rho_cold of every time step (time x 3)
+        np.array
+
+    heights: heights of the probes (m)
+        np.array
+
+    rho_ambient: density of the ambient air
+        float
+
+    Returns:
+    -------
+    dp: pressure difference at every time step and height
+        np.array
+
+    jacobian: derivatives of dp with respect to z_n, rho_hot and rho_cold (time x heights x 3)
+        np.array
+    """
+    z_n, rho_hot, rho_cold = parameters[:, 0:1], parameters[:, 1:2], parameters[:, 2:3]
+    below = heights[None, :] < z_n
+    distance = z_n - heights[None, :]
+
+    slope = g * (rho_ambient - np.where(below, rho_cold, rho_hot))
+    dp = slope * distance
+
+    jacobian = np.empty(dp.shape + (3,))
+    jacobian[..., 0] = slope
+    jacobian[..., 1] = np.where(below, 0, -g * distance)
+    jacobian[..., 2] = np.where(below, -g * distance, 0)
+
+    return dp, jacobian
+
+
+def fit_two_zone_profile(pp, heights, temperature_ambient, max_iterations = 50, tolerance = 1e-10,
+                         window_length = None, polyorder = 2):
+    """
+    Fits the two-zone model to the pressure profile of every time step at once (Levenberg-Marquardt), and smooths
+    the fitted parameters over time if window_length is given
+
+    Parameters:
+    ----------
+    pp: pressure difference with one row per time step and one column per height
+        np.array
+
+    heights: heights of the probes (m)
+        np.array
+
+    temperature_ambient: ambient temperature (C)
+        float
+
+    max_iterations: maximum number of iterations
+        int
+
+    tolerance: the iterations of a time step stop when the relative reduction of its sum of squares is smaller
+        float
+
+    window_length: the length of the filter window for the Savitsky-Golay filter of the parameters (not smoothed
+                   if None)
+        int
+
+    polyorder: the order of the polynomial used to fit the samples with the Savitsky-Golay filter
+        int
+
+    Returns:
+    -------
+    fit: "Neutral_Plane", "Rho_hot", "Rho_cold", "Fit_Residual" (rms residual), "PP" (fitted profile) and
+         "converged" for every time step (nan for time steps with nan readings)
+        dict
+    """
+    pp = np.asarray(pp, dtype = float)
+    heights = np.asarray(heights, dtype = float)
+    rho_ambient = calculation_density(temperature_ambient)
+    valid = ~np.isnan(pp).any(axis = 1)
+    pp_valid = pp[valid]
+    n = len(pp_valid)
+
+    # initial guess: linearly interpolated neutral plane and a single density from the mean slope of the profile
+    z_n, _ = calculation_neutral_plane(pp_valid, heights)
+    z_n = np.where(np.isnan(z_n), heights.mean(), z_n)
+    slope = -np.polyfit(heights, pp_valid.T, 1)[0] if n else np.array([])
+    rho = np.clip(rho_ambient - slope / g, 0.05 * rho_ambient, rho_ambient)
+    parameters = np.column_stack([z_n, 0.9 * rho, rho])
+
+    lower = np.array([heights.min() - 0.5 * np.diff(heights).mean(), 0.05 * rho_ambient, 0.05 * rho_ambient])
+    upper = np.array([door_height, rho_ambient, rho_ambient])
+
+    dp, jacobian = two_zone_profile(parameters, heights, rho_ambient)
+    residual = pp_valid - dp
+    cost = (residual**2).sum(axis = 1)
+    damping = np.full(n, 1e-3)
+    active = np.ones(n, dtype = bool)
+    eye = np.eye(3)
+
+    for _ in range(max_iterations):
+        if not active.any():
+            break
+        rows = np.flatnonzero(active)
+        J = jacobian[rows]
+        JtJ = np.einsum("thi,thj->tij", J, J)
+        Jtr = np.einsum("thi,th->ti", J, residual[rows])
+
+        # damped normal equations (scaled by the diagonal of JtJ) and step projected into the bounds
+        A = JtJ + damping[rows, None, None] * (JtJ * eye + 1e-12 * eye)
+        step = np.linalg.solve(A, Jtr[..., None])[..., 0]
+        trial = np.clip(parameters[rows] + step, lower, upper)
+
+        dp_trial, jacobian_trial = two_zone_profile(trial, heights, rho_ambient)
+        residual_trial = pp_valid[rows] - dp_trial
+        cost_trial = (residual_trial**2).sum(axis = 1)
+
+        # accept the steps that reduce the sum of squares, increase the damping of the others
+        accepted = cost_trial < cost[rows]
+        improvement = (cost[rows] - cost_trial) / np.maximum(cost[rows], 1e-300)
+        rows_accepted = rows[accepted]
+        parameters[rows_accepted] = trial[accepted]
+        jacobian[rows_accepted] = jacobian_trial[accepted]
+        residual[rows_accepted] = residual_trial[accepted]
+        cost[rows_accepted] = cost_trial[accepted]
+        damping[rows_accepted] = damping[rows_accepted] / 10
+        damping[rows[~accepted]] = damping[rows[~accepted]] * 10
+
+        # converged when an accepted step barely changes the cost or the damping has grown too large
+        active[rows[accepted & (improvement < tolerance)]] = False
+        active[rows[damping[rows] > 1e10]] = False
+
+    # smooth the parameters over time and recompute the profile and residual from the smoothed parameters
+    if window_length is not None and n >= window_length:
+        parameters = np.clip(savgol_filter(parameters, window_length, polyorder, axis = 0), lower, upper)
+        dp, _ = two_zone_profile(parameters, heights, rho_ambient)
+        residual = pp_valid - dp
+        cost = (residual**2).sum(axis = 1)
+
+    fit = {"Neutral_Plane": np.full(len(pp), np.nan),
+           "Rho_hot": np.full(len(pp), np.nan),
+           "Rho_cold": np.full(len(pp), np.nan),
+           "Fit_Residual": np.full(len(pp), np.nan),
+           "PP": np.full(pp.shape, np.nan),
+           "converged": np.zeros(len(pp), dtype = bool)}
+    fit["Neutral_Plane"][valid] = parameters[:, 0]
+    fit["Rho_hot"][valid] = parameters[:, 1]
+    fit["Rho_cold"][valid] = parameters[:, 2]
+    fit["Fit_Residual"][valid] = np.sqrt(cost / len(heights))
+    fit["PP"][valid] = pp_valid - residual
+    fit["converged"][valid] = ~active
+
+    return fit
+
+
+def calculation_door_frame_two_zone(df, test_name, areas, Cd = 0.68, gamma = 0.94, fit_window_length = 31,
+                                    fit_polyorder = 2, **kwargs):
+    """
+    Door frame analysis with the pressure profile replaced by its two-zone fit. The velocities and densities are then
+    used by calculation_massflow in the same way as for the probe by probe analysis
+
+    Parameters:
+    ----------
+    df: raw door frame data (testing_time in seconds, as passed to calculation_door_frame)
+        pd.DataFrame
+
+    test_name: name of the test
+        str
+
+    areas: fraction of the door area to which each pressure probe corresponds
+        list
+
+    Cd: discharge coefficient
+        float
+
+    gamma: calibration constant for the pressure probe
+        float
+
+    fit_window_length, fit_polyorder: Savitsky-Golay filter of the fitted parameters (see fit_two_zone_profile)
+        int
+
+    kwargs: any other argument of calculation_door_profiles (omega_factor, gems_factor, window_length, ...)
+
+    Returns:
+    -------
+    df: testing_time, fitted PP_*, TC_*, Rho_*, V_*, M_*, mass flow, Neutral_Plane (fitted), Rho_hot, Rho_cold and
+        Fit_Residual
+        pd.DataFrame
+    """
+    profiles = calculation_door_profiles(df, test_name, gamma = gamma, **kwargs)
+    heights = np.array(door_heights) / 100
+
+    fit = fit_two_zone_profile(door_profile_matrix(profiles, "PP_"), heights, profiles["temperature_ambient"],
+                               window_length = fit_window_length, polyorder = fit_polyorder)
+
+    # temperature, density and velocity from the fitted profile
+    pp = fit["PP"]
+    tdd_profile = door_profile_matrix(profiles, "TDD.")
+    tc = calculation_door_temperature(pp, tdd_profile, profiles["temperature_ambient"])
+    rho = calculation_density(tc)
+    velocity = calculation_probe_velocity(pp, rho, gamma)
+
+    columns = profiles["columns"]
+    data = {"testing_time": profiles["values"][:, columns.index("testing_time")]}
+    for prefix, values in [("PP_", pp), ("TC_", tc), ("Rho_", rho), ("V_", velocity)]:
+        for j, height in enumerate(door_heights):
+            data[f"{prefix}{height}"] = values[:, j]
+    for name in ["Neutral_Plane", "Rho_hot", "Rho_cold", "Fit_Residual"]:
+        data[name] = fit[name]
+    df_fit = pd.DataFrame(data, index = profiles["index"])
+
+    return calculation_massflow(df_fit, areas, Cd)
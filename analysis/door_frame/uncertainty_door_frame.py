@@ -0,0 +1,314 @@
+"""
+Monte Carlo propagation of the uncertainty of the door frame analysis.
+
+The calibration constants (gamma, Cd, omega_factor, gems_factor, alpha) are sampled once per Monte Carlo sample and
+random noise is added to the pressure probe and gas analyser readings. Every stage after the Savitsky-Golay filter is
+evaluated for all samples at once as a (time x samples) array. The record is processed in blocks of rows so memory is
+bounded, and the blocks are shared between threads. The result is a set of percentile bands for mass flow,
+hrr_internal_allmassin and the HRR from the gas analyser.
+
+The smoothing is linear, so the smoothed pressure of a sample is (smoothed reading + smoothed noise) * factor. The
+readings are only smoothed once and the noise is smoothed block by block. The noise of every row only depends on the
+seed and its position in the record, so the bands do not depend on the size of the blocks or the number of threads.
+
+"""
+
+import numpy as np
+import pandas as pd
+import os
+from concurrent.futures import ThreadPoolExecutor
+from scipy.signal import savgol_filter
+
+# import my own functions
+from calculation_massflow import (omega_probes, door_heights, calculation_door_profiles, door_profile_matrix,
+                                  calculation_pressure_profile, compile_repair_schedule, apply_repair_schedule,
+                                  calculation_door_temperature, calculation_density, calculation_probe_velocity,
+                                  calculation_door_massflow, calculation_oxygen_consumption)
+from repair_schedule import repair_schedule
+
+# nominal value of the inputs (same as the defaults of calculation_door_frame and calculation_HRR)
+nominal_inputs = {"gamma": 0.94,
+                  "Cd": 0.68,
+                  "omega_factor": 2.49,
+                  "gems_factor": 10,
+                  "alpha": 1.105}
+
+# standard deviation of each input (normal distribution). The noise of the pressure probes is in the units of the
+# raw readings and the noise of the gas analyser is in % volume
+input_uncertainty = {"gamma": 0.03,
+                     "Cd": 0.02,
+                     "omega_factor": 0.025,
+                     "gems_factor": 0.1,
+                     "alpha": 0.05,
+                     "pressure_noise": 0.01,
+                     "O2": 0.05,
+                     "CO": 0.01,
+                     "CO2": 0.05}
+
+# percentiles of the bands
+band_percentiles = [2.5, 50, 97.5]
+
+# memory available for the (time x samples) arrays of each block (bytes)
+block_memory = 2**28
+
+# rows of every group of noise drawn from the same generator (see raw_noise) and stream of every noisy input
+noise_rows = 64
+noise_streams = {"pressure_noise": 0, "O2": 1, "CO": 2, "CO2": 3}
+
+
+def sample_inputs(n_samples, rng, nominal = None, uncertainty = None):
+    """
+    Draws the calibration constants of every Monte Carlo sample
+
+    Parameters:
+    ----------
+    n_samples: number of Monte Carlo samples
+        int
+
+    rng: random number generator
+        np.random.Generator
+
+    nominal, uncertainty: nominal value and standard deviation of each input (nominal_inputs and input_uncertainty
+                          if None)
+        dict
+
+    Returns:
+    -------
+    samples: one array of n_samples values per input
+        dict
+    """
+    nominal = nominal_inputs if nominal is None else nominal
+    uncertainty = input_uncertainty if uncertainty is None else uncertainty
+
+    samples = {name: value + uncertainty.get(name, 0) * rng.standard_normal(n_samples)
+               for name, value in nominal.items()}
+
+    return samples
+
+
+def raw_noise(seed, stream, rows, shape):
+    """
+    Standard normal noise of a range of rows of a record. The noise of every group of noise_rows rows is drawn from
+    its own generator (seeded with the seed, the stream and the position of the group), so the noise of a row only
+    depends on its position in the record and not on the blocks the record is split into
+
+    Parameters:
+    ----------
+    seed: seed of the Monte Carlo analysis
+        int
+
+    stream: number of the noisy input (e.g. 0 for the pressure probes)
+        int
+
+    rows: rows of the record
+        slice
+
+    shape: dimensions of each row (e.g. (samples, probes))
+        tuple
+
+    Returns:
+    -------
+    noise: noise with shape (rows, *shape)
+        np.array
+    """
+    first, last = rows.start // noise_rows, (rows.stop - 1) // noise_rows
+    groups = [np.random.default_rng([seed, stream, group]).standard_normal((noise_rows,) + tuple(shape))
+              for group in range(first, last + 1)]
+    offset = rows.start - first * noise_rows
+
+    return np.concatenate(groups, axis = 0)[offset:offset + rows.stop - rows.start]
+
+
+def smoothed_noise(seed, stream, standard_deviation, rows, n_rows, shape, window_length = 31, polyorder = 2):
+    """
+    White noise for a block of rows of a record, smoothed with the same Savitsky-Golay filter as the readings
+
+    Half a window of extra noise is drawn at each side of the block (and at least a whole window in total), so the
+    filter only uses its edge coefficients at the start and end of the record. The result is the same as smoothing
+    the noise of the whole record and taking the rows of the block, whatever the size of the block.
+
+    Parameters:
+    ----------
+    seed: seed of the Monte Carlo analysis
+        int
+
+    stream: number of the noisy input (see raw_noise)
+        int
+
+    standard_deviation: standard deviation of the noise
+        float
+
+    rows: rows of the block
+        slice
+
+    n_rows: number of rows of the whole record
+        int
+
+    shape: dimensions of each row (e.g. (samples, probes))
+        tuple
+
+    window_length, polyorder: parameters of the Savitsky-Golay filter
+        int
+
+    Returns:
+    -------
+    noise: smoothed noise with shape (rows, *shape)
+        np.array
+    """
+    if standard_deviation == 0:
+        return np.zeros((rows.stop - rows.start,) + tuple(shape))
+
+    half_window = window_length // 2
+    start = max(0, min(rows.start - half_window, n_rows - window_length))
+    stop = min(n_rows, max(rows.stop + half_window, start + window_length))
+
+    noise = standard_deviation * raw_noise(seed, stream, slice(start, stop), shape)
+    noise = savgol_filter(noise, window_length, polyorder, axis = 0)
+
+    return noise[rows.start - start:rows.stop - start]
+
+
+def uncertainty_door_frame(df, df_gas, test_name, areas, n_samples = 2000, seed = 0, nominal = None,
+                           uncertainty = None, percentiles = None, window_length = 31, polyorder = 2,
+                           n_workers = None):
+    """
+    Percentile bands of mass flow and internal HRR for one test
+
+    Parameters:
+    ----------
+    df: raw door frame data (testing_time in seconds, as passed to calculation_door_frame)
+        pd.DataFrame
+
+    df_gas: gas analyser data (testing_time in seconds, O2, CO and CO2 in % volume, as passed to calculation_HRR)
+        pd.DataFrame
+
+    test_name: name of the test
+        str
+
+    areas: fraction of the door area to which each pressure probe corresponds
+        list
+
+    n_samples: number of Monte Carlo samples
+        int
+
+    seed: seed of the random number generator (results are reproducible for a given seed and n_samples, whatever
+          the number of threads)
+        int
+
+    nominal, uncertainty: nominal value and standard deviation of each input (see sample_inputs)
+        dict
+
+    percentiles: percentiles of the bands (band_percentiles if None)
+        list
+
+    window_length, polyorder: parameters of the Savitsky-Golay filter (door frame and gas analyser)
+        int
+
+    n_workers: number of threads (number of cpus if None)
+        int
+
+    Returns:
+    -------
+    bands: "door" (testing_time of the door frame data) and "gas" (testing_time of the gas analyser) DataFrames with
+           one column per output and percentile (e.g. "mass_in_p97.5" or "hrr_internal_p50")
+        dict
+    """
+    uncertainty = input_uncertainty if uncertainty is None else uncertainty
+    percentiles = band_percentiles if percentiles is None else percentiles
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+
+    rng = np.random.default_rng(seed)
+    inputs = sample_inputs(n_samples, rng, nominal, uncertainty)
+
+    # smoothed probe readings without the pressure factors (the smoothing is linear, the factors are applied later)
+    profiles = calculation_door_profiles(df, test_name, omega_factor = 1, gems_factor = 1,
+                                         window_length = window_length, polyorder = polyorder)
+    columns = profiles["columns"]
+    deltap_columns = [x.split("_")[0] for x in columns if x.endswith("_DeltaP_smooth")]
+    deltap_smooth = profiles["values"][:, [columns.index(f"{x}_DeltaP_smooth") for x in deltap_columns]]
+    testing_time = profiles["values"][:, columns.index("testing_time")]
+    tdd_profile = door_profile_matrix(profiles, "TDD.")
+    temperature_ambient = profiles["temperature_ambient"]
+    del profiles
+
+    # factor of every probe and sample, and matrix that assigns (or averages) the probes to door_heights
+    factors = np.where(np.isin(deltap_columns, omega_probes)[None, :], inputs["omega_factor"][:, None],
+                       inputs["gems_factor"][:, None])
+    probe_matrix = calculation_pressure_profile(np.eye(len(deltap_columns)), deltap_columns, test_name)
+    repairs = repair_schedule.get(test_name, [])
+
+    # smoothed gas readings (as in calculation_HRR) and door frame row preceding every gas reading
+    gas = {column: savgol_filter(df_gas.loc[:, column].values, window_length, polyorder) for column in ["O2", "CO", "CO2"]}
+    time_gas = df_gas.loc[:, "testing_time"].values
+    gas_segment = np.clip(np.searchsorted(testing_time, time_gas, side = "right") - 1, 0, len(testing_time) - 2)
+
+    # rows per block so that the (time x samples) arrays of all the threads fit in block_memory
+    n_rows = len(testing_time)
+    rows_per_block = max(1, int(block_memory / (n_workers * n_samples * (len(deltap_columns) + 8 * len(door_heights)) * 8)))
+    blocks = [slice(start, min(n_rows, start + rows_per_block)) for start in range(0, n_rows, rows_per_block)]
+
+    bands_door = {name: np.empty((n_rows, len(percentiles))) for name in ["mass_in", "mass_out", "mass_average",
+                                                                          "hrr_internal_allmassin"]}
+    bands_gas = {"hrr_internal": np.full((len(time_gas), len(percentiles)), np.nan)}
+
+    def run_block(i):
+        block = blocks[i]
+
+        # one extra row, required to interpolate the mass flow at the gas analyser times
+        rows = slice(block.start, min(n_rows, block.stop + 1))
+
+        # pressure at every height for every sample, with the repairs of the damaged probes
+        deltap = deltap_smooth[rows][:, None, :] + smoothed_noise(seed, noise_streams["pressure_noise"],
+                                                                  uncertainty.get("pressure_noise", 0), rows, n_rows,
+                                                                  (n_samples, len(deltap_columns)), window_length,
+                                                                  polyorder)
+        pp = (deltap * factors) @ probe_matrix
+        del deltap
+        apply_repair_schedule(pp, compile_repair_schedule(repairs, testing_time[rows], door_heights, "PP_"))
+
+        # temperature, density, velocity and mass flow
+        tc = calculation_door_temperature(pp, tdd_profile[rows][:, None, :], temperature_ambient)
+        rho = calculation_density(tc)
+        velocity = calculation_probe_velocity(pp, rho, inputs["gamma"][:, None])
+        massflow = calculation_door_massflow(rho, velocity, areas, inputs["Cd"][:, None])
+        del pp, tc, rho, velocity
+
+        n_block = block.stop - block.start
+        for name in bands_door:
+            bands_door[name][block] = np.percentile(massflow[name][:n_block], percentiles, axis = 1).T
+
+        # gas analyser readings whose door frame segment starts in this block
+        gas_rows = np.flatnonzero((gas_segment >= block.start) & (gas_segment < block.stop))
+        if len(gas_rows) == 0:
+            return
+        gas_rows = slice(gas_rows[0], gas_rows[-1] + 1)
+
+        # mass flow interpolated at the gas analyser times (linear, extrapolated at the ends)
+        segment = gas_segment[gas_rows] - rows.start
+        weight = ((time_gas[gas_rows] - testing_time[rows][segment]) /
+                  (testing_time[rows][segment + 1] - testing_time[rows][segment]))[:, None]
+        mass_average = massflow["mass_average"]
+        me = mass_average[segment] + weight * (mass_average[segment + 1] - mass_average[segment])
+
+        # mole fractions with noise and HRR
+        X = {}
+        for column in ["O2", "CO", "CO2"]:
+            noise = smoothed_noise(seed, noise_streams[column], uncertainty.get(column, 0), gas_rows, len(time_gas),
+                                   (n_samples,), window_length, polyorder)
+            X[column] = (gas[column][gas_rows][:, None] + noise) / 100
+        _, hrr = calculation_oxygen_consumption(X["O2"], X["CO"], X["CO2"], me, inputs["alpha"][None, :])
+
+        bands_gas["hrr_internal"][gas_rows] = np.percentile(hrr, percentiles, axis = 1).T
+
+    with ThreadPoolExecutor(max_workers = n_workers) as executor:
+        list(executor.map(run_block, range(len(blocks))))
+
+    bands = {}
+    for key, time, band_arrays in [("door", testing_time, bands_door), ("gas", time_gas, bands_gas)]:
+        df_bands = pd.DataFrame({"testing_time": time})
+        for name, values in band_arrays.items():
+            for j, percentile in enumerate(percentiles):
+                df_bands.loc[:, f"{name}_p{percentile}"] = values[:, j]
+        bands[key] = df_bands
+
+    return bands
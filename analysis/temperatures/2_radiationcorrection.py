@@ -8,9 +8,14 @@ corrects those readings for radiation.
 # import libraries
 import numpy as np
 import pickle
+import time
 import pandas as pd
 from scipy import interpolate
 
+# import my own functions
+from radiation_correction import radiation_correction, surroundings_temperature, bead
+from temperature_trees import temperature_tree_cube
+
 # import data
 file_address = "Temperatures_Raw.pkl"
 with open(file_address, "rb") as handle:
@@ -24,7 +29,59 @@ with open(file_address, "rb") as handle:
 list_useful_cols = [f"T{x}" for x in [11,12,13,21,22,23,31,32,33,"XX", "DD"]]
 all_useful_cols = {name:[] for name in list_useful_cols}
 
-# reduce all the data
+# spread of the thermocouples around the ambient temperature at the start of the test (C)
+ambient_tolerance = 5
+
+# temperature of the walls (C); they are not measured, so every bead sees the other trees of its layer instead
+temperature_wall = None
+
+# correct the readings of every test for radiation. The surroundings seen by every bead are the walls or, without
+# them, the other trees of the compartment at its height (see surroundings_temperature) and the gas is never colder
+# than the ambient
+file_address = "Temperatures_Processed_Uncorrected.pkl"
+with open(file_address, "rb") as handle:
+    processed_data = pickle.load(handle)
+
+corrected_data = {}
+rejected_data = {}
+for test_name in processed_data:
+    start = time.time()
+    
+    print(f"Correcting the temperatures of {test_name} for radiation")
+    df = processed_data[test_name]
+    tc_columns = [col for col in df.columns if col.split("-")[0] in list_useful_cols]
+    cube = temperature_tree_cube(df.loc[:, ["testing_time"] + tc_columns], dtype = float)
+    
+    # ambient temperature as the mean of all the thermocouples at the start of the test
+    temperature_ambient = np.nanmean(cube["temperatures"][0])
+    temperature_surroundings = surroundings_temperature(cube, temperature_ambient, temperature_wall)
+    
+    # all thermocouples and time steps at once
+    temperature_gas, physical = radiation_correction(cube["temperatures"], temperature_surroundings,
+                                                     bead["diameter"], bead["emissivity"],
+                                                     temperature_minimum = temperature_ambient - ambient_tolerance)
+    
+    # readings that would need a gas colder than the ambient are rejected (nan) and flagged
+    working = cube["working"]
+    columns = list(cube["columns"][working])
+    rejected = ~physical[:, working] & ~np.isnan(cube["temperatures"][:, working])
+    corrected_data[test_name] = df.copy()
+    corrected_data[test_name].loc[:, columns] = np.where(rejected, np.nan, temperature_gas[:, working])
+    rejected_data[test_name] = pd.DataFrame(rejected, columns = columns, index = df.index)
+    rejected_data[test_name].insert(0, "testing_time", df.loc[:, "testing_time"].values)
+    
+    print(f" {rejected.sum()} readings rejected ({np.round(100*rejected.mean(),3)} %)")
+    print(f" time taken: {np.round(time.time() - start,2)} seconds")
+
+# same format as the uncorrected data
+file_address = "Temperatures_Processed_Corrected.pkl"
+with open(file_address, "wb") as handle:
+    pickle.dump(corrected_data, handle)
+
+# readings rejected by the correction (True if rejected), in their own pickle
+file_address = "Temperatures_Radiation_Rejected.pkl"
+with open(file_address, "wb") as handle:
+    pickle.dump(rejected_data, handle)
 
 
 #processed_data = {}
@@ -1,5 +1,40 @@
 """
 This script takes all the data and interpolates it to create a 3D grid that represents the temperature at each point
 in the compartment (actually, in the sub-compartment where the boundaries are the thermocouple locations)
+
+The temperature cubes of every test (see interpolations_temperaturedifference and temperature_trees) are mapped to
+the grid with the weights of temperature_field, and the field of every test is stored as a memory mapped .npy file
+(time x x x y x z). The coordinates of the grid are stored in 'Temperatures_3D_Grid.pkl'.
 """
 
+import pickle
+import time
+import numpy as np
+
+# import my own functions
+from temperature_field import temperature_field_engine, temperature_field
+
+# size of the cells of the grid (m)
+resolution = 0.05
+
+# upload the temperature cubes of every test
+file_address = "Temperatures_Tree_Cubes.pkl"
+with open(file_address, "rb") as handle:
+    tree_cubes = pickle.load(handle)
+
+grids = {}
+for test_name in tree_cubes:
+    start = time.time()
+    
+    print(f"Creating the 3D temperature field of {test_name}")
+    engine = temperature_field_engine(tree_cubes[test_name], resolution)
+    field = temperature_field(engine, f"Temperatures_3D_{test_name}.npy")
+    grids[test_name] = {"testing_time": tree_cubes[test_name]["testing_time"], **engine["grid"]}
+    
+    print(f" {len(engine['patterns'])} sets of working thermocouples, field of shape {field.shape}")
+    print(f" time taken: {np.round(time.time() - start,2)} seconds")
+    del field
+
+file_address = "Temperatures_3D_Grid.pkl"
+with open(file_address, "wb") as handle:
+    pickle.dump(grids, handle)
@@ -11,7 +11,11 @@ from matplotlib import cm
 import numpy as np
 import pickle
 import time
-import pandas as pd
+import sys
+
+# import my own functions (shared with the rest of the temperature analysis)
+sys.path.append("C:/Users/s1475174/Documents/Python_Projects/BRE_Paper_2016/analysis/temperatures")
+from time_resampler import time_base, resample_loggers
 
 # import data
 file_address = "Temperatures_Raw.pkl"
@@ -32,34 +36,18 @@ for experiment in list_of_experiments:
     start = time.time()
     
     print(f"Condensing data of {experiment} into a single data frame")
-    all_condensed_data[experiment] = pd.DataFrame()
-    new_time = np.linspace(0,3600,3601)
-    all_condensed_data[experiment].loc[:,"testing_time"] = new_time
+    new_time = time_base(frequency = 1, start = 0, end = 3600)
     
-    # interpolate door data to 1 Hz frequency
+    # interpolate the door data and the compartment data (both loggers) to 1 Hz frequency, all channels of each
+    # logger at once
     door_temperatures = door_data[experiment]
-    for column in door_temperatures:
-        if column != "testing_time":
-            old_time = door_temperatures["testing_time"]
-            old_temperature = door_temperatures[column]
-            new_temperature = np.interp(new_time, old_time, old_temperature)
-            
-            # save the interpolated data in the condensed data frame
-            new_column_name = "TD-" + column.split("_")[1]
-            all_condensed_data[experiment][new_column_name] = new_temperature
-    
-    # interpolate the compartment data to 1Hz frequency
     compartment_temperatures = all_raw_data[experiment]
-    for logger in compartment_temperatures:
-        for column in compartment_temperatures[logger]:
-            if column != "testing_time":
-                if "<" not in column:
-                    old_time = compartment_temperatures[logger]["testing_time"]
-                    old_temperature = compartment_temperatures[logger][column]
-                    new_temperature = np.interp(new_time, old_time, old_temperature)
-                    
-                    # save the interpolated data in the condensed data frame
-                    all_condensed_data[experiment][column] = new_temperature
+    loggers = [door_temperatures] + [compartment_temperatures[logger] for logger in compartment_temperatures]
+    renames = [lambda column: "TD-" + column.split("_")[1]] + [None] * len(compartment_temperatures)
+    all_condensed_data[experiment] = resample_loggers(loggers, new_time, select = lambda column: "<" not in column,
+                                                      renames = renames)
+    
+    print(f" time taken: {np.round(time.time() - start,2)} seconds")
 
 with open("condensed_data.pickle", "wb") as handle:
     pickle.dump(all_condensed_data, handle)
\ No newline at end of file
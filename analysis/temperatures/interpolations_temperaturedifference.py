@@ -6,10 +6,12 @@ temperature distribution
 
 import pickle
 import numpy as np
-from scipy import interpolate
 import matplotlib.pyplot as plt
 import pandas as pd
 
+# import my own functions
+from temperature_trees import temperature_tree_cube, temperature_tree_extrema, isotherm_heights
+
 # upload the processed and corrected data
 file_address = "Temperatures_Processed_Uncorrected.pkl"
 with open(file_address, "rb") as handle:
@@ -17,6 +19,10 @@ with open(file_address, "rb") as handle:
     
 # dictionaries to contain additional data
 extra_data = {}
+tree_cubes = {}
+
+# temperatures (C) of the isotherms whose heights are tracked in every TC_tree
+isotherm_temperatures = [300, 500, 600]
 
 # plotting parameters
 colors = ["royalblue", "darkgreen", "firebrick", "blueviolet", "darkorange", "cyan", "black"]*3
@@ -33,97 +39,53 @@ for test_name in all_data:
     df = all_data[test_name]
     extra_data[test_name] = {}
     
-    # extract all the TC_trees names
-    TC_trees_names = []
-    for col in df.columns:
-        if col == "testing_time":
-            pass
-        else:
-            TC_tree_name = col.split("-")[0]
-            TC_trees_names.append(TC_tree_name)
+    # temperatures of every TC_tree as a (time x tree x height) array
+    cube = temperature_tree_cube(df)
+    TC_trees = cube["trees"]
     
-    # retain only the unique TC_trees names
-    TC_trees = list(set(TC_trees_names))
+    # at every time step, find the maximum and minimum tempeartures, the height at which that occurrs and the vertical
+    # gradient of every TC_tree (all at once)
+    extrema = temperature_tree_extrema(cube)
+    new_columns = {}
+    for j, tc_tree in enumerate(TC_trees):
+        for statistic in ["max", "height_max", "min", "height_min", "gradient"]:
+            new_columns[f"{tc_tree}_{statistic}"] = extrema[statistic][:, j]
+    df = pd.concat([df, pd.DataFrame(new_columns, index = df.index)], axis = 1)
+    all_data[test_name] = df
     
     # iterates over each TC_tree
-    for tc_tree in TC_trees:
-        thermocouples = []
-        thermocouples_heights = []
+    for j, tc_tree in enumerate(TC_trees):
         extra_data[test_name][tc_tree] = {}
         
-        # obtaines a list of all the columns associated to a given tc_tree and also its respective heights
-        for col in df.columns:
-            if tc_tree in col:
-                thermocouples.append(col)
-                thermocouples_heights.append(col.split("-")[1])
-        
-        # convert list of heights from a list of integers to a list of 
-        thermocouples_heights = [int(x) for x in thermocouples_heights]
-    
-        # at every time step, find the maximum and minimum tempeartures and also the height at which that occurrs
-        df.loc[:, f"{tc_tree}_max"] = df.loc[:, thermocouples].apply(lambda x: x.values.max(), axis = 1)
-        df.loc[:, f"{tc_tree}_height_max"] = df.loc[:, thermocouples].apply(
-                lambda x: thermocouples_heights[x.values.argmax()], axis = 1)
-        
-        df.loc[:, f"{tc_tree}_min"] = df.loc[:, thermocouples].apply(lambda x: x.values.min(), axis = 1)
-        df.loc[:, f"{tc_tree}_height_min"] = df.loc[:, thermocouples].apply(
-                lambda x: thermocouples_heights[x.values.argmin()], axis = 1)
+        # working thermocouples of the tc_tree and their heights
+        working = cube["columns"][j] != None
+        thermocouples = list(cube["columns"][j][working])
+        thermocouples_heights = list(cube["heights"][working])
         
         # also for every tc_tree, I will add the considered heights as well as the maximum and minimum heights
         extra_data[test_name][tc_tree]["all_tcs"] = thermocouples
-        
-        # for every TC_tree, create a function that interpolates temperature as a function of height
-        x = thermocouples_heights
-        df.loc[:, f"f_TempvsHeight_{tc_tree}"] = df.loc[:, thermocouples].apply(
-                lambda y: interpolate.interp1d(x, y.values), axis = 1)
-        
-    
+        extra_data[test_name][tc_tree]["heights"] = thermocouples_heights
     
+    # temperature as a function of height of every TC_tree is interpolated from the cube (see query_temperature)
+    tree_cubes[test_name] = cube
     
+    # First, find a temperature value that is within the interpolating range of ALL trees: at every time step, the
+    # temperature at which we will estimate the height per TC tree (rounded down, so the coldest tree reaches it)
+    tracked_temperature = np.floor(np.nanmin(extrema["max"], axis = 1))
     
-#    # First, find a temperature value that is within the interpolating range of ALL trees
-#    max_column_list = []
-#    min_column_list = []
-#    for col in df.columns:
-#        if "max" in col:
-#            if "height" in col:
-#                pass
-#            else:
-#                max_column_list.append(col)
-#        elif "min" in col:
-#            if "height" in col:
-#                pass
-#            else:
-#                min_column_list.append(col)
-#                
-#    # at every time step, determine the temperature range that ALL TC_trees can cover
-
-        
+    # calculate the corresponding heights (first and last crossing) at which tracked_temperature and the isotherms
+    # are attained for every TC_tree (all trees and time steps at once)
+    targets = np.column_stack([tracked_temperature] + [np.full(len(df), x) for x in isotherm_temperatures])
+    first_crossing, last_crossing = isotherm_heights(cube, targets)
     
-#    # now, calculate at every time step the temperature at which we will estimate the height per TC tree
-#    min_maximum_temperature = df.loc[:, max_column_list].min(axis = 1)
-#    max_minimum_temperature = df.loc[:, min_column_list].max(axis = 1)
-#    
-##    tracked_temperature = np.round(pd.concat(
-##            [min_maximum_temperature, max_minimum_temperature], axis = 1).mean(axis = 1))
-#    
-#    tracked_temperature = np.ceil(min_maximum_temperature)
-#    
-#    # calculate the corresponding height at which tracked_temperature is attained for every TC_tree
-#    interp_func_list = [x for x in df.columns if "HeightvsTemp" in x]
-#    for col in interp_func_list:
-#        TC_tree = col.split("_")[2]
-#        
-#        # very slow implementation but I haven't figured out how to do it with .apply()
-#        height_tracked_temperature = np.zeros(len(df))
-#        for i,temperature in enumerate(tracked_temperature):
-#            print(temperature)
-#            height_tracked_temperature[i] = df.loc[i, col](temperature)
-#        
-#        
-##        df.loc[:, f"{TC_tree}_height_tracked_temperature"] = df.loc[:, col].apply(lambda x: print(tracked_temperature))
-                
-    break
+    new_columns = {"tracked_temperature": tracked_temperature}
+    for j, tc_tree in enumerate(TC_trees):
+        new_columns[f"{tc_tree}_height_tracked_temperature"] = first_crossing[:, j, 0]
+        for k, isotherm in enumerate(isotherm_temperatures):
+            new_columns[f"{tc_tree}_height_{isotherm}C_first"] = first_crossing[:, j, k + 1]
+            new_columns[f"{tc_tree}_height_{isotherm}C_last"] = last_crossing[:, j, k + 1]
+    df = pd.concat([df, pd.DataFrame(new_columns, index = df.index)], axis = 1)
+    all_data[test_name] = df
 
         
         
@@ -265,9 +227,8 @@ for test_name in all_data:
 #    # save and close
 #    fig.savefig(f"{test_name}_heights_maxANDmin_uncorrected.png", dpi = 300)
 #    plt.close(fig)
-    
 
-        
-        
-    
-            
+# store the temperature cubes of all the tests (float32, a few MB per test)
+file_address = "Temperatures_Tree_Cubes.pkl"
+with open(file_address, "wb") as handle:
+    pickle.dump(tree_cubes, handle)
@@ -0,0 +1,233 @@
+"""
+Radiation correction of the gas phase thermocouples.
+
+The bead of a thermocouple exchanges heat by convection with the gas and by radiation with its surroundings, so its
+steady state temperature Tb satisfies
+
+    h (Tg - Tb) = emissivity * sigma * (Tb^4 - Ts^4)
+
+where h is the heat transfer coefficient of a sphere in cross flow (Ranz-Marshall, with the properties of air at the
+film temperature (Tg + Tb) / 2). Since h depends on the unknown gas temperature Tg, the balance is solved with Newton
+iterations on every reading at once; readings stop iterating as soon as they converge.
+
+The gas is assumed optically thin, so a bead sees the boundaries of the compartment. If the temperature of the walls
+is known it is used as Ts (see surroundings_temperature). Otherwise the walls are assumed to be at the temperature of
+the gas of the layer of the bead, taken as the mean of the other trees of the compartment at its height (the bead
+itself is left out). Walls lag behind the gas while the fire grows, so this assumption underestimates the correction
+of the hot layer, and a layer at the same temperature across the room is not corrected at all: the wall temperature
+should be given whenever it is known. Beads that look out of an opening (the door tree) also see the ambient.
+Averaging all the thermocouples of the compartment instead gives a bead of the cold layer the hot layer as
+surroundings, and its correction then takes the gas below ambient (or below absolute zero).
+
+The gas temperature is bounded below (by the ambient temperature in the compartment, and always above 0 K). Readings
+whose balance would need a colder gas, or that do not converge, are not physical and are flagged.
+
+"""
+
+import numpy as np
+
+sigma = 5.67e-8
+
+# trees that look out of an opening and fraction of their view taken by the ambient
+open_trees = {"TDD": 0.5}
+
+# bead of the thermocouples: diameter (m), emissivity and velocity of the gas around it (m/s)
+bead = {"diameter": 0.0015,
+        "emissivity": 0.9,
+        "velocity": 1.0}
+
+
+def air_properties(temperature):
+    """
+    Density, dynamic viscosity and thermal conductivity of air (power law fits between 300 and 1500 K)
+
+    Parameters:
+    ----------
+    temperature: temperature (K)
+        np.array
+
+    Returns:
+    -------
+    rho: density (kg/m3)
+        np.array
+
+    mu: dynamic viscosity (Sutherland's law, Pa s)
+        np.array
+
+    k: thermal conductivity (W/mK)
+        np.array
+    """
+    rho = 353 / temperature
+    mu = 1.716e-5 * (temperature / 273.15)**1.5 * (273.15 + 110.4) / (temperature + 110.4)
+    k = 0.0241 * (temperature / 273.15)**0.82
+
+    return rho, mu, k
+
+
+def heat_transfer_coefficient(temperature_film, diameter = bead["diameter"], velocity = bead["velocity"]):
+    """
+    Convective heat transfer coefficient of the bead (Ranz-Marshall: Nu = 2 + 0.6 Re^0.5 Pr^(1/3), Pr = 0.71)
+
+    Parameters:
+    ----------
+    temperature_film: mean of the gas and bead temperatures (K)
+        np.array
+
+    diameter: diameter of the bead (m)
+        float
+
+    velocity: velocity of the gas around the bead (m/s)
+        float
+
+    Returns:
+    -------
+    h: heat transfer coefficient (W/m2K)
+        np.array
+    """
+    rho, mu, k = air_properties(temperature_film)
+    reynolds = rho * velocity * diameter / mu
+    nusselt = 2 + 0.6 * reynolds**0.5 * 0.71**(1/3)
+
+    return nusselt * k / diameter
+
+
+def surroundings_temperature(cube, temperature_ambient, temperature_wall = None, openings = open_trees):
+    """
+    Temperature of the surroundings seen by every bead. If temperature_wall is given, the beads of the compartment see
+    the walls at that temperature. Otherwise they see their own layer: the mean temperature of the other compartment
+    trees at the height of the bead (the bead itself is left out of the mean). The trees of the openings see the
+    walls or the layer at their height (linearly interpolated over the heights of the compartment trees, constant above
+    the highest and below the lowest one) and the ambient, mixed in by emissive power. Where no other tree has a
+    reading, the surroundings are at the temperature of the bead itself (no correction)
+
+    Parameters:
+    ----------
+    cube: output of temperature_trees.temperature_tree_cube
+        dict
+
+    temperature_ambient: ambient temperature (C)
+        float
+
+    temperature_wall: temperature of the walls (C), either the same at every time step or one per time step (the
+                      layers are used if None)
+        np.array
+
+    openings: trees that look out of an opening and fraction of their view taken by the ambient
+        dict
+
+    Returns:
+    -------
+    temperature_surroundings: temperature of the surroundings of every bead (C), (time x tree x height)
+        np.array
+    """
+    temperatures = np.asarray(cube["temperatures"], dtype = float)
+    heights = cube["heights"]
+    compartment = np.array([tree not in openings for tree in cube["trees"]])
+
+    if temperature_wall is not None:
+        t_compartment = np.broadcast_to(np.reshape(np.asarray(temperature_wall, dtype = float), (-1, 1, 1)),
+                                        temperatures.shape)
+        t_openings = t_compartment
+    else:
+        # sum and number of the readings of the compartment trees at every height (time x height)
+        own = np.where(compartment[:, None], temperatures, np.nan)
+        valid = ~np.isnan(own)
+        own = np.where(valid, own, 0)
+        total, count = own.sum(axis = 1), valid.sum(axis = 1)
+
+        # every bead of the compartment sees the other trees of its layer
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            t_compartment = (total[:, None, :] - own) / (count[:, None, :] - valid)
+            layers = total / count
+
+        # the openings see the layer at their height, interpolated over the heights of the compartment trees
+        layered = cube["working"][compartment].any(axis = 0)
+        heights_layered = heights[layered]
+        i1 = np.clip(np.searchsorted(heights_layered, heights), 1, max(len(heights_layered) - 1, 1))
+        i0 = i1 - 1
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            w = np.clip((heights - heights_layered[i0]) / (heights_layered[i1] - heights_layered[i0]), 0, 1)
+        w = np.nan_to_num(w)
+        layers = layers[:, layered]
+        t_openings = (layers[:, i0] * (1 - w) + layers[:, i1] * w)[:, None, :]
+
+    # openings: view of the ambient mixed in by emissive power
+    view = np.array([openings.get(tree, 0) for tree in cube["trees"]])[None, :, None]
+    t_surroundings = np.where(compartment[None, :, None], t_compartment, t_openings) + 273.15
+    temperature_surroundings = ((1 - view) * t_surroundings**4 + view * (temperature_ambient + 273.15)**4)**0.25 - 273.15
+
+    return np.where(np.isnan(temperature_surroundings), temperatures, temperature_surroundings)
+
+
+def radiation_correction(temperature_bead, temperature_surroundings, diameter = bead["diameter"],
+                         emissivity = bead["emissivity"], velocity = bead["velocity"], temperature_minimum = -273.15,
+                         max_iterations = 20, tolerance = 1e-6):
+    """
+    Gas temperature of every reading, solving the energy balance of the bead with a vectorised Newton iteration.
+    The gas temperature is kept above temperature_minimum (and above 0 K). Nan readings stay nan
+
+    Parameters:
+    ----------
+    temperature_bead: readings of the thermocouples (C), any shape
+        np.array
+
+    temperature_surroundings: temperature of the surroundings seen by the beads (C), broadcastable to the readings
+        np.array
+
+    diameter: diameter of the bead (m)
+        float
+
+    emissivity: emissivity of the bead
+        float
+
+    velocity: velocity of the gas around the bead (m/s)
+        float
+
+    temperature_minimum: lowest physical gas temperature (C), e.g. the ambient temperature, broadcastable to the
+                         readings
+        np.array
+
+    max_iterations: maximum number of Newton iterations
+        int
+
+    tolerance: convergence criterion on the change of the gas temperature (K)
+        float
+
+    Returns:
+    -------
+    temperature_gas: corrected temperatures (C), same shape as the readings. Readings that are not physical are at
+                     the lower bound
+        np.array
+
+    physical: readings that converged to a gas temperature above the lower bound (False for nan readings)
+        np.array
+    """
+    tb = np.asarray(temperature_bead, dtype = float) + 273.15
+    ts = np.broadcast_to(np.asarray(temperature_surroundings, dtype = float) + 273.15, tb.shape)
+    shape = tb.shape
+    tb, ts = tb.ravel(), ts.ravel()
+    minimum = np.maximum(np.broadcast_to(np.asarray(temperature_minimum, dtype = float) + 273.15, shape).ravel(),
+                         1e-3)
+
+    # radiation lost by the bead (W/m2) and first guess with h at the bead temperature
+    q_radiation = emissivity * sigma * (tb**4 - ts**4)
+    tg = np.maximum(tb + q_radiation / heat_transfer_coefficient(tb, diameter, velocity), minimum)
+
+    # Newton iterations on the readings that have not converged (derivative of h by a 1 K finite difference). The
+    # steps are bounded, so a reading whose solution is below the bound stops there
+    active = np.flatnonzero(np.isfinite(tg))
+    for _ in range(max_iterations):
+        if len(active) == 0:
+            break
+        tg_a, tb_a, q_a = tg[active], tb[active], q_radiation[active]
+        h = heat_transfer_coefficient((tg_a + tb_a) / 2, diameter, velocity)
+        dh = heat_transfer_coefficient((tg_a + 1 + tb_a) / 2, diameter, velocity) - h
+        residual = h * (tg_a - tb_a) - q_a
+        tg[active] = np.maximum(tg_a - residual / (h + dh * (tg_a - tb_a)), minimum[active])
+        active = active[np.abs(tg[active] - tg_a) > tolerance]
+
+    # the balance of the readings at the bound is not satisfied (the gas would have to be colder)
+    physical = np.isfinite(tg) & (tg > minimum)
+    physical[active] = False
+
+    return (tg - 273.15).reshape(shape), physical.reshape(shape)
@@ -0,0 +1,270 @@
+"""
+Three dimensional temperature field of the compartment, interpolated from the thermocouple trees.
+
+At every point of a regular (x, y, z) grid, the temperature of each tree at the height of the point is linearly
+interpolated between its thermocouples (constant above the highest and below the lowest one), and the trees are
+combined with inverse distance weights in plan. The field is therefore a linear map of the readings: a sparse matrix
+with one row per point of the grid and one column per thermocouple of the tree cube (see temperature_trees).
+
+The matrix only depends on which thermocouples have a reading, so it is built once per availability pattern of a
+test. The field of every time step is then one sparse product, and the whole test is written in chunks of time steps
+(one sparse product each) to a memory mapped .npy file, so it never has to fit in memory. The matrix of a pattern is
+freed once its chunk is written (unless the next chunk uses it as well), and at most max_patterns matrices are kept
+when single time steps are evaluated on demand with temperature_field_step.
+
+"""
+
+import numpy as np
+from scipy import sparse
+
+# plan of the compartment (m): x is the width (left to right, seen from the door) and y is the depth (from the door
+# to the back wall). The height of the field is the height of the highest thermocouple of the test
+compartment = {"width": 2.72, "depth": 2.72}
+
+# position of every tree in plan (m), as measured for the contour plots (Plots_Rory_Proposal/plots_proposal.py): trees
+# T{column}{row} with columns 1 to 3 from left to right and rows 1 to 3 from the door to the back wall (T12, T21, T23
+# and T32 on the same lines as the measured ones), TXX at the back wall and TDD in the door
+tree_positions = {"T11": (0.25, 0.25), "T21": (1.36, 0.25), "T31": (2.47, 0.25),
+                  "T12": (0.25, 1.36), "T22": (1.36, 1.36), "T32": (2.47, 1.36),
+                  "T13": (0.25, 2.47), "T23": (1.36, 2.47), "T33": (2.47, 2.47),
+                  "TXX": (1.36, 2.62),
+                  "TDD": (1.36, 0.1)}
+
+# heights of the thermocouples are in cm
+height_units = 0.01
+
+# maximum number of weight matrices kept by pattern_weights (each one is tens of MB at a 5 cm resolution)
+max_patterns = 8
+
+
+def field_grid(height, resolution = 0.05, dimensions = compartment):
+    """
+    Centres of the cells of a regular grid filling the compartment up to the given height
+
+    Parameters:
+    ----------
+    height: height of the field (m)
+        float
+
+    resolution: size of the cells (m)
+        float
+
+    dimensions: "width" and "depth" of the compartment (m)
+        dict
+
+    Returns:
+    -------
+    grid: "x", "y" and "z" coordinates of the centres of the cells (m)
+        dict
+    """
+    grid = {}
+    for axis, length in zip(["x", "y", "z"], [dimensions["width"], dimensions["depth"], height]):
+        n_cells = max(int(np.round(length / resolution)), 1)
+        grid[axis] = (np.arange(n_cells) + 0.5) * length / n_cells
+
+    return grid
+
+
+def field_weights(cube, available, grid, power = 2, positions = tree_positions):
+    """
+    Sparse matrix that maps the readings of the thermocouples to the temperature at every point of the grid
+
+    Parameters:
+    ----------
+    cube: output of temperature_trees.temperature_tree_cube
+        dict
+
+    available: thermocouples with a reading (tree x height)
+        np.array
+
+    grid: output of field_grid
+        dict
+
+    power: power of the inverse distance weights of the trees
+        float
+
+    positions: position of every tree in plan (m)
+        dict
+
+    Returns:
+    -------
+    weights: (point x thermocouple) matrix. The points are in the order of np.ravel of an (x, y, z) array and the
+             thermocouples in the order of np.ravel of a (tree x height) array
+        scipy.sparse.csr_matrix
+    """
+    trees, heights = cube["trees"], cube["heights"]
+    n_trees, n_heights = len(trees), len(heights)
+    x, y, z = grid["x"], grid["y"], grid["z"] / height_units
+    available = available & np.array([tree in positions for tree in trees])[:, None]
+
+    # thermocouples of every tree below and above every height of the grid (tree x z)
+    order = np.argsort(~available, axis = 1, kind = "stable")
+    n_available = available.sum(axis = 1)
+    tree_heights = np.where(np.take_along_axis(available, order, axis = 1), heights[order], np.inf)
+    n_below = (tree_heights[:, None, :] <= z[None, :, None]).sum(axis = 2)
+    last = np.maximum(n_available - 1, 0)[:, None]
+    j0 = np.take_along_axis(order, np.clip(n_below - 1, 0, last), axis = 1)
+    j1 = np.take_along_axis(order, np.clip(n_below, 0, last), axis = 1)
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        w_height = np.where(j1 == j0, 0, (z[None, :] - heights[j0]) / (heights[j1] - heights[j0]))
+
+    # inverse distance weights of the trees with a reading (x x y x tree)
+    plan = np.array([positions.get(tree, (np.nan, np.nan)) for tree in trees])
+    distance = np.hypot(x[:, None, None] - plan[:, 0], y[None, :, None] - plan[:, 1])
+    used = n_available > 0
+    with np.errstate(divide = "ignore"):
+        w_plan = np.where(used, 1 / np.maximum(distance, 1e-9)**power, 0)
+    w_sum = w_plan.sum(axis = 2, keepdims = True)
+    w_plan = np.divide(w_plan, w_sum, out = np.zeros_like(w_plan), where = w_sum > 0)
+
+    # every point takes two thermocouples of every tree (x x y x z x tree x 2)
+    shape = (len(x), len(y), len(z), n_trees, 2)
+    data = (w_plan[:, :, None, :, None]
+            * np.stack([1 - w_height, w_height], axis = 2)[None, None, :, :, :].transpose(0, 1, 3, 2, 4))
+    columns = np.arange(n_trees)[:, None, None] * n_heights + np.stack([j0, j1], axis = 2)
+    columns = np.broadcast_to(columns.transpose(1, 0, 2)[None, None], shape)
+    rows = np.broadcast_to(np.arange(len(x) * len(y) * len(z)).reshape(shape[:3])[..., None, None], shape)
+
+    keep = data > 0
+    weights = sparse.csr_matrix((data[keep], (rows[keep], columns[keep])),
+                                shape = (len(x) * len(y) * len(z), n_trees * n_heights), dtype = np.float32)
+
+    return weights
+
+
+def temperature_field_engine(cube, resolution = 0.05, power = 2):
+    """
+    Prepares the three dimensional temperature field of a test. The time steps are grouped by the thermocouples with
+    a reading, and the weights of every group are only built when they are first needed
+
+    Parameters:
+    ----------
+    cube: output of temperature_trees.temperature_tree_cube
+        dict
+
+    resolution: size of the cells of the grid (m)
+        float
+
+    power: power of the inverse distance weights of the trees
+        float
+
+    Returns:
+    -------
+    engine: "cube", "grid", "shape" of the field at every time step, "power", availability "patterns"
+            (pattern x tree x height), "pattern" of every time step and "weights" of every pattern built so far
+        dict
+    """
+    temperatures = cube["temperatures"]
+    grid = field_grid(cube["heights"].max() * height_units, resolution)
+    patterns, pattern = np.unique(~np.isnan(temperatures.reshape(len(temperatures), -1)), axis = 0,
+                                  return_inverse = True)
+
+    engine = {"cube": cube,
+              "grid": grid,
+              "shape": (len(grid["x"]), len(grid["y"]), len(grid["z"])),
+              "power": power,
+              "patterns": patterns.reshape(-1, *temperatures.shape[1:]),
+              "pattern": pattern.ravel(),
+              "weights": {}}
+
+    return engine
+
+
+def pattern_weights(engine, pattern):
+    """
+    Weights of an availability pattern of the engine (built on the first call and kept in engine["weights"], which
+    holds at most max_patterns matrices: the oldest one is freed first)
+
+    Parameters:
+    ----------
+    engine: output of temperature_field_engine
+        dict
+
+    pattern: position of the pattern in engine["patterns"]
+        int
+
+    Returns:
+    -------
+    weights: output of field_weights
+        scipy.sparse.csr_matrix
+    """
+    if pattern not in engine["weights"]:
+        if len(engine["weights"]) >= max_patterns:
+            del engine["weights"][next(iter(engine["weights"]))]
+        engine["weights"][pattern] = field_weights(engine["cube"], engine["patterns"][pattern], engine["grid"],
+                                                   engine["power"])
+
+    return engine["weights"][pattern]
+
+
+def temperature_field_step(engine, step):
+    """
+    Temperature field at a single time step
+
+    Parameters:
+    ----------
+    engine: output of temperature_field_engine
+        dict
+
+    step: row of the time step in the cube
+        int
+
+    Returns:
+    -------
+    field: temperature at every point of the grid (x x y x z). Nan if no thermocouple has a reading
+        np.array
+    """
+    weights = pattern_weights(engine, engine["pattern"][step])
+    readings = np.nan_to_num(engine["cube"]["temperatures"][step].ravel())
+    field = weights @ readings
+    if weights.nnz == 0:
+        field[:] = np.nan
+
+    return field.reshape(engine["shape"])
+
+
+def temperature_field(engine, file_address, chunk_size = 64):
+    """
+    Temperature field at every time step, written in chunks of time steps to a memory mapped .npy file
+    (np.load(file_address, mmap_mode = "r") reads it back without loading it)
+
+    Parameters:
+    ----------
+    engine: output of temperature_field_engine
+        dict
+
+    file_address: address of the .npy file
+        str
+
+    chunk_size: number of time steps computed at once
+        int
+
+    Returns:
+    -------
+    field: temperature at every time step and point of the grid (time x x x y x z), float32
+        np.memmap
+    """
+    temperatures = engine["cube"]["temperatures"]
+    n_time = len(temperatures)
+    field = np.lib.format.open_memmap(file_address, mode = "w+", dtype = np.float32, shape = (n_time, *engine["shape"]))
+    flat = field.reshape(n_time, -1)
+
+    # consecutive time steps mostly share their pattern, so every chunk is split into runs of the same pattern
+    for start in range(0, n_time, chunk_size):
+        steps = np.arange(start, min(start + chunk_size, n_time))
+        for pattern in np.unique(engine["pattern"][steps]):
+            rows = steps[engine["pattern"][steps] == pattern]
+            weights = pattern_weights(engine, pattern)
+            readings = np.nan_to_num(temperatures[rows].reshape(len(rows), -1))
+            if weights.nnz == 0:
+                flat[rows] = np.nan
+            else:
+                flat[rows] = (weights @ readings.T).T
+        field.flush()
+
+        # the weights of the patterns that the next chunk does not use are freed (e.g. a single missing reading)
+        next_patterns = set(engine["pattern"][start + chunk_size:start + 2 * chunk_size])
+        for pattern in [pattern for pattern in engine["weights"] if pattern not in next_patterns]:
+            del engine["weights"][pattern]
+
+    return field
@@ -0,0 +1,255 @@
+"""
+Vertical temperature profiles of the thermocouple trees as a single (time x tree x height) array.
+
+The columns of the processed temperatures are named "{tree}-{height}" (height in cm). They are parsed once per test
+and scattered into an array padded with nan values, where a tree has no (working) thermocouple at a height of the
+common grid. Every statistic of the profiles is then a reduction over the last axis of the array, for all the trees
+and time steps at once.
+
+The temperatures are stored as float32 (about 2 MB per hour of 1 Hz data of the whole compartment), together with
+the mask of the thermocouples of every tree, and are interpolated at any (time, tree, height) points with
+query_temperature, instead of keeping one interpolating function per time step. The inverse query, the heights at
+which every tree reaches given temperatures (e.g. isotherms), is answered by isotherm_heights.
+
+"""
+
+import numpy as np
+
+
+def tree_layout(columns):
+    """
+    Trees and heights of the thermocouple columns ("{tree}-{height}"). Any other column (e.g. testing_time or the
+    columns added by the analysis) is ignored
+
+    Parameters:
+    ----------
+    columns: names of the columns of a test
+        list
+
+    Returns:
+    -------
+    layout: "columns" of the thermocouples, "trees" (sorted), "heights" (sorted union of the heights of all the trees,
+            in cm) and the "tree_index" and "height_index" of every thermocouple column
+        dict
+    """
+    thermocouples = []
+    names = []
+    heights = []
+    for column in columns:
+        parts = str(column).split("-")
+        if len(parts) == 2 and parts[1].isdigit():
+            thermocouples.append(column)
+            names.append(parts[0])
+            heights.append(int(parts[1]))
+
+    trees = sorted(set(names))
+    grid = np.array(sorted(set(heights)), dtype = float)
+    layout = {"columns": thermocouples,
+              "trees": trees,
+              "heights": grid,
+              "tree_index": np.array([trees.index(name) for name in names], dtype = int),
+              "height_index": np.searchsorted(grid, heights)}
+
+    return layout
+
+
+def temperature_tree_cube(df, dtype = np.float32):
+    """
+    Temperatures of every tree as a (time x tree x height) array. Heights without a thermocouple in a tree are nan
+
+    Parameters:
+    ----------
+    df: temperatures of a test, with testing_time and one "{tree}-{height}" column per thermocouple
+        pd.DataFrame
+
+    dtype: type of the temperatures
+        np.dtype
+
+    Returns:
+    -------
+    cube: "testing_time", "trees", "heights" (cm), "columns" (thermocouple of every tree and height, None if missing),
+          "working" (tree x height mask of the thermocouples) and "temperatures" (time x tree x height)
+        dict
+    """
+    layout = tree_layout(df.columns)
+    n_trees, n_heights = len(layout["trees"]), len(layout["heights"])
+
+    temperatures = np.full((len(df), n_trees, n_heights), np.nan, dtype = dtype)
+    temperatures[:, layout["tree_index"], layout["height_index"]] = df.loc[:, layout["columns"]].values
+
+    columns = np.full((n_trees, n_heights), None, dtype = object)
+    columns[layout["tree_index"], layout["height_index"]] = layout["columns"]
+
+    cube = {"testing_time": df.loc[:, "testing_time"].values,
+            "trees": layout["trees"],
+            "heights": layout["heights"],
+            "columns": columns,
+            "working": columns != None,
+            "temperatures": temperatures}
+
+    return cube
+
+
+def temperature_tree_extrema(cube):
+    """
+    Maximum and minimum temperatures of every tree at every time step, the heights at which they occur and the
+    vertical temperature gradient (least squares slope of the profile). Missing readings are ignored; trees without
+    any reading at a time step are nan
+
+    Parameters:
+    ----------
+    cube: output of temperature_tree_cube
+        dict
+
+    Returns:
+    -------
+    extrema: "max", "height_max", "min", "height_min" (cm) and "gradient" (C/cm), each one (time x tree)
+        dict
+    """
+    temperatures = cube["temperatures"]
+    heights = cube["heights"]
+    valid = ~np.isnan(temperatures)
+    n_valid = valid.sum(axis = 2)
+    empty = n_valid == 0
+
+    # missing readings never win the maximum or the minimum
+    i_max = np.argmax(np.where(valid, temperatures, -np.inf), axis = 2)
+    i_min = np.argmin(np.where(valid, temperatures, np.inf), axis = 2)
+    t_max = np.take_along_axis(temperatures, i_max[..., None], axis = 2)[..., 0]
+    t_min = np.take_along_axis(temperatures, i_min[..., None], axis = 2)[..., 0]
+
+    # least squares slope over the heights with a reading
+    z = np.where(valid, heights, 0)
+    t = np.where(valid, temperatures, 0)
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        z_mean = z.sum(axis = 2) / n_valid
+        t_mean = t.sum(axis = 2) / n_valid
+        dz = np.where(valid, heights - z_mean[..., None], 0)
+        gradient = (dz * (t - t_mean[..., None])).sum(axis = 2) / (dz**2).sum(axis = 2)
+
+    extrema = {"max": np.where(empty, np.nan, t_max),
+               "height_max": np.where(empty, np.nan, heights[i_max]),
+               "min": np.where(empty, np.nan, t_min),
+               "height_min": np.where(empty, np.nan, heights[i_min]),
+               "gradient": np.where(n_valid > 1, gradient, np.nan)}
+
+    return extrema
+
+
+def query_temperature(cube, times, trees, heights):
+    """
+    Temperatures at any (time, tree, height) points, linearly interpolated in time and over the heights of the
+    thermocouples of each tree (all the points at once). Points outside the testing time or the heights of the
+    thermocouples of their tree are nan, as are the points next to a missing reading
+
+    Parameters:
+    ----------
+    cube: output of temperature_tree_cube
+        dict
+
+    times: times of the points (s)
+        np.array
+
+    trees: trees of the points (names or positions in cube["trees"])
+        np.array
+
+    heights: heights of the points (cm)
+        np.array
+
+    Returns:
+    -------
+    temperatures: temperature at every point (with the broadcast shape of times, trees and heights)
+        np.array
+    """
+    times, trees, heights = np.broadcast_arrays(np.asarray(times, dtype = float), np.asarray(trees),
+                                                np.asarray(heights, dtype = float))
+    if trees.dtype.kind not in "iu":
+        trees = np.array([cube["trees"].index(tree) for tree in trees.ravel()], dtype = int).reshape(trees.shape)
+
+    testing_time = cube["testing_time"]
+    grid = cube["heights"]
+
+    # rows before and after every time
+    i1 = np.clip(np.searchsorted(testing_time, times), 1, len(testing_time) - 1)
+    i0 = i1 - 1
+    w_time = (times - testing_time[i0]) / (testing_time[i1] - testing_time[i0])
+
+    # thermocouples of the tree below and above every height (heights without a thermocouple are skipped). The
+    # positions of the thermocouples of every tree come first in order, and their heights in tree_heights
+    order = np.argsort(~cube["working"], axis = 1, kind = "stable")
+    tree_heights = np.where(np.take_along_axis(cube["working"], order, axis = 1), grid[order], np.inf)
+    n_working = cube["working"].sum(axis = 1)[trees]
+    n_below = (tree_heights[trees] <= heights[..., None]).sum(axis = -1)
+    k0 = np.clip(n_below - 1, 0, np.maximum(n_working - 2, 0))
+    k1 = np.minimum(k0 + 1, np.maximum(n_working - 1, 0))
+    j0 = order[trees, k0]
+    j1 = order[trees, k1]
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        w_height = np.where(j1 == j0, 0, (heights - grid[j0]) / (grid[j1] - grid[j0]))
+
+    # bilinear interpolation
+    temperatures = cube["temperatures"]
+    t_0 = (1 - w_height) * temperatures[i0, trees, j0] + w_height * temperatures[i0, trees, j1]
+    t_1 = (1 - w_height) * temperatures[i1, trees, j0] + w_height * temperatures[i1, trees, j1]
+    temperature = (1 - w_time) * t_0 + w_time * t_1
+
+    outside = ((times < testing_time[0]) | (times > testing_time[-1]) | (n_working == 0)
+               | (heights < tree_heights[trees, 0]) | (heights > grid[j1]))
+
+    return np.where(outside, np.nan, temperature)
+
+
+def isotherm_heights(cube, targets):
+    """
+    Heights at which every tree reaches the target temperatures, linearly interpolated between consecutive
+    thermocouples of the tree. Profiles are not assumed to be monotonic: the lowest (first) and highest (last)
+    crossings are returned. Pairs of thermocouples next to a missing reading are skipped, and targets that are not
+    reached are nan
+
+    Parameters:
+    ----------
+    cube: output of temperature_tree_cube
+        dict
+
+    targets: target temperatures (C), either the same at every time step (n_targets) or one row per time step
+             (time x n_targets)
+        np.array
+
+    Returns:
+    -------
+    first: height of the lowest crossing (cm), (time x tree x n_targets)
+        np.array
+
+    last: height of the highest crossing (cm), (time x tree x n_targets)
+        np.array
+    """
+    temperatures = cube["temperatures"]
+    n_time = len(temperatures)
+    targets = np.atleast_1d(np.asarray(targets, dtype = float))
+    if targets.ndim == 1:
+        targets = np.broadcast_to(targets, (n_time, len(targets)))
+    targets = targets[:, None, None, :]
+
+    # thermocouples of every tree in order of height, with the missing heights at the end
+    order = np.argsort(~cube["working"], axis = 1, kind = "stable")
+    working = np.take_along_axis(cube["working"], order, axis = 1)
+    z = cube["heights"][order]
+    profiles = np.take_along_axis(temperatures, np.broadcast_to(order, temperatures.shape), axis = 2)
+
+    # every segment between two consecutive thermocouples (time x tree x segment x target)
+    z0, z1 = z[:, :-1, None], z[:, 1:, None]
+    t0, t1 = profiles[:, :, :-1, None], profiles[:, :, 1:, None]
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        crossed = (working[:, 1:, None] & (np.minimum(t0, t1) <= targets) & (np.maximum(t0, t1) >= targets))
+        w = np.where(t1 == t0, 0, (targets - t0) / (t1 - t0))
+    heights = z0 + w * (z1 - z0)
+
+    # lowest and highest segments that cross each target
+    reached = crossed.any(axis = 2)
+    n_segments = crossed.shape[2]
+    i_first = np.argmax(crossed, axis = 2)
+    i_last = n_segments - 1 - np.argmax(crossed[:, :, ::-1], axis = 2)
+    first = np.take_along_axis(heights, i_first[:, :, None], axis = 2)[:, :, 0]
+    last = np.take_along_axis(heights, i_last[:, :, None], axis = 2)[:, :, 0]
+
+    return np.where(reached, first, np.nan), np.where(reached, last, np.nan)
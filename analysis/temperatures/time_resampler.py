@@ -0,0 +1,126 @@
+"""
+Resampling of logger data to a common time base.
+
+All the channels of a logger share their time column, so the interpolation indices and weights are computed once
+(one searchsorted over the logger's time) and applied to the whole (time x channel) matrix with a single gather. The
+result is linear interpolation with the same behaviour as np.interp (readings outside the logged time take the first
+or last value), and the condensed data frame of a test is allocated once from all the resampled blocks.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def time_base(frequency = 1, start = 0, end = 3600):
+    """
+    Common time base of the condensed data
+
+    Parameters:
+    ----------
+    frequency: rate of the time base (Hz)
+        float
+
+    start, end: window of the time base, both included (s)
+        float
+
+    Returns:
+    -------
+    new_time: time base (s)
+        np.array
+    """
+    return np.linspace(start, end, int(np.round((end - start) * frequency)) + 1)
+
+
+def resampling_weights(old_time, new_time):
+    """
+    Indices and weights of the linear interpolation from old_time to new_time
+
+    Parameters:
+    ----------
+    old_time: logged time, increasing (s)
+        np.array
+
+    new_time: time base (s)
+        np.array
+
+    Returns:
+    -------
+    weights: rows before ("i0") and after ("i1") every time of new_time and weight of the row after ("w")
+        dict
+    """
+    old_time = np.asarray(old_time, dtype = float)
+    new_time = np.clip(np.asarray(new_time, dtype = float), old_time[0], old_time[-1])
+
+    i1 = np.clip(np.searchsorted(old_time, new_time), 1, len(old_time) - 1)
+    i0 = i1 - 1
+    w = (new_time - old_time[i0]) / (old_time[i1] - old_time[i0])
+
+    # times that fall on a logged time only take that row (a nan in the other row does not spread)
+    i0 = np.where(w == 1, i1, i0)
+    i1 = np.where(w == 0, i0, i1)
+
+    return {"i0": i0, "i1": i1, "w": w[:, None]}
+
+
+def resample(values, weights):
+    """
+    Resamples every channel of a (time x channel) matrix at once
+
+    Parameters:
+    ----------
+    values: readings, one column per channel
+        np.array
+
+    weights: output of resampling_weights
+        dict
+
+    Returns:
+    -------
+    resampled: readings at the time base (new time x channel)
+        np.array
+    """
+    values = np.asarray(values, dtype = float)
+
+    return values[weights["i0"]] * (1 - weights["w"]) + values[weights["i1"]] * weights["w"]
+
+
+def resample_loggers(loggers, new_time, select = None, renames = None):
+    """
+    Condenses several loggers, each with its own testing_time, into one data frame at the time base
+
+    Parameters:
+    ----------
+    loggers: data frames with a "testing_time" column (s) and the channels
+        list
+
+    new_time: time base (s)
+        np.array
+
+    select: function that takes the name of a column and returns whether it is kept (all kept if None)
+        function
+
+    renames: for every logger, function that takes the name of a column and returns its name in the condensed data
+             (names kept if None)
+        list
+
+    Returns:
+    -------
+    condensed: "testing_time" and the resampled channels of all the loggers, in order
+        pd.DataFrame
+    """
+    blocks = [np.asarray(new_time, dtype = float)[:, None]]
+    names = ["testing_time"]
+    renames = renames or [None] * len(loggers)
+    for df, rename in zip(loggers, renames):
+        columns = [column for column in df.columns
+                   if column != "testing_time" and (select is None or select(column))]
+        weights = resampling_weights(df.loc[:, "testing_time"].values, new_time)
+        blocks.append(resample(df.loc[:, columns].values, weights))
+        names.extend(columns if rename is None else [rename(column) for column in columns])
+
+    # one allocation for the whole data frame (later loggers overwrite channels with the same name)
+    condensed = pd.DataFrame(np.hstack(blocks), columns = names)
+    condensed = condensed.loc[:, ~condensed.columns.duplicated(keep = "last")]
+
+    return condensed